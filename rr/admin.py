@@ -1,10 +1,19 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
 
+from rr.models.archive import (
+    ArchivedCertificate,
+    ArchivedContact,
+    ArchivedEndpoint,
+    ArchivedRedirectUri,
+    ArchivedServiceProvider,
+    ArchivedSPAttribute,
+    ArchivedUserGroup,
+)
 from rr.models.attribute import Attribute
 from rr.models.certificate import Certificate
 from rr.models.contact import Contact
-from rr.models.email import Template
+from rr.models.email import OutgoingEmail, Template
 from rr.models.endpoint import Endpoint
 from rr.models.nameidformat import NameIDFormat
 from rr.models.oidc import GrantType, OIDCScope, ResponseType
@@ -126,6 +135,15 @@ admin.site.register(Endpoint, EndpointAdmin)
 admin.site.register(GrantType)
 
 
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ["recipient", "subject", "status", "attempts", "created_at", "sent_at"]
+    list_filter = ["status"]
+    search_fields = ["recipient", "subject"]
+
+
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
+
+
 class KeystoreAdmin(admin.ModelAdmin):
     list_display = ["sp", "email", "valid_until", "creator"]
     search_fields = ["sp__entity_id", "email", "creator__username"]
@@ -178,3 +196,33 @@ class UserGroupAdmin(admin.ModelAdmin):
 
 
 admin.site.register(UserGroup, UserGroupAdmin)
+
+
+class ArchiveAdmin(admin.ModelAdmin):
+    """Read only admin for archived rows"""
+
+    list_display = ["id", "sp", "created_at", "end_at", "archived_at"]
+    search_fields = ["sp__entity_id"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class ArchivedServiceProviderAdmin(ArchiveAdmin):
+    list_display = ["id", "entity_id", "history", "created_at", "end_at", "validated", "archived_at"]
+    search_fields = ["entity_id", "history"]
+
+
+admin.site.register(ArchivedServiceProvider, ArchivedServiceProviderAdmin)
+for model in [
+    ArchivedCertificate,
+    ArchivedContact,
+    ArchivedEndpoint,
+    ArchivedRedirectUri,
+    ArchivedSPAttribute,
+    ArchivedUserGroup,
+]:
+    admin.site.register(model, ArchiveAdmin)
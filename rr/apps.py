@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class RrConfig(AppConfig):
+    name = "rr"
+
+    def ready(self):
+        # Connect signal receivers for host index
+        import rr.utils.hosts  # noqa: F401
+
+        # Connect signal receivers for metadata cache invalidation
+        import rr.utils.metadata_cache  # noqa: F401
@@ -0,0 +1,36 @@
+"""
+Move ended history rows to archive tables
+
+Usage help: ./manage.py archivehistory -h
+"""
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rr.utils.archive import archive_ended_rows
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-d", type=int, action="store", dest="days", default=365, help="Retention time (days), default 365."
+        )
+        parser.add_argument(
+            "-c",
+            type=int,
+            action="store",
+            dest="chunk_size",
+            default=1000,
+            help="Number of rows archived in a transaction, default 1000.",
+        )
+        parser.add_argument("-l", action="store_true", dest="list_only", help="List only, do not archive")
+
+    def handle(self, *args, **options):
+        if options["days"] < 0:
+            self.stderr.write("Error: -d must be positive")
+            return
+        cutoff = timezone.now() - relativedelta(days=options["days"])
+        counts = archive_ended_rows(cutoff, chunk_size=max(options["chunk_size"], 1), list_only=options["list_only"])
+        for name, count in counts.items():
+            self.stdout.write("%s%s: %s" % ("(List only) " if options["list_only"] else "", name, count))
@@ -9,17 +9,22 @@ import logging
 from dateutil.relativedelta import relativedelta
 from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 
 from rr.models.contact import Contact
 from rr.models.serviceprovider import ServiceProvider
 from rr.models.spadmin import Keystore
+from rr.utils.metadata_cache import invalidate_metadata_cache
+from rr.utils.signals import receivers_disabled
 
 logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
     list_only = False
+    chunk_size = 1000
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -42,6 +47,14 @@ class Command(BaseCommand):
         )
         parser.add_argument("-i", action="store_true", dest="remove_invite", help="Remove expired invites")
         parser.add_argument("-l", action="store_true", dest="list_only", help="List only, do not remove")
+        parser.add_argument(
+            "-b",
+            type=int,
+            action="store",
+            dest="chunk_size",
+            default=1000,
+            help="Number of objects removed in a transaction, default 1000.",
+        )
 
     def output(self, text):
         if self.list_only:
@@ -49,55 +62,107 @@ class Command(BaseCommand):
         else:
             logger.info(text)
 
+    def remove_objects(self, queryset, fields, describe, name, sp_field=None):
+        """
+        Removes objects in chunks, each chunk in its own transaction. Objects are
+        read as value rows ordered by pk, so only one chunk is in memory at a time.
+        In list only mode, objects are only counted.
+
+        Signal receivers are disabled while removing, and metadata cache is
+        invalidated once for each chunk. Cache and host index rows of removed
+        service providers are removed with them.
+
+        queryset: queryset of objects to remove
+        fields: fields included in value rows after pk
+        describe: function returning description of a value row
+        name: name of objects in the summary line
+        sp_field: field of service provider pk, whose metadata cache is invalidated
+
+        return number of removed objects
+        """
+        if self.list_only:
+            count = queryset.count()
+            self.output("Number of %s: %s" % (name, count))
+            return count
+        if sp_field:
+            fields = [*fields, sp_field]
+        rows = queryset.order_by("pk").values_list("pk", *fields)
+        count = 0
+        last_pk = None
+        while True:
+            chunk = rows.filter(pk__gt=last_pk) if last_pk is not None else rows
+            chunk = list(chunk[: self.chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+            for row in chunk:
+                self.output(describe(row))
+            with transaction.atomic(), receivers_disabled():
+                queryset.model.objects.filter(pk__in=[row[0] for row in chunk]).delete()
+                if sp_field:
+                    invalidate_metadata_cache(*{row[-1] for row in chunk})
+            count += len(chunk)
+        self.output("Number of %s: %s" % (name, count))
+        return count
+
+    @staticmethod
+    def removed_providers(date_limit):
+        """Returns queryset of service providers removed before date limit"""
+        return ServiceProvider.objects.filter(end_at__lt=date_limit, history=None)
+
     def remove_sp(self, date_limit):
-        """Delete contacts from 'removed' services"""
-        for provider in ServiceProvider.objects.filter(end_at__lt=date_limit, history=None):
-            # Check for history versions
-            for sp in ServiceProvider.objects.filter(history=provider.pk):
-                self.output("Removing service provider (history): " + sp.entity_id)
-                if not self.list_only:
-                    sp.delete()
-            self.output("Removing service provider: " + provider.entity_id)
-            if not self.list_only:
-                provider.delete()
+        """Delete 'removed' services and their history versions"""
+        providers = self.removed_providers(date_limit)
+        self.remove_objects(
+            ServiceProvider.objects.filter(history__in=providers.values("pk")),
+            ["entity_id"],
+            lambda row: "Removing service provider (history): " + row[1],
+            "service providers (history)",
+            sp_field="history",
+        )
+        self.remove_objects(
+            providers,
+            ["entity_id"],
+            lambda row: "Removing service provider: " + row[1],
+            "service providers",
+        )
 
     def remove_contact(self, date_limit):
         """Delete contacts from 'removed' services"""
-        for provider in ServiceProvider.objects.filter(end_at__lt=date_limit, history=None):
-            # Check for history versions
-            for sp in ServiceProvider.objects.filter(history=provider.pk):
-                for contact in Contact.objects.filter(sp=sp):
-                    self.output(
-                        sp.entity_id + ": Removing contact (history): " + contact.firstname + " " + contact.lastname
-                    )
-                    if not self.list_only:
-                        contact.delete()
-            for contact in Contact.objects.filter(sp=provider):
-                self.output(provider.entity_id + ": Removing contact: " + contact.firstname + " " + contact.lastname)
-                if not self.list_only:
-                    contact.delete()
+        providers = self.removed_providers(date_limit)
+        fields = ["sp__entity_id", "firstname", "lastname"]
+        self.remove_objects(
+            Contact.objects.filter(sp__history__in=providers.values("pk")),
+            fields,
+            lambda row: row[1] + ": Removing contact (history): " + row[2] + " " + row[3],
+            "contacts (history)",
+            sp_field="sp__history",
+        )
+        self.remove_objects(
+            Contact.objects.filter(sp__in=providers.values("pk")),
+            fields,
+            lambda row: row[1] + ": Removing contact: " + row[2] + " " + row[3],
+            "contacts",
+            sp_field="sp",
+        )
 
     def remove_obsolete_users(self, date_limit):
         """Delete users without active logins during date_limit and who are no admins"""
-        for user in User.objects.filter(last_login__lt=date_limit):
-            if not ServiceProvider.objects.filter(admins=user):
-                self.output("Removing user: " + user.username)
-                if not self.list_only:
-                    user.delete()
+        admins = ServiceProvider.admins.through.objects.filter(user=OuterRef("pk"))
+        self.remove_objects(
+            User.objects.filter(last_login__lt=date_limit).exclude(Exists(admins)),
+            ["username"],
+            lambda row: "Removing user: " + row[1],
+            "users",
+        )
 
     def remove_expired_invites(self):
-        expired_invites = Keystore.objects.filter(valid_until__lt=timezone.now())
-        for invite in expired_invites:
-            self.output(
-                "Removing invite: "
-                + invite.sp.entity_id
-                + " "
-                + invite.valid_until.strftime("%Y-%m-%d")
-                + " "
-                + invite.email
-            )
-            if not self.list_only:
-                invite.delete()
+        self.remove_objects(
+            Keystore.objects.filter(valid_until__lt=timezone.now()),
+            ["sp__entity_id", "valid_until", "email"],
+            lambda row: "Removing invite: " + row[1] + " " + row[2].strftime("%Y-%m-%d") + " " + row[3],
+            "invites",
+        )
 
     def handle(self, *args, **options):
         days = options["days"]
@@ -106,7 +171,11 @@ class Command(BaseCommand):
         remove_user = options["remove_user"]
         remove_invite = options["remove_invite"]
         self.list_only = options["list_only"]
+        self.chunk_size = options["chunk_size"]
 
+        if self.chunk_size < 1:
+            self.stderr.write("Error: -b must be positive")
+            return
         # Set date range to one year if not given
         if days is None:
             days = 365
@@ -0,0 +1,83 @@
+"""
+Detect login anomalies and dormant services from login statistics
+
+Usage help: ./manage.py detectanomalies -h
+"""
+
+from django.core.management.base import BaseCommand
+
+from rr.models.serviceprovider import ServiceProvider
+from rr.utils.statistics_alerts import detect_statistics_alerts, save_statistics_alerts
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-b", type=int, action="store", dest="baseline_days", default=28, help="Baseline days, default 28."
+        )
+        parser.add_argument(
+            "-r", type=int, action="store", dest="recent_days", default=7, help="Recent days, default 7."
+        )
+        parser.add_argument(
+            "-t",
+            type=float,
+            action="store",
+            dest="threshold",
+            default=0.2,
+            help="Recent logins must be at most this fraction of baseline, default 0.2.",
+        )
+        parser.add_argument(
+            "-m",
+            type=float,
+            action="store",
+            dest="min_baseline",
+            default=10,
+            help="Minimum baseline daily logins, default 10.",
+        )
+        parser.add_argument(
+            "-z",
+            type=float,
+            action="store",
+            dest="min_deviation",
+            default=3.0,
+            help="Minimum number of standard deviations below rolling baseline, default 3.",
+        )
+        parser.add_argument(
+            "-d",
+            type=int,
+            action="store",
+            dest="dormant_days",
+            default=90,
+            help="Services without logins during this many days are dormant, default 90.",
+        )
+        parser.add_argument("-s", action="store_true", dest="save", help="Save alerts, replacing previous ones.")
+        parser.add_argument("-p", action="store_true", dest="print", help="Print alerts.")
+
+    def handle(self, *args, **options):
+        if min(options["baseline_days"], options["recent_days"], options["dormant_days"]) < 1:
+            self.stderr.write("Error: -b, -r and -d must be positive")
+            return
+        alerts = detect_statistics_alerts(
+            baseline_days=options["baseline_days"],
+            recent_days=options["recent_days"],
+            threshold=options["threshold"],
+            min_baseline=options["min_baseline"],
+            dormant_days=options["dormant_days"],
+            min_deviation=options["min_deviation"],
+        )
+        if options["save"]:
+            save_statistics_alerts(alerts)
+        if options["print"]:
+            entity_ids = dict(
+                ServiceProvider.objects.filter(pk__in=[alert.sp_id for alert in alerts]).values_list("pk", "entity_id")
+            )
+            for alert in alerts:
+                if alert.type == alert.ANOMALY:
+                    self.stdout.write(
+                        "%s: %s, %.1f -> %.1f (%.1f)"
+                        % (alert.type, entity_ids[alert.sp_id], alert.baseline, alert.recent, alert.deviation)
+                    )
+                else:
+                    self.stdout.write(
+                        "%s: %s, %s" % (alert.type, entity_ids[alert.sp_id], alert.last_login or "never")
+                    )
@@ -0,0 +1,100 @@
+"""
+Command line script for importing login statistics from Shibboleth IdP audit log files
+
+Usage help: ./manage.py importauditlog -h
+"""
+
+from django.core.management.base import BaseCommand
+
+from rr.utils.auditlog import (
+    AUDIT_LOG_PROFILE_FIELD,
+    AUDIT_LOG_SP_FIELD,
+    AUDIT_LOG_TIME_FIELD,
+    AUDIT_LOG_USER_FIELD,
+    read_audit_logs,
+)
+from rr.utils.statistics import (
+    add_saved_statistics,
+    get_entity_map,
+    save_statistics_chunks,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports login statistics from audit log files. Statistics for each day are replaced, "
+        "so all log files for a day, i.e. from all IdP nodes, must be imported at the same time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+", help="Audit log files, gzip compressed if ending with .gz")
+        parser.add_argument(
+            "-w",
+            type=int,
+            action="store",
+            dest="workers",
+            default=1,
+            help="Number of worker processes reading files, default 1.",
+        )
+        parser.add_argument(
+            "-c",
+            type=int,
+            action="store",
+            dest="chunk_size",
+            default=1000,
+            help="Number of rows saved in a transaction, default 1000.",
+        )
+        parser.add_argument("-d", action="store", dest="delimiter", default="|", help="Field delimiter, default |")
+        parser.add_argument(
+            "--time-field",
+            type=int,
+            action="store",
+            default=AUDIT_LOG_TIME_FIELD,
+            help="Position of timestamp field, default %s." % AUDIT_LOG_TIME_FIELD,
+        )
+        parser.add_argument(
+            "--user-field",
+            type=int,
+            action="store",
+            default=AUDIT_LOG_USER_FIELD,
+            help="Position of principal name field, default %s." % AUDIT_LOG_USER_FIELD,
+        )
+        parser.add_argument(
+            "--sp-field",
+            type=int,
+            action="store",
+            default=AUDIT_LOG_SP_FIELD,
+            help="Position of relying party field, default %s." % AUDIT_LOG_SP_FIELD,
+        )
+        parser.add_argument(
+            "--profile-field",
+            type=int,
+            action="store",
+            default=AUDIT_LOG_PROFILE_FIELD,
+            help="Position of profile field, default %s. Only authentication events are counted as logins, "
+            "use -1 to count all lines." % AUDIT_LOG_PROFILE_FIELD,
+        )
+        parser.add_argument("-p", action="store_true", dest="verbose", help="Print statistics as updated")
+
+    def handle(self, *args, **options):
+        entity_map = get_entity_map()
+        imported = set()
+        for rows in read_audit_logs(
+            options["files"],
+            workers=options["workers"],
+            delimiter=options["delimiter"],
+            time_field=options["time_field"],
+            user_field=options["user_field"],
+            sp_field=options["sp_field"],
+            profile_field=options["profile_field"],
+        ):
+            # Statistics from each file are saved before reading the next one, and
+            # days already imported from other files are added to saved statistics.
+            rows = add_saved_statistics(rows, entity_map, imported)
+            for status, row in save_statistics_chunks(
+                rows, chunk_size=max(options["chunk_size"], 1), entity_map=entity_map
+            ):
+                if status != "UNKNOWN SP":
+                    imported.add((row[0], row[1]))
+                if options["verbose"]:
+                    self.stdout.write("%s;%s;%s;%s;%s" % (status, row[0], row[1], row[2], row[3]))
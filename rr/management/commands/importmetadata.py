@@ -1,13 +1,21 @@
 """
 Command line script for importing metadata.xml
 
-Usage help: ./manage.py cleandb -h
+Files are parsed as a stream, one EntityDescriptor at a time, and may be gzip compressed.
+Entities which have not changed since the previous import are skipped.
+
+Usage help: ./manage.py importmetadata -h
 """
 
+import os
+
 from django.core.management.base import BaseCommand
-from lxml import etree
 
-from rr.utils.saml_metadata_parser import saml_metadata_parser
+from rr.utils.saml_metadata_parser import (
+    MetadataImportCache,
+    iter_metadata_entities,
+    saml_metadata_import,
+)
 
 
 class Command(BaseCommand):
@@ -20,28 +28,48 @@ class Command(BaseCommand):
         parser.add_argument(
             "-a", action="store_true", dest="validate", help="Validate imported metadata automatically"
         )
+        parser.add_argument(
+            "-f", action="store_true", dest="force", help="Import entities even if they have not changed"
+        )
+        parser.add_argument(
+            "-p",
+            type=int,
+            action="store",
+            dest="progress",
+            default=1000,
+            help="Report progress after this many entities, 0 to disable. Default 1000.",
+        )
 
     def handle(self, *args, **options):
         overwrite = options["overwrite"]
         verbosity = int(options["verbosity"])
         validate = options["validate"]
         disable = options["disable"]
+        force = options["force"]
+        progress = options["progress"]
         files = options["files"]
         if files:
+            cache = MetadataImportCache()
+            counts = {"CREATED": 0, "UPDATED": 0, "SKIPPED": 0, "UNCHANGED": 0, "ERROR": 0}
             for filename in files:
-                parser = etree.XMLParser(
-                    ns_clean=True,
-                    remove_comments=True,
-                    remove_blank_text=True,
-                    resolve_entities=False,
-                    no_network=True,
-                )
-                tree = etree.parse(filename, parser)
-                if not tree:
+                if not os.path.isfile(filename):
                     print("File does not exist: " + filename)
-                else:
-                    root = tree.getroot()
-                    for entity in root:
-                        sp, errors = saml_metadata_parser(entity, overwrite, verbosity, validate, disable)
-                        for error in errors:
-                            print(error)
+                    continue
+                count = 0
+                for entity in iter_metadata_entities(filename):
+                    status, sp, errors = saml_metadata_import(
+                        entity, overwrite, verbosity, validate, disable, cache=cache, force=force
+                    )
+                    counts[status] += 1
+                    for error in errors:
+                        print(error)
+                    count += 1
+                    if progress and verbosity > 0 and count % progress == 0:
+                        self.stderr.write("%s: %s entities processed" % (filename, count))
+                if verbosity > 0:
+                    self.stderr.write("%s: %s entities processed" % (filename, count))
+            if verbosity > 0:
+                self.stdout.write(
+                    "Created: %(CREATED)s, updated: %(UPDATED)s, skipped: %(SKIPPED)s, unchanged: %(UNCHANGED)s, "
+                    "errors: %(ERROR)s" % counts
+                )
@@ -1,5 +1,5 @@
 """
-Command line script for importing metadata.xml
+Command line script for importing login statistics
 
 Usage help: ./manage.py importstatistics -h
 """
@@ -7,11 +7,11 @@ Usage help: ./manage.py importstatistics -h
 from datetime import date, timedelta
 
 import MySQLdb
+import MySQLdb.cursors
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
-from rr.models.serviceprovider import ServiceProvider
-from rr.models.statistics import Statistics
+from rr.utils.statistics import get_statistics_watermark, import_statistics
 
 
 class Command(BaseCommand):
@@ -26,6 +26,26 @@ class Command(BaseCommand):
         )
         parser.add_argument("-t", action="store_true", dest="include_today", help="Include current day")
         parser.add_argument("-p", action="store_true", dest="verbose", help="Print statistics as updated")
+        parser.add_argument(
+            "-w",
+            action="store_true",
+            dest="watermark",
+            help="Import days since the latest imported date, instead of number of days",
+        )
+        parser.add_argument(
+            "-n",
+            action="store_true",
+            dest="no_sketches",
+            help="Do not store unique user sketches, counting unique users in the statistics database",
+        )
+        parser.add_argument(
+            "-c",
+            type=int,
+            action="store",
+            dest="chunk_size",
+            default=1000,
+            help="Number of rows saved in a transaction, default 1000.",
+        )
 
     def handle(self, *args, **options):
         number_of_days = options["number_of_days"]
@@ -43,43 +63,35 @@ class Command(BaseCommand):
             self.stderr.write("Missing database settings")
             exit(1)
         db = MySQLdb.connect(host=host, user=user, passwd=password, db=database)
-        cursor = db.cursor()
-        date_start = (date.today() - timedelta(days=number_of_days)).strftime("%Y-%m-%d") + " 00:00:00"
+        # Server side cursor, rows are fetched in chunks
+        cursor = db.cursor(MySQLdb.cursors.SSCursor)
+        watermark = get_statistics_watermark() if options["watermark"] else None
+        if watermark:
+            # Latest imported day may have been imported partially
+            date_start = watermark.strftime("%Y-%m-%d") + " 00:00:00"
+        else:
+            date_start = (date.today() - timedelta(days=number_of_days)).strftime("%Y-%m-%d") + " 00:00:00"
         if include_today:
             date_end = (date.today() + timedelta(days=1)).strftime("%Y-%m-%d") + " 00:00:00"
         else:
             date_end = (date.today()).strftime("%Y-%m-%d") + " 00:00:00"
-        select_statement = (
-            "SELECT relyingpartyid, DATE(requestTime), count(*), count(distinct principalName) "
-            "FROM " + table + " WHERE requestTime >= %s and requestTime < %s GROUP BY relyingpartyid, "
-            "DATE(requestTime);"
-        )
+        sketches = not options["no_sketches"]
+        if sketches:
+            # Rows per user, aggregated with unique user sketches while importing
+            select_statement = (
+                "SELECT relyingpartyid, DATE(requestTime), principalName, count(*) "
+                "FROM " + table + " WHERE requestTime >= %s and requestTime < %s GROUP BY relyingpartyid, "
+                "DATE(requestTime), principalName ORDER BY DATE(requestTime), relyingpartyid;"
+            )
+        else:
+            select_statement = (
+                "SELECT relyingpartyid, DATE(requestTime), count(*), count(distinct principalName) "
+                "FROM " + table + " WHERE requestTime >= %s and requestTime < %s GROUP BY relyingpartyid, "
+                "DATE(requestTime) ORDER BY DATE(requestTime);"
+            )
         select_data = (date_start, date_end)
         cursor.execute(select_statement, select_data)
 
-        serviceproviders = ServiceProvider.objects.filter(end_at=None)
-        while True:
-            row = cursor.fetchone()
-            if row is None:
-                break
-            self._save_statistics(row, serviceproviders, verbose)
-
-    def _save_statistics(self, row, serviceproviders, verbose):
-        sp = serviceproviders.filter(entity_id=row[0]).first()
-        if sp:
-            try:
-                obj = Statistics.objects.get(sp=sp, date=row[1])
-                if obj.logins != row[2] or obj.users != row[3]:
-                    obj.logins = row[2]
-                    obj.users = row[3]
-                    obj.save()
-                    status = "UPDATED"
-                else:
-                    status = "EXISTS"
-            except Statistics.DoesNotExist:
-                Statistics.objects.create(sp=sp, date=row[1], logins=row[2], users=row[3])
-                status = "CREATED"
-        else:
-            status = "UNKNOWN SP"
-        if verbose:
-            self.stdout.write("%s;%s;%s;%s;%s" % (status, row[0], row[1], row[2], row[3]))
+        for status, row in import_statistics(cursor, chunk_size=max(options["chunk_size"], 1), sketches=sketches):
+            if verbose:
+                self.stdout.write("%s;%s;%s;%s;%s" % (status, row[0], row[1], row[2], row[3]))
@@ -1,18 +1,19 @@
 """
 Check that addresses are found in DNS
 
-Usage help: ./manage.py nslookup
+Host names are collected from all checked services and each host name is looked up once,
+using concurrent lookups.
+
+Usage help: ./manage.py nslookup -h
 """
 
+import json
 import logging
-from urllib.parse import urlparse
 
-from _socket import gaierror, getaddrinfo
 from django.core.management.base import BaseCommand
 
-from rr.models.endpoint import Endpoint
-from rr.models.redirecturi import RedirectUri
 from rr.models.serviceprovider import ServiceProvider
+from rr.utils.nslookup import RESOLVED, get_service_hosts, resolve_hosts
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +29,13 @@ class Command(BaseCommand):
             dest="test_all",
             help="Test all services. Script tests only production by default",
         )
+        parser.add_argument(
+            "-w", type=int, action="store", dest="workers", default=10, help="Number of concurrent lookups, default 10"
+        )
+        parser.add_argument(
+            "-t", type=float, action="store", dest="timeout", default=5.0, help="Lookup timeout in seconds, default 5"
+        )
+        parser.add_argument("-j", action="store_true", dest="json", help="Print report of failed lookups as JSON")
 
     def handle(self, *args, **options):
         check_saml = options["check_saml"]
@@ -46,43 +54,24 @@ class Command(BaseCommand):
             services = services.exclude(service_type="ldap")
         if not check_oidc:
             services = services.exclude(service_type="oidc")
-        for sp in services:
-            if sp.service_type == "saml":
-                self._check_saml_service(sp)
-            if sp.service_type == "ldap":
-                self._check_ldap_service(sp)
-            if sp.service_type == "oidc":
-                self._check_oidc_service(sp)
-
-    def _check_saml_service(self, sp):
-        endpoints = []
-        for endpoint in Endpoint.objects.filter(sp=sp, end_at=None).values_list("location", flat=True):
-            endpoints.append(urlparse(endpoint).netloc.split(":")[0])
-        for endpoint in set(endpoints):
-            try:
-                getaddrinfo(endpoint, None)
-            except gaierror:
-                self.stdout.write(
-                    "Address does not resolve | SAML entity: %s | address: %s" % (sp.entity_id, endpoint)
-                )
-
-    def _check_oidc_service(self, sp):
-        redirecturis = []
-        for redirecuri in RedirectUri.objects.filter(sp=sp, end_at=None).values_list("uri", flat=True):
-            redirecturis.append(urlparse(redirecuri).netloc.split(":")[0])
-        for redirecuri in set(redirecturis):
-            try:
-                getaddrinfo(redirecuri, None)
-            except gaierror:
-                self.stdout.write(
-                    "Address does not resolve | OIDC entity: %s | address: %s" % (sp.entity_id, redirecuri)
-                )
-
-    def _check_ldap_service(self, sp):
-        for server_address in sp.server_names.splitlines():
-            try:
-                getaddrinfo(server_address.strip(), None)
-            except gaierror:
+        services = list(services.only("pk", "entity_id", "service_type"))
+        hosts = get_service_hosts(services)
+        statuses = resolve_hosts(
+            (host for sp_hosts in hosts.values() for host in sp_hosts),
+            workers=options["workers"],
+            timeout=options["timeout"],
+        )
+        report = [
+            {"service_type": sp.service_type, "entity_id": sp.entity_id, "address": host, "status": statuses[host]}
+            for sp in services
+            for host in sorted(hosts[sp.pk])
+            if statuses[host] != RESOLVED
+        ]
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            for row in report:
                 self.stdout.write(
-                    "Address does not resolve | LDAP entity: %s | address: %s" % (sp.entity_id, server_address)
+                    "Address does not resolve | %s entity: %s | address: %s | %s"
+                    % (row["service_type"].upper(), row["entity_id"], row["address"], row["status"])
                 )
@@ -0,0 +1,25 @@
+"""
+Rebuild host name index of service endpoints, redirect URIs and server names
+
+Usage help: ./manage.py rebuildhosts -h
+"""
+
+from django.core.management.base import BaseCommand
+
+from rr.utils.hosts import rebuild_service_hosts
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-c",
+            type=int,
+            action="store",
+            dest="chunk_size",
+            default=1000,
+            help="Number of service providers updated at once, default 1000.",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_service_hosts(chunk_size=max(options["chunk_size"], 1))
+        self.stdout.write("ServiceHost: %s" % count)
@@ -0,0 +1,39 @@
+"""
+Rebuild weekly and monthly statistics rollups from daily statistics
+
+Usage help: ./manage.py rebuildstatistics -h
+"""
+
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from rr.models.statistics import Statistics
+from rr.utils.statistics import rebuild_statistics_rollups, update_statistics_rollups
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-d",
+            type=int,
+            action="store",
+            dest="number_of_days",
+            help="Rebuild only periods including the given number of past days, default all.",
+        )
+
+    def handle(self, *args, **options):
+        number_of_days = options["number_of_days"]
+        if number_of_days is None:
+            counts = rebuild_statistics_rollups()
+            for name, count in counts.items():
+                self.stdout.write("%s: %s" % (name, count))
+        elif number_of_days < 1:
+            self.stderr.write("Error: -d must be positive")
+        else:
+            keys = (
+                Statistics.objects.filter(date__gte=date.today() - timedelta(days=number_of_days))
+                .order_by()
+                .values_list("sp", "date")
+            )
+            update_statistics_rollups(keys)
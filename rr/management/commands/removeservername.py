@@ -8,7 +8,9 @@ import logging
 
 from django.core.management.base import BaseCommand
 
+from rr.models.servicehost import ServiceHost
 from rr.models.serviceprovider import ServiceProvider
+from rr.utils.hosts import find_service_hosts
 from rr.utils.serviceprovider import create_sp_history_copy
 
 logger = logging.getLogger(__name__)
@@ -30,7 +32,9 @@ class Command(BaseCommand):
             logger.info(text)
 
     def find_services(self, hostname):
-        return ServiceProvider.objects.filter(end_at=None, server_names__icontains=hostname)
+        return ServiceProvider.objects.filter(
+            end_at=None, pk__in=find_service_hosts(hostname, [ServiceHost.SERVER_NAME]).values("sp")
+        )
 
     def remove_server_name(self, service, hostname):
         self.output(f"Removing server name: {hostname} from service provider {service.entity_id}")
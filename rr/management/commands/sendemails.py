@@ -0,0 +1,52 @@
+"""
+Send queued email messages
+
+Usage help: ./manage.py sendemails -h
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from rr.utils.outbox import send_queued_emails
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-b",
+            type=int,
+            action="store",
+            dest="batch_size",
+            default=100,
+            help="Number of messages sent with a single connection, default 100.",
+        )
+        parser.add_argument(
+            "-w",
+            type=int,
+            action="store",
+            dest="wait",
+            help="Keep running and check for queued messages every WAIT seconds.",
+        )
+
+    def send_batches(self, batch_size):
+        """Sends batches until there are no queued messages due"""
+        total_sent = 0
+        total_unsent = 0
+        while True:
+            sent, unsent = send_queued_emails(batch_size=batch_size)
+            if not sent and not unsent:
+                break
+            total_sent += sent
+            total_unsent += unsent
+        return total_sent, total_unsent
+
+    def handle(self, *args, **options):
+        batch_size = max(options["batch_size"], 1)
+        wait = options["wait"]
+        while True:
+            sent, unsent = self.send_batches(batch_size)
+            if wait is None:
+                self.stdout.write("Sent: %s, unsent: %s" % (sent, unsent))
+                break
+            time.sleep(max(wait, 1))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rr", "0057_serviceprovider_saml_subject_identifier"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MetadataCache",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("validated", models.BooleanField(verbose_name="Validated metadata")),
+                ("options", models.CharField(max_length=40, verbose_name="Generator options")),
+                ("metadata", models.TextField(blank=True, verbose_name="Rendered metadata")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Created at")),
+                (
+                    "sp",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="metadata_cache",
+                        to="rr.serviceprovider",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(fields=("sp", "validated", "options"), name="unique_metadata_cache")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("rr", "0058_metadatacache"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="serviceprovider",
+            index=models.Index(fields=["service_type", "validated"], name="rr_servicep_service_5a329f_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="serviceprovider",
+            index=models.Index(fields=["service_type", "end_at"], name="rr_servicep_service_70857c_idx"),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("rr", "0059_serviceprovider_timestamp_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="serviceprovider",
+            index=models.Index(fields=["history", "validated"], name="rr_servicep_history_e8a762_idx"),
+        ),
+    ]
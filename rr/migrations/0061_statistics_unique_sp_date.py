@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:02
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_statistics(apps, schema_editor):
+    """Keep the latest imported row for each service provider and date"""
+    Statistics = apps.get_model("rr", "Statistics")
+    duplicates = (
+        Statistics.objects.order_by()
+        .values("sp", "date")
+        .annotate(count=Count("pk"), latest=Max("pk"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        Statistics.objects.filter(sp=duplicate["sp"], date=duplicate["date"]).exclude(pk=duplicate["latest"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rr", "0060_serviceprovider_history_validated_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_statistics, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="statistics",
+            constraint=models.UniqueConstraint(fields=("sp", "date"), name="unique_statistics_sp_date"),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+
+def add_statistics_rollups(apps, schema_editor):
+    """Build rollups from existing daily statistics, in chunks of service providers"""
+    Statistics = apps.get_model("rr", "Statistics")
+    sps = list(Statistics.objects.order_by("sp").values_list("sp", flat=True).distinct())
+    for model_name, trunc in [("WeeklyStatistics", TruncWeek), ("MonthlyStatistics", TruncMonth)]:
+        model = apps.get_model("rr", model_name)
+        for n in range(0, len(sps), 100):
+            totals = (
+                Statistics.objects.filter(sp__in=sps[n : n + 100])
+                .annotate(period=trunc("date"))
+                .order_by()
+                .values("sp", "period")
+                .annotate(total_logins=Sum("logins"), max_users=Max("users"))
+            )
+            model.objects.bulk_create(
+                [
+                    model(sp_id=row["sp"], date=row["period"], logins=row["total_logins"], users=row["max_users"])
+                    for row in totals
+                ],
+                batch_size=1000,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rr", "0061_statistics_unique_sp_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MonthlyStatistics",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("logins", models.IntegerField(verbose_name="Number of logins")),
+                ("users", models.IntegerField(null=True, verbose_name="Highest daily number of unique users")),
+                ("date", models.DateField(verbose_name="First day of month")),
+                (
+                    "sp",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="monthly_statistics",
+                        to="rr.serviceprovider",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-date"],
+                "constraints": [
+                    models.UniqueConstraint(fields=("sp", "date"), name="unique_monthly_statistics_sp_date")
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="WeeklyStatistics",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("logins", models.IntegerField(verbose_name="Number of logins")),
+                ("users", models.IntegerField(null=True, verbose_name="Highest daily number of unique users")),
+                ("date", models.DateField(verbose_name="First day of ISO week")),
+                (
+                    "sp",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="weekly_statistics",
+                        to="rr.serviceprovider",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-date"],
+                "constraints": [
+                    models.UniqueConstraint(fields=("sp", "date"), name="unique_weekly_statistics_sp_date")
+                ],
+            },
+        ),
+        migrations.RunPython(add_statistics_rollups, migrations.RunPython.noop),
+    ]
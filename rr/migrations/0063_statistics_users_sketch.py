@@ -0,0 +1,38 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rr", "0062_statistics_rollups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="monthlystatistics",
+            name="unique_users",
+            field=models.IntegerField(null=True, verbose_name="Approximate number of unique users"),
+        ),
+        migrations.AddField(
+            model_name="monthlystatistics",
+            name="users_sketch",
+            field=models.BinaryField(null=True, verbose_name="Unique users sketch"),
+        ),
+        migrations.AddField(
+            model_name="statistics",
+            name="users_sketch",
+            field=models.BinaryField(null=True, verbose_name="Unique users sketch"),
+        ),
+        migrations.AddField(
+            model_name="weeklystatistics",
+            name="unique_users",
+            field=models.IntegerField(null=True, verbose_name="Approximate number of unique users"),
+        ),
+        migrations.AddField(
+            model_name="weeklystatistics",
+            name="users_sketch",
+            field=models.BinaryField(null=True, verbose_name="Unique users sketch"),
+        ),
+    ]
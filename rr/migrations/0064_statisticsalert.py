@@ -0,0 +1,43 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rr", "0063_statistics_users_sketch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatisticsAlert",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[("anomaly", "Logins dropped"), ("dormant", "No logins")],
+                        max_length=10,
+                        verbose_name="Alert type",
+                    ),
+                ),
+                ("baseline", models.FloatField(null=True, verbose_name="Baseline daily logins")),
+                ("recent", models.FloatField(null=True, verbose_name="Recent daily logins")),
+                ("last_login", models.DateField(null=True, verbose_name="Last login date")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Created at")),
+                (
+                    "sp",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="statistics_alerts",
+                        to="rr.serviceprovider",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["type", "sp"],
+            },
+        ),
+    ]
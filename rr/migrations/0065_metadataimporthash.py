@@ -0,0 +1,22 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rr", "0064_statisticsalert"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MetadataImportHash",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("entity_id", models.CharField(max_length=255, unique=True, verbose_name="Entity Id")),
+                ("content_hash", models.CharField(max_length=64, verbose_name="Metadata hash")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="Updated at")),
+            ],
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:18
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+from django.db import migrations, models
+
+
+def certificate_fingerprints(certificate):
+    """
+    Returns fingerprints, serial number and public key hash of a certificate
+    stored without PEM header and footer, or None if it could not be loaded.
+    Copied from the model at the time of the migration.
+    """
+    pem = "-----BEGIN CERTIFICATE-----\n" + certificate.rstrip("\n") + "\n-----END CERTIFICATE-----\n"
+    try:
+        cert = x509.load_pem_x509_certificate(pem.encode("utf-8"))
+    except ValueError:
+        return None
+    public_key = cert.public_key().public_bytes(Encoding.DER, PublicFormat.SubjectPublicKeyInfo)
+    digest = hashes.Hash(hashes.SHA256())
+    digest.update(public_key)
+    return {
+        "fingerprint_sha256": cert.fingerprint(hashes.SHA256()).hex(),
+        "fingerprint_sha1": cert.fingerprint(hashes.SHA1()).hex(),
+        "fingerprint_md5": cert.fingerprint(hashes.MD5()).hex(),
+        "serial_number": str(cert.serial_number),
+        "public_key_sha256": digest.finalize().hex(),
+    }
+
+
+def add_certificate_fingerprints(apps, schema_editor):
+    """Compute fingerprints for existing certificates, in batches"""
+    Certificate = apps.get_model("rr", "Certificate")
+    fields = ["fingerprint_sha256", "fingerprint_sha1", "fingerprint_md5", "serial_number", "public_key_sha256"]
+    last_pk = 0
+    while True:
+        certificates = list(Certificate.objects.filter(pk__gt=last_pk).order_by("pk")[:1000])
+        if not certificates:
+            break
+        for certificate in certificates:
+            fingerprints = certificate_fingerprints(certificate.certificate)
+            if fingerprints:
+                for field, value in fingerprints.items():
+                    setattr(certificate, field, value)
+        Certificate.objects.bulk_update(certificates, fields)
+        last_pk = certificates[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rr", "0065_metadataimporthash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="certificate",
+            name="fingerprint_md5",
+            field=models.CharField(blank=True, max_length=32, verbose_name="MD5 fingerprint"),
+        ),
+        migrations.AddField(
+            model_name="certificate",
+            name="fingerprint_sha1",
+            field=models.CharField(blank=True, max_length=40, verbose_name="SHA1 fingerprint"),
+        ),
+        migrations.AddField(
+            model_name="certificate",
+            name="fingerprint_sha256",
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name="SHA256 fingerprint"),
+        ),
+        migrations.AddField(
+            model_name="certificate",
+            name="public_key_sha256",
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name="SHA256 hash of public key"),
+        ),
+        migrations.AddField(
+            model_name="certificate",
+            name="serial_number",
+            field=models.CharField(blank=True, max_length=64, verbose_name="Serial number"),
+        ),
+        migrations.RunPython(add_certificate_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rr", "0066_certificate_fingerprints"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ServiceHost",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("host", models.CharField(db_index=True, max_length=255, verbose_name="Host name")),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("endpoint", "Endpoint"),
+                            ("redirecturi", "Redirect URI"),
+                            ("server_name", "Server name"),
+                        ],
+                        max_length=20,
+                        verbose_name="Source",
+                    ),
+                ),
+                (
+                    "sp",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="hosts", to="rr.serviceprovider"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("sp", "host", "source"), name="unique_service_host")],
+            },
+        ),
+    ]
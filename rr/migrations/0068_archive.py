@@ -0,0 +1,502 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:28
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("rr", "0067_servicehost"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedCertificate",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False, verbose_name="ID")),
+                ("cn", models.CharField(blank=True, max_length=255, verbose_name="cn")),
+                ("issuer", models.CharField(blank=True, max_length=255, verbose_name="Issuer cn")),
+                ("valid_from", models.DateTimeField(blank=True, null=True, verbose_name="Valid from")),
+                ("valid_until", models.DateTimeField(blank=True, null=True, verbose_name="Valid until")),
+                ("key_size", models.SmallIntegerField(verbose_name="Key size")),
+                ("certificate", models.TextField(verbose_name="Certificate")),
+                ("signing", models.BooleanField(default=False, verbose_name="Use for signing")),
+                ("encryption", models.BooleanField(default=False, verbose_name="Use for encryption")),
+                ("created_at", models.DateTimeField(verbose_name="Created at")),
+                ("updated_at", models.DateTimeField(verbose_name="Updated at")),
+                ("end_at", models.DateTimeField(blank=True, null=True, verbose_name="Entry end time")),
+                ("validated", models.DateTimeField(blank=True, null=True, verbose_name="Validated on")),
+                (
+                    "fingerprint_sha256",
+                    models.CharField(blank=True, db_index=True, max_length=64, verbose_name="SHA256 fingerprint"),
+                ),
+                ("fingerprint_sha1", models.CharField(blank=True, max_length=40, verbose_name="SHA1 fingerprint")),
+                ("fingerprint_md5", models.CharField(blank=True, max_length=32, verbose_name="MD5 fingerprint")),
+                ("serial_number", models.CharField(blank=True, max_length=64, verbose_name="Serial number")),
+                (
+                    "public_key_sha256",
+                    models.CharField(
+                        blank=True, db_index=True, max_length=64, verbose_name="SHA256 hash of public key"
+                    ),
+                ),
+                ("archived_at", models.DateTimeField(auto_now_add=True, verbose_name="Archived at")),
+                (
+                    "sp",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_certificates",
+                        to="rr.serviceprovider",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "archived certificate",
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedContact",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("administrative", "Administrative"),
+                            ("technical", "Technical"),
+                            ("support", "Support"),
+                        ],
+                        max_length=30,
+                        verbose_name="Contact Type",
+                    ),
+                ),
+                ("firstname", models.CharField(blank=True, max_length=50, verbose_name="First Name")),
+                ("lastname", models.CharField(blank=True, max_length=50, verbose_name="Last Name")),
+                ("email", models.EmailField(blank=True, max_length=254, verbose_name="E-Mail")),
+                ("created_at", models.DateTimeField(verbose_name="Created at")),
+                ("updated_at", models.DateTimeField(verbose_name="Updated at")),
+                ("end_at", models.DateTimeField(blank=True, null=True, verbose_name="Entry end time")),
+                ("validated", models.DateTimeField(blank=True, null=True, verbose_name="Validated on")),
+                ("archived_at", models.DateTimeField(auto_now_add=True, verbose_name="Archived at")),
+                (
+                    "sp",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_contacts",
+                        to="rr.serviceprovider",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "archived contact",
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedEndpoint",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("AssertionConsumerService", "AssertionConsumerService"),
+                            ("SingleLogoutService", "SingleLogoutService"),
+                            ("ArtifactResolutionService", "ArtifactResolutionService"),
+                        ],
+                        max_length=30,
+                        verbose_name="Endpoint Type",
+                    ),
+                ),
+                (
+                    "binding",
+                    models.CharField(
+                        choices=[
+                            (
+                                "urn:oasis:names:tc:SAML:2.0:bindings:HTTP-POST",
+                                "urn:oasis:names:tc:SAML:2.0:bindings:HTTP-POST",
+                            ),
+                            (
+                                "urn:oasis:names:tc:SAML:2.0:bindings:HTTP-Redirect",
+                                "urn:oasis:names:tc:SAML:2.0:bindings:HTTP-Redirect",
+                            ),
+                            (
+                                "urn:oasis:names:tc:SAML:2.0:bindings:HTTP-Artifact",
+                                "urn:oasis:names:tc:SAML:2.0:bindings:HTTP-Artifact",
+                            ),
+                            ("urn:oasis:names:tc:SAML:2.0:bindings:SOAP", "urn:oasis:names:tc:SAML:2.0:bindings:SOAP"),
+                        ],
+                        max_length=60,
+                        verbose_name="Binding",
+                    ),
+                ),
+                ("location", models.URLField(max_length=255, verbose_name="Location")),
+                ("response_location", models.URLField(blank=True, max_length=255, verbose_name="ResponseLocation")),
+                ("index", models.SmallIntegerField(blank=True, null=True, verbose_name="Index")),
+                ("is_default", models.BooleanField(default=False, verbose_name="isDefault")),
+                ("created_at", models.DateTimeField(verbose_name="Created at")),
+                ("updated_at", models.DateTimeField(verbose_name="Updated at")),
+                ("end_at", models.DateTimeField(blank=True, null=True, verbose_name="Entry end time")),
+                ("validated", models.DateTimeField(blank=True, null=True, verbose_name="Validated on")),
+                ("archived_at", models.DateTimeField(auto_now_add=True, verbose_name="Archived at")),
+                (
+                    "sp",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_endpoints",
+                        to="rr.serviceprovider",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "archived endpoint",
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedRedirectUri",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False, verbose_name="ID")),
+                ("uri", models.CharField(max_length=255, verbose_name="Redirect URI")),
+                ("created_at", models.DateTimeField(verbose_name="Created at")),
+                ("updated_at", models.DateTimeField(verbose_name="Updated at")),
+                ("end_at", models.DateTimeField(blank=True, null=True, verbose_name="Entry end time")),
+                ("validated", models.DateTimeField(blank=True, null=True, verbose_name="Validated on")),
+                ("archived_at", models.DateTimeField(auto_now_add=True, verbose_name="Archived at")),
+                (
+                    "sp",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_redirecturis",
+                        to="rr.serviceprovider",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "archived redirect uri",
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedSPAttribute",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False, verbose_name="ID")),
+                ("reason", models.CharField(max_length=255, verbose_name="Reason for the attribute requisition")),
+                (
+                    "oidc_userinfo",
+                    models.BooleanField(default=False, verbose_name="Release from the userinfo endpoint"),
+                ),
+                ("oidc_id_token", models.BooleanField(default=False, verbose_name="Release in the ID Token")),
+                ("created_at", models.DateTimeField(verbose_name="Created at")),
+                ("updated_at", models.DateTimeField(verbose_name="Updated at")),
+                ("end_at", models.DateTimeField(blank=True, null=True, verbose_name="Entry end time")),
+                ("validated", models.DateTimeField(blank=True, null=True, verbose_name="Validated on")),
+                ("archived_at", models.DateTimeField(auto_now_add=True, verbose_name="Archived at")),
+                (
+                    "attribute",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to="rr.attribute"
+                    ),
+                ),
+                (
+                    "sp",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_spattributes",
+                        to="rr.serviceprovider",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "archived sp attribute",
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedUserGroup",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=255, verbose_name="Group name")),
+                ("created_at", models.DateTimeField(verbose_name="Created at")),
+                ("updated_at", models.DateTimeField(verbose_name="Updated at")),
+                ("end_at", models.DateTimeField(blank=True, null=True, verbose_name="Entry end time")),
+                ("validated", models.DateTimeField(blank=True, null=True, verbose_name="Validated on")),
+                ("archived_at", models.DateTimeField(auto_now_add=True, verbose_name="Archived at")),
+                (
+                    "sp",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_usergroups",
+                        to="rr.serviceprovider",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "archived user group",
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedServiceProvider",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False, verbose_name="ID")),
+                ("entity_id", models.CharField(max_length=255, verbose_name="Entity Id")),
+                (
+                    "service_type",
+                    models.CharField(
+                        choices=[("saml", "SAML / Shibboleth"), ("ldap", "LDAP"), ("oidc", "OIDC")],
+                        max_length=10,
+                        verbose_name="Service type (SAML/LDAP)",
+                    ),
+                ),
+                (
+                    "name_fi",
+                    models.CharField(
+                        blank=True,
+                        max_length=140,
+                        validators=[django.core.validators.MaxLengthValidator(70)],
+                        verbose_name="Service Name (Finnish)",
+                    ),
+                ),
+                (
+                    "name_en",
+                    models.CharField(
+                        blank=True,
+                        max_length=140,
+                        validators=[django.core.validators.MaxLengthValidator(70)],
+                        verbose_name="Service Name (English)",
+                    ),
+                ),
+                (
+                    "name_sv",
+                    models.CharField(
+                        blank=True,
+                        max_length=140,
+                        validators=[django.core.validators.MaxLengthValidator(70)],
+                        verbose_name="Service Name (Swedish)",
+                    ),
+                ),
+                (
+                    "description_fi",
+                    models.CharField(
+                        blank=True,
+                        max_length=140,
+                        validators=[django.core.validators.MaxLengthValidator(140)],
+                        verbose_name="Service Description (Finnish)",
+                    ),
+                ),
+                (
+                    "description_en",
+                    models.CharField(
+                        blank=True,
+                        max_length=140,
+                        validators=[django.core.validators.MaxLengthValidator(140)],
+                        verbose_name="Service Description (English)",
+                    ),
+                ),
+                (
+                    "description_sv",
+                    models.CharField(
+                        blank=True,
+                        max_length=140,
+                        validators=[django.core.validators.MaxLengthValidator(140)],
+                        verbose_name="Service Description (Swedish)",
+                    ),
+                ),
+                (
+                    "privacypolicy_org",
+                    models.BooleanField(default=False, verbose_name="Privacy Policy URLs from Organization"),
+                ),
+                (
+                    "privacypolicy_fi",
+                    models.URLField(blank=True, max_length=255, verbose_name="Privacy Policy URL (Finnish)"),
+                ),
+                (
+                    "privacypolicy_en",
+                    models.URLField(blank=True, max_length=255, verbose_name="Privacy Policy URL (English)"),
+                ),
+                (
+                    "privacypolicy_sv",
+                    models.URLField(blank=True, max_length=255, verbose_name="Privacy Policy URL (Swedish)"),
+                ),
+                ("login_page_url", models.URLField(blank=True, max_length=255, verbose_name="Service Login Page URL")),
+                (
+                    "application_portfolio",
+                    models.URLField(blank=True, max_length=255, verbose_name="Application portfolio URL"),
+                ),
+                ("notes", models.TextField(blank=True, verbose_name="Additional notes")),
+                ("admin_notes", models.TextField(blank=True, verbose_name="Admin notes")),
+                (
+                    "discovery_service_url",
+                    models.URLField(blank=True, max_length=255, verbose_name="Discovery Service URL"),
+                ),
+                ("sign_assertions", models.BooleanField(default=False, verbose_name="Sign SSO assertions")),
+                ("sign_requests", models.BooleanField(default=False, verbose_name="Sign SSO requests")),
+                ("sign_responses", models.BooleanField(default=True, verbose_name="Sign SSO responses")),
+                ("encrypt_assertions", models.BooleanField(default=True, verbose_name="Encrypt SSO assertions")),
+                ("force_mfa", models.BooleanField(default=False, verbose_name="Require MFA authentication")),
+                ("force_sha1", models.BooleanField(default=False, verbose_name="Use SHA-1 as signature algorithm")),
+                (
+                    "force_nameidformat",
+                    models.BooleanField(default=False, verbose_name="Force use of specific nameIDFormat"),
+                ),
+                ("encrypted_client_secret", models.TextField(blank=True, verbose_name="Client secret")),
+                ("jwks_uri", models.URLField(blank=True, max_length=255, verbose_name="URL for the JSON Web Key Set")),
+                ("jwks", models.TextField(blank=True, verbose_name="JSON Web Key Set")),
+                (
+                    "application_type",
+                    models.CharField(
+                        choices=[("web", "web"), ("native", "native")],
+                        default="web",
+                        max_length=8,
+                        verbose_name="Application type",
+                    ),
+                ),
+                (
+                    "subject_identifier",
+                    models.CharField(
+                        blank=True,
+                        choices=[("public", "public"), ("pairwise", "pairwise")],
+                        max_length=8,
+                        verbose_name="Subject identifier",
+                    ),
+                ),
+                (
+                    "saml_subject_identifier",
+                    models.CharField(
+                        choices=[
+                            ("none", "none"),
+                            ("any", "any"),
+                            ("pairwise-id", "pairwise-id"),
+                            ("subject-id", "subject-id"),
+                        ],
+                        default="none",
+                        max_length=11,
+                        verbose_name="Subject identifier",
+                    ),
+                ),
+                (
+                    "token_endpoint_auth_method",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("client_secret_basic", "client_secret_basic"),
+                            ("client_secret_post", "client_secret_post"),
+                            ("client_secret_jwt", "client_secret_jwt"),
+                            ("private_key_jwt", "private_key_jwt"),
+                            ("none", "none"),
+                        ],
+                        max_length=19,
+                        verbose_name="Token endpoint authentication method",
+                    ),
+                ),
+                (
+                    "admin_require_manual_configuration",
+                    models.BooleanField(default=False, verbose_name="This service requires manual configuration"),
+                ),
+                ("production", models.BooleanField(default=False, verbose_name="Publish to production servers")),
+                ("test", models.BooleanField(default=False, verbose_name="Publish to test servers")),
+                (
+                    "saml_product",
+                    models.CharField(blank=True, max_length=255, verbose_name="SAML product this service is using"),
+                ),
+                (
+                    "autoupdate_idp_metadata",
+                    models.BooleanField(default=False, verbose_name="SP updates IdP metadata automatically"),
+                ),
+                (
+                    "uses_ldapauth",
+                    models.BooleanField(default=False, verbose_name="Does this service use the LDAPAuth proxy?"),
+                ),
+                ("server_names", models.TextField(blank=True, verbose_name="Server names (not IPs), one per line")),
+                (
+                    "target_group",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("internet", "Internet"),
+                            ("university", "University of Helsinki users"),
+                            ("restricted", "Restricted user group"),
+                        ],
+                        max_length=10,
+                        verbose_name="Target group for the service",
+                    ),
+                ),
+                (
+                    "service_account",
+                    models.BooleanField(default=False, verbose_name="Does the service use a service account?"),
+                ),
+                (
+                    "service_account_contact",
+                    models.TextField(
+                        blank=True,
+                        verbose_name="Email address and phone number for delivering the service account credentials",
+                    ),
+                ),
+                (
+                    "can_access_all_ldap_groups",
+                    models.BooleanField(default=False, verbose_name="Service requires access to all LDAP groups"),
+                ),
+                (
+                    "local_storage_users",
+                    models.BooleanField(
+                        default=False, verbose_name="Service stores a local copy of users and their information"
+                    ),
+                ),
+                (
+                    "local_storage_passwords",
+                    models.BooleanField(default=False, verbose_name="Service stores a local copy of user passwords"),
+                ),
+                (
+                    "local_storage_passwords_info",
+                    models.TextField(
+                        blank=True, verbose_name="How is this service storing the saved passwords and why?"
+                    ),
+                ),
+                (
+                    "local_storage_groups",
+                    models.BooleanField(
+                        default=False, verbose_name="Service stores a local copy of groups and group members"
+                    ),
+                ),
+                ("modified", models.BooleanField(default=True, verbose_name="Modified")),
+                ("history", models.IntegerField(blank=True, null=True, verbose_name="History key")),
+                ("created_at", models.DateTimeField(verbose_name="Created at")),
+                ("updated_at", models.DateTimeField(verbose_name="Updated at")),
+                ("end_at", models.DateTimeField(blank=True, null=True, verbose_name="Entry end time")),
+                ("validated", models.DateTimeField(blank=True, null=True, verbose_name="Validated on")),
+                ("archived_at", models.DateTimeField(auto_now_add=True, verbose_name="Archived at")),
+                ("admin_groups", models.ManyToManyField(blank=True, related_name="+", to="auth.group")),
+                ("admins", models.ManyToManyField(blank=True, related_name="+", to=settings.AUTH_USER_MODEL)),
+                ("grant_types", models.ManyToManyField(blank=True, related_name="+", to="rr.granttype")),
+                ("nameidformat", models.ManyToManyField(blank=True, related_name="+", to="rr.nameidformat")),
+                ("oidc_scopes", models.ManyToManyField(blank=True, related_name="+", to="rr.oidcscope")),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="rr.organization",
+                        verbose_name="Organization",
+                    ),
+                ),
+                ("response_types", models.ManyToManyField(blank=True, related_name="+", to="rr.responsetype")),
+                (
+                    "updated_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Updated by",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "archived service provider",
+                "indexes": [models.Index(fields=["history"], name="rr_archived_history_5b01ee_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rr", "0069_outgoingemail"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="outgoingemail",
+            name="status",
+            field=models.CharField(
+                choices=[("queued", "Queued"), ("sending", "Sending"), ("sent", "Sent"), ("failed", "Failed")],
+                default="queued",
+                max_length=10,
+                verbose_name="Status",
+            ),
+        ),
+    ]
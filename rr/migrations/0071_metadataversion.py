@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rr", "0070_outgoingemail_sending"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MetadataVersion",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("changed_at", models.DateTimeField(null=True, verbose_name="Changed at")),
+                ("settings_key", models.CharField(max_length=40, verbose_name="Hash of metadata settings")),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rr", "0071_metadataversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="statistics",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True, verbose_name="Updated at"),
+        ),
+    ]
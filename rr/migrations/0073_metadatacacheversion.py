@@ -0,0 +1,25 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rr", "0072_statistics_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MetadataCacheVersion",
+            fields=[
+                ("sp", models.IntegerField(primary_key=True, serialize=False, verbose_name="Service provider ID")),
+                ("invalidations", models.PositiveIntegerField(default=0, verbose_name="Number of invalidations")),
+            ],
+        ),
+        migrations.AddField(
+            model_name="metadatacache",
+            name="version",
+            field=models.CharField(blank=True, max_length=40, verbose_name="Metadata version"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rr", "0073_metadatacacheversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="statisticsalert",
+            name="deviation",
+            field=models.FloatField(null=True, verbose_name="Deviation from baseline"),
+        ),
+    ]
@@ -0,0 +1,78 @@
+from django.db import models
+from django.utils.text import format_lazy
+from django.utils.translation import gettext_lazy as _
+
+from rr.models.certificate import Certificate
+from rr.models.contact import Contact
+from rr.models.endpoint import Endpoint
+from rr.models.redirecturi import RedirectUri
+from rr.models.serviceprovider import ServiceProvider, SPAttribute
+from rr.models.usergroup import UserGroup
+
+
+def _archive_field(field, related_name):
+    """
+    Returns a copy of a model field for an archive model. Timestamps are not
+    updated automatically, so archived values are kept as they are. Relations
+    to service providers use related_name, other relations have no reverse accessor.
+    """
+    name, path, args, kwargs = field.deconstruct()
+    kwargs.pop("auto_now", None)
+    kwargs.pop("auto_now_add", None)
+    if field.is_relation:
+        if field.related_model is ServiceProvider and not field.many_to_many:
+            kwargs["related_name"] = related_name
+        else:
+            kwargs["related_name"] = "+"
+    return field.__class__(*args, **kwargs)
+
+
+def archive_model(model, related_name, indexes=None):
+    """
+    Creates an archive model with the same fields as the model, including
+    many-to-many relations without an explicit through model. Primary keys
+    are copied from the archived rows.
+
+    model: archived model
+    related_name: related name of the archive from service provider
+    indexes: list of field names indexed in the archive
+    """
+    meta = {
+        "verbose_name": format_lazy(_("archived {}"), model._meta.verbose_name),
+        "indexes": [models.Index(fields=[field]) for field in indexes or []],
+    }
+    attrs = {
+        "__module__": __name__,
+        "__doc__": "Stores archived rows of :model:`rr.%s`" % model.__name__,
+        "Meta": type("Meta", (), meta),
+    }
+    for field in model._meta.local_fields:
+        if field.primary_key:
+            attrs[field.name] = models.IntegerField(primary_key=True, serialize=False, verbose_name="ID")
+        else:
+            attrs[field.name] = _archive_field(field, related_name)
+    for field in model._meta.local_many_to_many:
+        if field.remote_field.through._meta.auto_created:
+            attrs[field.name] = _archive_field(field, related_name)
+    attrs["archived_at"] = models.DateTimeField(auto_now_add=True, verbose_name=_("Archived at"))
+    return type("Archived" + model.__name__, (models.Model,), attrs)
+
+
+ArchivedServiceProvider = archive_model(ServiceProvider, "+", indexes=["history"])
+ArchivedCertificate = archive_model(Certificate, "archived_certificates")
+ArchivedContact = archive_model(Contact, "archived_contacts")
+ArchivedEndpoint = archive_model(Endpoint, "archived_endpoints")
+ArchivedRedirectUri = archive_model(RedirectUri, "archived_redirecturis")
+ArchivedSPAttribute = archive_model(SPAttribute, "archived_spattributes")
+ArchivedUserGroup = archive_model(UserGroup, "archived_usergroups")
+
+# Archive models by archived model
+ARCHIVE_MODELS = {
+    ServiceProvider: ArchivedServiceProvider,
+    Certificate: ArchivedCertificate,
+    Contact: ArchivedContact,
+    Endpoint: ArchivedEndpoint,
+    RedirectUri: ArchivedRedirectUri,
+    SPAttribute: ArchivedSPAttribute,
+    UserGroup: ArchivedUserGroup,
+}
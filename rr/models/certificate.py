@@ -2,7 +2,8 @@ from datetime import timedelta
 
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.serialization import Encoding
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
 from cryptography.x509 import oid
 from django.db import models
 from django.utils import timezone
@@ -24,10 +25,7 @@ def certificate_validator(sp, certificate, signing, encryption, error):
         sp
         and Certificate.objects.filter(
             sp=sp,
-            certificate=cert.public_bytes(Encoding.PEM)
-            .decode("utf-8")
-            .replace("-----BEGIN CERTIFICATE-----\n", "")
-            .replace("-----END CERTIFICATE-----\n", ""),
+            fingerprint_sha256=cert.fingerprint(hashes.SHA256()).hex(),
             signing=signing,
             encryption=encryption,
             end_at=None,
@@ -36,6 +34,22 @@ def certificate_validator(sp, certificate, signing, encryption, error):
         raise error(_("Certificate already exists"))
 
 
+def certificate_fingerprints(cert):
+    """
+    Returns dictionary of fingerprints, serial number and public key hash of a loaded certificate.
+    """
+    public_key = cert.public_key().public_bytes(Encoding.DER, PublicFormat.SubjectPublicKeyInfo)
+    digest = hashes.Hash(hashes.SHA256())
+    digest.update(public_key)
+    return {
+        "fingerprint_sha256": cert.fingerprint(hashes.SHA256()).hex(),
+        "fingerprint_sha1": cert.fingerprint(hashes.SHA1()).hex(),
+        "fingerprint_md5": cert.fingerprint(hashes.MD5()).hex(),
+        "serial_number": str(cert.serial_number),
+        "public_key_sha256": digest.finalize().hex(),
+    }
+
+
 def load_certificate(certificate):
     if certificate.endswith("\n"):
         certificate = certificate + "-----END CERTIFICATE-----\n"
@@ -50,9 +64,10 @@ def load_certificate(certificate):
 
 
 class CertificateManager(models.Manager):
-    def add_certificate(self, certificate, sp, signing=True, encryption=True, validate=False):
+    def build_certificate(self, certificate, sp, signing=True, encryption=True, validate=False):
         """
-        Manager for adding a certificate to database.
+        Returns an unsaved certificate object with information parsed from the certificate,
+        or False if the certificate could not be loaded.
         """
         cert = load_certificate(certificate)
         if not cert:
@@ -76,22 +91,32 @@ class CertificateManager(models.Manager):
             validated = timezone.now()
         else:
             validated = None
+        return self.model(
+            sp=sp,
+            cn=cn,
+            issuer=issuer,
+            valid_from=valid_from,
+            valid_until=valid_until,
+            key_size=key_size,
+            certificate=cert.public_bytes(Encoding.PEM)
+            .decode("utf-8")
+            .replace("-----BEGIN CERTIFICATE-----\n", "")
+            .replace("-----END CERTIFICATE-----\n", ""),
+            signing=signing,
+            encryption=encryption,
+            validated=validated,
+            **certificate_fingerprints(cert),
+        )
+
+    def add_certificate(self, certificate, sp, signing=True, encryption=True, validate=False):
+        """
+        Manager for adding a certificate to database.
+        """
+        created = self.build_certificate(certificate, sp, signing=signing, encryption=encryption, validate=validate)
+        if not created:
+            return created
         try:
-            created = self.create(
-                sp=sp,
-                cn=cn,
-                issuer=issuer,
-                valid_from=valid_from,
-                valid_until=valid_until,
-                key_size=key_size,
-                certificate=cert.public_bytes(Encoding.PEM)
-                .decode("utf-8")
-                .replace("-----BEGIN CERTIFICATE-----\n", "")
-                .replace("-----END CERTIFICATE-----\n", ""),
-                signing=signing,
-                encryption=encryption,
-                validated=validated,
-            )
+            created.save(force_insert=True)
         except ValueError as e:
             return None
         return created
@@ -117,6 +142,15 @@ class Certificate(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated at"))
     end_at = models.DateTimeField(blank=True, null=True, verbose_name=_("Entry end time"))
     validated = models.DateTimeField(null=True, blank=True, verbose_name=_("Validated on"))
+    fingerprint_sha256 = models.CharField(
+        max_length=64, blank=True, db_index=True, verbose_name=_("SHA256 fingerprint")
+    )
+    fingerprint_sha1 = models.CharField(max_length=40, blank=True, verbose_name=_("SHA1 fingerprint"))
+    fingerprint_md5 = models.CharField(max_length=32, blank=True, verbose_name=_("MD5 fingerprint"))
+    serial_number = models.CharField(max_length=64, blank=True, verbose_name=_("Serial number"))
+    public_key_sha256 = models.CharField(
+        max_length=64, blank=True, db_index=True, verbose_name=_("SHA256 hash of public key")
+    )
 
     objects = CertificateManager()
 
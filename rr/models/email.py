@@ -1,6 +1,10 @@
+from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from rr.models.spadmin import Keystore
+
 
 class Template(models.Model):
     title = models.CharField(max_length=78, blank=True, null=True, verbose_name=_("Message title"))
@@ -8,3 +12,43 @@ class Template(models.Model):
 
     def __str__(self):
         return self.title
+
+
+class OutgoingEmail(models.Model):
+    """
+    Stores an email message queued for sending to a single recipient,
+    related to :model:`auth.User` and :model:`rr.Keystore`
+
+    While sending, next_attempt_at is the end of the sending lease. Messages
+    with an expired lease are claimed again.
+    """
+
+    QUEUED = "queued"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = ((QUEUED, _("Queued")), (SENDING, _("Sending")), (SENT, _("Sent")), (FAILED, _("Failed")))
+
+    subject = models.CharField(max_length=255, verbose_name=_("Message title"))
+    body = models.TextField(verbose_name=_("Message body"))
+    from_email = models.CharField(max_length=255, verbose_name=_("Sender"))
+    recipient = models.EmailField(verbose_name=_("Recipient"))
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, verbose_name=_("Status"))
+    attempts = models.SmallIntegerField(default=0, verbose_name=_("Sending attempts"))
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name=_("Next sending attempt"))
+    error = models.TextField(blank=True, verbose_name=_("Last error"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created at"))
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Sent at"))
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name=_("Created by")
+    )
+    invite = models.ForeignKey(
+        Keystore, related_name="emails", on_delete=models.SET_NULL, null=True, blank=True, verbose_name=_("Invite")
+    )
+
+    class Meta:
+        ordering = ["-pk"]
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return "%s: %s" % (self.recipient, self.subject)
@@ -0,0 +1,58 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from rr.models.serviceprovider import ServiceProvider
+
+
+class MetadataCache(models.Model):
+    """
+    Stores rendered metadata of a single entity, related to :model:`rr.ServiceProvider`
+
+    Options is a hash of metadata format and generator options. Entries are
+    removed when the service provider or its linked objects are changed.
+    Version is a hash of the service provider and cache versions the metadata
+    was rendered from, and entries are only used if it is still current.
+    """
+
+    sp = models.ForeignKey(ServiceProvider, related_name="metadata_cache", on_delete=models.CASCADE)
+    validated = models.BooleanField(verbose_name=_("Validated metadata"))
+    options = models.CharField(max_length=40, verbose_name=_("Generator options"))
+    version = models.CharField(max_length=40, blank=True, verbose_name=_("Metadata version"))
+    metadata = models.TextField(blank=True, verbose_name=_("Rendered metadata"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created at"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["sp", "validated", "options"], name="unique_metadata_cache"),
+        ]
+
+    def __str__(self):
+        return "%s: %s" % (self.sp, self.options)
+
+
+class MetadataCacheVersion(models.Model):
+    """
+    Stores the number of cached metadata invalidations of a service provider.
+
+    Service provider is not a foreign key, so invalidations can be stored while
+    the service provider is being deleted.
+    """
+
+    sp = models.IntegerField(primary_key=True, verbose_name=_("Service provider ID"))
+    invalidations = models.PositiveIntegerField(default=0, verbose_name=_("Number of invalidations"))
+
+    def __str__(self):
+        return "%s: %s" % (self.sp, self.invalidations)
+
+
+class MetadataVersion(models.Model):
+    """
+    Stores the time of the latest change in objects shared between service providers
+    and in settings used in metadata generation. Only a single row is used.
+    """
+
+    changed_at = models.DateTimeField(null=True, verbose_name=_("Changed at"))
+    settings_key = models.CharField(max_length=40, verbose_name=_("Hash of metadata settings"))
+
+    def __str__(self):
+        return "%s" % self.changed_at
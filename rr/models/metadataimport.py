@@ -0,0 +1,16 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class MetadataImportHash(models.Model):
+    """
+    Stores a hash of canonicalized metadata of an imported entity, used to
+    skip unchanged entities when importing metadata again.
+    """
+
+    entity_id = models.CharField(max_length=255, unique=True, verbose_name=_("Entity Id"))
+    content_hash = models.CharField(max_length=64, verbose_name=_("Metadata hash"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated at"))
+
+    def __str__(self):
+        return "%s: %s" % (self.entity_id, self.content_hash)
@@ -0,0 +1,32 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from rr.models.serviceprovider import ServiceProvider
+
+
+class ServiceHost(models.Model):
+    """
+    Stores a host name used by a current :model:`rr.ServiceProvider` in endpoints,
+    redirect URIs or server names, for finding services by host name.
+
+    Maintained when endpoints, redirect URIs or server names change.
+    """
+
+    ENDPOINT = "endpoint"
+    REDIRECT_URI = "redirecturi"
+    SERVER_NAME = "server_name"
+    SOURCE_CHOICES = (
+        (ENDPOINT, _("Endpoint")),
+        (REDIRECT_URI, _("Redirect URI")),
+        (SERVER_NAME, _("Server name")),
+    )
+
+    sp = models.ForeignKey(ServiceProvider, related_name="hosts", on_delete=models.CASCADE)
+    host = models.CharField(max_length=255, db_index=True, verbose_name=_("Host name"))
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, verbose_name=_("Source"))
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["sp", "host", "source"], name="unique_service_host")]
+
+    def __str__(self):
+        return "%s: %s" % (self.sp, self.host)
@@ -143,6 +143,26 @@ def server_names_validator(server_names, error):
     return server_names
 
 
+class ServiceProviderManager(models.Manager):
+    def get_validated_history(self, pks):
+        """
+        Returns dictionary of the latest validated history versions by SP pk,
+        loaded in a single query.
+
+        pks: list of ServiceProvider pks
+        """
+        if not pks:
+            return {}
+        latest = (
+            self.filter(history__in=pks)
+            .exclude(validated=None)
+            .values("history")
+            .annotate(latest=models.Max("pk"))
+            .values("latest")
+        )
+        return {history.history: history for history in self.filter(pk__in=latest).select_related("organization")}
+
+
 class ServiceProvider(models.Model):
     """
     Stores a service provider, related to :model:`auth.User` and
@@ -322,6 +342,8 @@ class ServiceProvider(models.Model):
     )
     validated = models.DateTimeField(null=True, blank=True, verbose_name=_("Validated on"))
 
+    objects = ServiceProviderManager()
+
     def display_identifier(self):
         """Returns an entity_id for SAML service and first server for
         LDAP service (or entity_id if servers are not defined)"""
@@ -385,6 +407,13 @@ class ServiceProvider(models.Model):
     def __str__(self):
         return self.entity_id
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["service_type", "validated"]),
+            models.Index(fields=["service_type", "end_at"]),
+            models.Index(fields=["history", "validated"]),
+        ]
+
     def _get_fields(self, types):
         """Returns a list of technical information field names on the instance."""
         fields = []
@@ -454,13 +483,14 @@ class ServiceProvider(models.Model):
         return None
 
     def _create_notification(self):
-        services = ServiceProvider.objects.filter(end_at=None, modified=True).order_by("entity_id")
+        services = list(ServiceProvider.objects.filter(end_at=None, modified=True).order_by("entity_id"))
+        validated_history = ServiceProvider.objects.get_validated_history([service.pk for service in services])
         in_production = []
         add_production = []
         remove_production = []
         in_test = []
         for service in services:
-            history = ServiceProvider.objects.filter(history=service.pk).exclude(validated=None).last()
+            history = validated_history.get(service.pk)
             if history and history.production and service.production:
                 in_production.append(service.name() + " (" + service.entity_id + ")")
             elif history and history.production and not service.production:
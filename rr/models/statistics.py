@@ -13,7 +13,69 @@ class Statistics(models.Model):
 
     logins = models.IntegerField(verbose_name=_("Number of logins"))
     users = models.IntegerField(null=True, verbose_name=_("Number of unique users"))
+    users_sketch = models.BinaryField(null=True, verbose_name=_("Unique users sketch"))
     date = models.DateField(verbose_name=_("Login date"))
+    updated_at = models.DateTimeField(auto_now=True, null=True, db_index=True, verbose_name=_("Updated at"))
 
     class Meta:
         ordering = ["-date"]
+        constraints = [models.UniqueConstraint(fields=["sp", "date"], name="unique_statistics_sp_date")]
+
+
+class WeeklyStatistics(models.Model):
+    """
+    Stores weekly totals of :model:`rr.Statistics`, related to :model:`rr.ServiceProvider`
+    """
+
+    sp = models.ForeignKey(ServiceProvider, related_name="weekly_statistics", on_delete=models.CASCADE)
+
+    logins = models.IntegerField(verbose_name=_("Number of logins"))
+    users = models.IntegerField(null=True, verbose_name=_("Highest daily number of unique users"))
+    unique_users = models.IntegerField(null=True, verbose_name=_("Approximate number of unique users"))
+    users_sketch = models.BinaryField(null=True, verbose_name=_("Unique users sketch"))
+    date = models.DateField(verbose_name=_("First day of ISO week"))
+
+    class Meta:
+        ordering = ["-date"]
+        constraints = [models.UniqueConstraint(fields=["sp", "date"], name="unique_weekly_statistics_sp_date")]
+
+
+class MonthlyStatistics(models.Model):
+    """
+    Stores monthly totals of :model:`rr.Statistics`, related to :model:`rr.ServiceProvider`
+    """
+
+    sp = models.ForeignKey(ServiceProvider, related_name="monthly_statistics", on_delete=models.CASCADE)
+
+    logins = models.IntegerField(verbose_name=_("Number of logins"))
+    users = models.IntegerField(null=True, verbose_name=_("Highest daily number of unique users"))
+    unique_users = models.IntegerField(null=True, verbose_name=_("Approximate number of unique users"))
+    users_sketch = models.BinaryField(null=True, verbose_name=_("Unique users sketch"))
+    date = models.DateField(verbose_name=_("First day of month"))
+
+    class Meta:
+        ordering = ["-date"]
+        constraints = [models.UniqueConstraint(fields=["sp", "date"], name="unique_monthly_statistics_sp_date")]
+
+
+class StatisticsAlert(models.Model):
+    """
+    Stores login anomalies and dormant services found in :model:`rr.Statistics`,
+    related to :model:`rr.ServiceProvider`
+    """
+
+    ANOMALY = "anomaly"
+    DORMANT = "dormant"
+    TYPE_CHOICES = ((ANOMALY, _("Logins dropped")), (DORMANT, _("No logins")))
+
+    sp = models.ForeignKey(ServiceProvider, related_name="statistics_alerts", on_delete=models.CASCADE)
+
+    type = models.CharField(max_length=10, choices=TYPE_CHOICES, verbose_name=_("Alert type"))
+    baseline = models.FloatField(null=True, verbose_name=_("Baseline daily logins"))
+    recent = models.FloatField(null=True, verbose_name=_("Recent daily logins"))
+    deviation = models.FloatField(null=True, verbose_name=_("Deviation from baseline"))
+    last_login = models.DateField(null=True, verbose_name=_("Last login date"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created at"))
+
+    class Meta:
+        ordering = ["type", "sp"]
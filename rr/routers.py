@@ -10,6 +10,7 @@ from rr.views_api.serviceprovider import (
     SamlServiceProviderViewSet,
     SPAttributeViewSet,
 )
+from rr.views_api.statistics import StatisticsViewSet
 from rr.views_api.testuser import TestUserDataViewSet, TestUserViewSet
 from rr.views_api.usergroup import UserGroupViewSet
 
@@ -22,6 +23,7 @@ router.register(r"redirecturis", RedirectUriViewSet)
 router.register(r"services/saml", SamlServiceProviderViewSet, basename="service-saml")
 router.register(r"services/oidc", OidcServiceProviderViewSet, basename="service-oidc")
 router.register(r"services/ldap", LdapServiceProviderViewSet, basename="service-ldap")
+router.register(r"statistics", StatisticsViewSet, basename="statistics")
 router.register(r"testusers", TestUserViewSet)
 router.register(r"testuserdata", TestUserDataViewSet)
 router.register(r"usergroups", UserGroupViewSet)
@@ -38,6 +38,9 @@ class CertificateSerializer(serializers.ModelSerializer):
             "end_at",
             "validated",
             "status",
+            "fingerprint_sha256",
+            "serial_number",
+            "public_key_sha256",
         ]
         read_only_fields = [
             "cn",
@@ -45,6 +48,9 @@ class CertificateSerializer(serializers.ModelSerializer):
             "valid_from",
             "valid_until",
             "key_size",
+            "fingerprint_sha256",
+            "serial_number",
+            "public_key_sha256",
             "created_at",
             "updated_at",
             "end_at",
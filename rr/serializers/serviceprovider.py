@@ -4,6 +4,7 @@ import re
 from django.contrib.auth.models import Group, User
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
@@ -26,7 +27,7 @@ from rr.serializers.certificate import CertificateLimitedSerializer
 from rr.serializers.contact import ContactLimitedSerializer
 from rr.serializers.endpoint import EndpointLimitedSerializer
 from rr.serializers.redirecturi import RedirectUriLimitedSerializer
-from rr.utils.missing_data import get_missing_sp_data
+from rr.utils.missing_data import get_missing_sp_data, get_missing_sp_data_messages
 from rr.utils.serviceprovider import create_sp_history_copy
 
 logger = logging.getLogger(__name__)
@@ -59,6 +60,22 @@ def _update_spattributes(validated_data, instance, user, modified):
     return modified
 
 
+def _get_missing_data(instance):
+    """
+    Returns list of data missing for production use, using missing_data_flags annotation if available
+    """
+    if hasattr(instance, "missing_data_flags"):
+        return get_missing_sp_data_messages(instance, instance.missing_data_flags, links=False)
+    return get_missing_sp_data(instance, links=False)
+
+
+def _clear_missing_data_flags(instance):
+    """
+    Removes missing_data_flags annotation after update, so missing data is checked from current data
+    """
+    instance.__dict__.pop("missing_data_flags", None)
+
+
 def _update_certificates(validated_data, instance, user, modified):
     if "certificates" in validated_data:
         certificates = validated_data.pop("certificates")
@@ -201,14 +218,20 @@ class SamlServiceProviderSerializer(serializers.ModelSerializer):
         many=True, slug_field="nameidformat", queryset=NameIDFormat.objects.filter(public=True), required=False
     )
 
+    missing_data = serializers.SerializerMethodField()
+
     class Meta:
         model = ServiceProvider
-        fields = ["id"] + get_field_names(["basic", "saml", "basic_linked", "saml_linked", "meta"])
+        fields = ["id"] + get_field_names(["basic", "saml", "basic_linked", "saml_linked", "meta"]) + ["missing_data"]
         read_only_fields = get_field_names("meta")
         validators = [
             UniqueTogetherValidator(queryset=ServiceProvider.objects.filter(end_at=None), fields=["entity_id"])
         ]
 
+    @extend_schema_field(serializers.ListField(child=serializers.CharField()))
+    def get_missing_data(self, obj):
+        return _get_missing_data(obj)
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         representation["attributes"] = list(filter(lambda x: x["status"] != "removed", representation["attributes"]))
@@ -347,6 +370,7 @@ class SamlServiceProviderSerializer(serializers.ModelSerializer):
                 instance.save_modified()
             else:
                 instance.save()
+        _clear_missing_data_flags(instance)
         return instance
 
 
@@ -383,14 +407,20 @@ class OidcServiceProviderSerializer(serializers.ModelSerializer):
         many=True, slug_field="name", queryset=ResponseType.objects.all(), required=False
     )
 
+    missing_data = serializers.SerializerMethodField()
+
     class Meta:
         model = ServiceProvider
-        fields = ["id"] + get_field_names(["basic", "oidc", "basic_linked", "oidc_linked", "meta"])
+        fields = ["id"] + get_field_names(["basic", "oidc", "basic_linked", "oidc_linked", "meta"]) + ["missing_data"]
         read_only_fields = get_field_names("meta")
         validators = [
             UniqueTogetherValidator(queryset=ServiceProvider.objects.filter(end_at=None), fields=["entity_id"])
         ]
 
+    @extend_schema_field(serializers.ListField(child=serializers.CharField()))
+    def get_missing_data(self, obj):
+        return _get_missing_data(obj)
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         representation["attributes"] = list(filter(lambda x: x["status"] != "removed", representation["attributes"]))
@@ -517,6 +547,7 @@ class OidcServiceProviderSerializer(serializers.ModelSerializer):
                 instance.save_modified()
             else:
                 instance.save()
+        _clear_missing_data_flags(instance)
         return instance
 
 
@@ -543,11 +574,17 @@ class LdapServiceProviderSerializer(serializers.ModelSerializer):
         many=True, slug_field="name", queryset=UserGroup.objects.all(), required=False
     )
 
+    missing_data = serializers.SerializerMethodField()
+
     class Meta:
         model = ServiceProvider
-        fields = ["id"] + get_field_names(["basic", "ldap", "basic_linked", "ldap_linked", "meta"])
+        fields = ["id"] + get_field_names(["basic", "ldap", "basic_linked", "ldap_linked", "meta"]) + ["missing_data"]
         read_only_fields = get_field_names("meta")
 
+    @extend_schema_field(serializers.ListField(child=serializers.CharField()))
+    def get_missing_data(self, obj):
+        return _get_missing_data(obj)
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         representation["attributes"] = list(filter(lambda x: x["status"] != "removed", representation["attributes"]))
@@ -656,4 +693,5 @@ class LdapServiceProviderSerializer(serializers.ModelSerializer):
                 instance.save_modified()
             else:
                 instance.save()
+        _clear_missing_data_flags(instance)
         return instance
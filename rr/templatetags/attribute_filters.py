@@ -46,10 +46,16 @@ def get_production_status(obj):
     """
     Return production status from history if object is not validated
     Return false if there is no validated object
+    Uses production_status annotation if available
     """
+    if hasattr(obj, "production_status"):
+        return obj.production_status
     if obj.validated:
         return obj.production
-    history = ServiceProvider.objects.filter(history=obj.pk).exclude(validated=None).last()
+    if hasattr(obj, "validated_history"):
+        history = obj.validated_history
+    else:
+        history = ServiceProvider.objects.get_validated_history([obj.pk]).get(obj.pk)
     if history:
         return history.production
     else:
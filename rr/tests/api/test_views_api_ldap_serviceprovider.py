@@ -1,6 +1,6 @@
 from django.contrib.auth.models import Group, User
 from rest_framework import status
-from rest_framework.test import APIRequestFactory
+from rest_framework.test import APIRequestFactory, force_authenticate
 
 from rr.models.attribute import Attribute
 from rr.models.serviceprovider import ServiceProvider
@@ -37,6 +37,15 @@ class ServiceTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 2)
 
+    def test_service_provider_list_filter_host(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.object.server_names = "ldap.example.org"
+            self.object.save()
+        request = self.factory.get(self.url, {"host": "LDAP.example.org"})
+        force_authenticate(request, user=self.superuser)
+        response = self.viewset.as_view(actions={"get": "list"})(request)
+        self.assertEqual([sp["id"] for sp in response.data["results"]], [self.object.pk])
+
     def test_service_provider_access_object_without_user(self):
         response = self._test_access(user=None, pk=self.object.pk)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
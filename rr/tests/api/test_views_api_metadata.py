@@ -0,0 +1,118 @@
+import gzip
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from lxml import etree
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from rr.models.attribute import Attribute
+from rr.models.serviceprovider import ServiceProvider
+from rr.views_api.metadata import MetadataExportView
+
+
+class MetadataExportTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create(username="tester")
+        self.superuser = User.objects.create(username="superuser", is_superuser=True)
+        self.sp = ServiceProvider.objects.create(
+            entity_id="https://sp.example.org/sp", service_type="saml", production=True, validated=timezone.now()
+        )
+        self.oidc_sp = ServiceProvider.objects.create(
+            entity_id="oidc_client", service_type="oidc", production=True, validated=timezone.now()
+        )
+
+    def _get(self, service_type, user, **headers):
+        request = self.factory.get("/api/v1/metadata/%s/" % service_type, **headers)
+        force_authenticate(request, user=user)
+        return MetadataExportView.as_view()(request, service_type=service_type)
+
+    def test_metadata_export_access(self):
+        self.assertEqual(self._get("saml", None).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self._get("saml", self.user).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self._get("unknown", self.superuser).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(READ_ALL_GROUP="read_all")
+    def test_metadata_export_access_read_all_group(self):
+        self.user.groups.add(Group.objects.create(name="read_all"))
+        self.assertEqual(self._get("saml", self.user).status_code, status.HTTP_200_OK)
+
+    def test_metadata_export_saml(self):
+        response = self._get("saml", self.superuser, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertTrue(response["ETag"].endswith('-gzip"'))
+        self.assertIn("Last-Modified", response)
+        tree = etree.fromstring(gzip.decompress(response.content))
+        self.assertEqual(tree[0].get("entityID"), "https://sp.example.org/sp")
+
+    def test_metadata_export_uncompressed(self):
+        response = self._get("oidc", self.superuser)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(json.loads(response.content)[0]["client_id"], "oidc_client")
+
+    def test_metadata_export_ldap(self):
+        response = self._get("ldap", self.superuser)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(etree.fromstring(response.content).tag, "LdapEntities")
+
+    def test_metadata_export_not_modified(self):
+        response = self._get("saml", self.superuser)
+        with self.assertNumQueries(2):
+            not_modified = self._get("saml", self.superuser, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        with self.assertNumQueries(2):
+            not_modified = self._get("saml", self.superuser, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_metadata_export_changes_with_validation(self):
+        response = self._get("saml", self.superuser)
+        ServiceProvider.objects.create(
+            entity_id="https://sp2.example.org/sp", service_type="saml", production=True, validated=timezone.now()
+        )
+        modified = self._get("saml", self.superuser, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(modified["ETag"], response["ETag"])
+        self.assertEqual(len(etree.fromstring(modified.content)), 2)
+        self.sp.end_at = timezone.now()
+        self.sp.save()
+        removed = self._get("saml", self.superuser, HTTP_IF_NONE_MATCH=modified["ETag"])
+        self.assertEqual(removed.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(etree.fromstring(removed.content)), 1)
+
+    def test_metadata_export_changes_with_production_status(self):
+        ServiceProvider.objects.update(
+            validated=timezone.now() - timedelta(hours=1), updated_at=timezone.now() - timedelta(hours=1)
+        )
+        response = self._get("saml", self.superuser)
+        self.sp.refresh_from_db()
+        self.sp.production = False
+        self.sp.save()
+        modified = self._get("saml", self.superuser, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(modified["ETag"], response["ETag"])
+        self.assertEqual(len(etree.fromstring(modified.content)), 0)
+
+    def test_metadata_export_changes_with_shared_objects(self):
+        response = self._get("saml", self.superuser)
+        Attribute.objects.create(friendlyname="cn", name="urn:oid:2.5.4.3", attributeid="id-cn")
+        modified = self._get("saml", self.superuser, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(modified["ETag"], response["ETag"])
+
+    def test_metadata_export_changes_with_settings(self):
+        ServiceProvider.objects.update(
+            validated=timezone.now() - timedelta(hours=1), updated_at=timezone.now() - timedelta(hours=1)
+        )
+        response = self._get("saml", self.superuser)
+        with override_settings(DISABLE_METADATA_ENTITY_EXTENSIONS=True):
+            modified = self._get("saml", self.superuser, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(modified["Last-Modified"], response["Last-Modified"])
@@ -48,6 +48,18 @@ class ServiceTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 2)
 
+    def test_service_provider_list_missing_data(self):
+        response = self._test_list(user=self.superuser)
+        missing_data = {sp["id"]: sp["missing_data"] for sp in response.data["results"]}
+        self.assertNotIn("Service name in English or in Finnish", missing_data[self.object.pk])
+        self.assertIn("Service name in English or in Finnish", missing_data[self.super_user_object.pk])
+        self.assertIn("Certificate", missing_data[self.object.pk])
+
+    def test_service_provider_update_missing_data(self):
+        response = self._test_patch(user=self.superuser, data={"name_en": "Named"}, pk=self.super_user_object.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Service name in English or in Finnish", response.data["missing_data"])
+
     def test_service_provider_access_object_without_user(self):
         response = self._test_access(user=None, pk=self.object.pk)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,102 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from rr.models.serviceprovider import ServiceProvider
+from rr.models.statistics import Statistics
+from rr.utils.hyperloglog import HyperLogLog
+from rr.utils.statistics import (
+    get_entity_map,
+    rebuild_statistics_rollups,
+    save_statistics,
+)
+from rr.views_api.statistics import StatisticsViewSet
+
+
+def sketch(users):
+    sketch = HyperLogLog()
+    for user in users:
+        sketch.add(user)
+    return sketch.to_bytes()
+
+
+class StatisticsAPITestCase(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create(username="tester")
+        self.superuser = User.objects.create(username="superuser", is_superuser=True)
+        self.sp = ServiceProvider.objects.create(entity_id="https://sp.example.org/sp", service_type="saml")
+        self.sp.admins.add(self.user)
+        self.sp2 = ServiceProvider.objects.create(entity_id="https://sp2.example.org/sp", service_type="saml")
+        # 2023-05-29 is Monday
+        for day, users in [(28, ["a", "b"]), (29, ["a", "c"]), (30, ["b"]), (31, ["d"])]:
+            Statistics.objects.create(
+                sp=self.sp, date=date(2023, 5, day), logins=10, users=len(users), users_sketch=sketch(users)
+            )
+        Statistics.objects.create(sp=self.sp, date=date(2023, 6, 5), logins=5, users=4)
+        Statistics.objects.create(sp=self.sp2, date=date(2023, 5, 30), logins=7, users=3)
+        rebuild_statistics_rollups()
+
+    def _get(self, user, **params):
+        request = self.factory.get("/api/v1/statistics/", params)
+        force_authenticate(request, user=user)
+        return StatisticsViewSet.as_view({"get": "list"})(request)
+
+    def test_statistics_access(self):
+        self.assertEqual(self._get(None).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self._get(self.user, start="2023-05-01", end="2023-06-30")
+        self.assertEqual([result["sp"] for result in response.data["results"]], [self.sp.pk])
+        response = self._get(self.superuser, start="2023-05-01", end="2023-06-30", sp="%s,%s" % (self.sp.pk, 0))
+        self.assertEqual([result["sp"] for result in response.data["results"]], [self.sp.pk])
+
+    def test_statistics_day(self):
+        response = self._get(self.superuser, start="2023-05-30", end="2023-05-31")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Cache-Control"], "private, max-age=300")
+        results = {result["sp"]: result["series"] for result in response.data["results"]}
+        self.assertEqual(
+            results[self.sp.pk],
+            [{"date": "2023-05-30", "logins": 10, "users": 1}, {"date": "2023-05-31", "logins": 10, "users": 1}],
+        )
+        self.assertEqual(results[self.sp2.pk], [{"date": "2023-05-30", "logins": 7, "users": 3}])
+
+    def test_statistics_week(self):
+        response = self._get(self.superuser, bucket="week", start="2023-05-28", end="2023-06-11", sp=self.sp.pk)
+        self.assertEqual(
+            response.data["results"][0]["series"],
+            [
+                {"date": "2023-05-22", "logins": 10, "users": 2},
+                {"date": "2023-05-29", "logins": 30, "users": 4},
+                {"date": "2023-06-05", "logins": 5, "users": 4},
+            ],
+        )
+
+    def test_statistics_month(self):
+        response = self._get(self.superuser, bucket="month", start="2023-05-29", end="2023-06-30", sp=self.sp.pk)
+        self.assertEqual(
+            response.data["results"][0]["series"],
+            [{"date": "2023-05-01", "logins": 30, "users": 4}, {"date": "2023-06-01", "logins": 5, "users": 4}],
+        )
+
+    def test_statistics_invalid_parameters(self):
+        self.assertEqual(self._get(self.superuser, bucket="year").status_code, status.HTTP_400_BAD_REQUEST)
+        response = self._get(self.superuser, start="2023-06-01", end="2023-05-01")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_statistics_not_modified(self):
+        response = self._get(self.superuser, start="2023-05-01", end="2023-06-30")
+        request = self.factory.get(
+            "/api/v1/statistics/", {"start": "2023-05-01", "end": "2023-06-30"}, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        force_authenticate(request, user=self.superuser)
+        # Service providers and the latest statistics date
+        with self.assertNumQueries(2):
+            not_modified = StatisticsViewSet.as_view({"get": "list"})(request)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Re-imported day before the latest statistics date
+        save_statistics([(self.sp.entity_id, date(2023, 5, 30), 12, 1)], get_entity_map())
+        modified = self._get(self.superuser, start="2023-05-01", end="2023-06-30")
+        self.assertNotEqual(modified["ETag"], response["ETag"])
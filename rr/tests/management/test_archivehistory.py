@@ -0,0 +1,100 @@
+from io import StringIO
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from rr.models.archive import ArchivedEndpoint, ArchivedServiceProvider
+from rr.models.endpoint import Endpoint
+from rr.models.serviceprovider import ServiceProvider
+from rr.utils.archive import get_history_versions, get_linked_objects_at
+
+
+class ArchiveHistoryTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.sp = ServiceProvider.objects.create(
+            entity_id="https://sp.example.org/sp", service_type="saml", validated=self.now
+        )
+        self.old = Endpoint.objects.create(
+            sp=self.sp, type="AssertionConsumerService", location="https://sp.example.org/old"
+        )
+        self.recent = Endpoint.objects.create(
+            sp=self.sp, type="AssertionConsumerService", location="https://sp.example.org/recent"
+        )
+        self.active = Endpoint.objects.create(
+            sp=self.sp, type="AssertionConsumerService", location="https://sp.example.org/acs"
+        )
+        Endpoint.objects.filter(pk=self.old.pk).update(
+            created_at=self.now - relativedelta(years=3), end_at=self.now - relativedelta(years=2)
+        )
+        Endpoint.objects.filter(pk=self.recent.pk).update(end_at=self.now - relativedelta(days=10))
+
+    def _history_copy(self, years, validated=True):
+        return ServiceProvider.objects.create(
+            entity_id=self.sp.entity_id,
+            service_type="saml",
+            history=self.sp.pk,
+            end_at=self.now - relativedelta(years=years),
+            validated=self.now - relativedelta(years=years) if validated else None,
+        )
+
+    def test_archive_linked_objects(self):
+        out = StringIO()
+        call_command("archivehistory", stdout=out)
+        self.assertIn("Endpoint: 1", out.getvalue())
+        self.assertEqual(set(Endpoint.objects.values_list("pk", flat=True)), {self.recent.pk, self.active.pk})
+        archived = ArchivedEndpoint.objects.get()
+        self.assertEqual(archived.pk, self.old.pk)
+        self.assertEqual(archived.location, "https://sp.example.org/old")
+        self.assertEqual(archived.end_at, self.now - relativedelta(years=2))
+        self.assertEqual(list(self.sp.archived_endpoints.all()), [archived])
+
+    def test_archive_unvalidated_service(self):
+        ServiceProvider.objects.filter(pk=self.sp.pk).update(validated=None)
+        call_command("archivehistory", stdout=StringIO())
+        self.assertEqual(Endpoint.objects.count(), 3)
+        self._history_copy(1)
+        call_command("archivehistory", stdout=StringIO())
+        self.assertEqual(ArchivedEndpoint.objects.get().pk, self.old.pk)
+
+    def test_archive_list_only(self):
+        out = StringIO()
+        call_command("archivehistory", "-l", stdout=out)
+        self.assertIn("(List only) Endpoint: 1", out.getvalue())
+        self.assertEqual(Endpoint.objects.count(), 3)
+        self.assertFalse(ArchivedEndpoint.objects.exists())
+
+    def test_archive_retention(self):
+        call_command("archivehistory", "-d", "1000", stdout=StringIO())
+        self.assertEqual(Endpoint.objects.count(), 3)
+        call_command("archivehistory", "-d", "1", stdout=StringIO())
+        self.assertEqual(Endpoint.objects.count(), 1)
+
+    def test_archive_history_copies(self):
+        user = User.objects.create(username="tester")
+        oldest = self._history_copy(4)
+        oldest.admins.add(user)
+        unvalidated = self._history_copy(3, validated=False)
+        latest = self._history_copy(2)
+        call_command("archivehistory", "-c", "1", stdout=StringIO())
+        self.assertEqual(set(ServiceProvider.objects.values_list("pk", flat=True)), {self.sp.pk, latest.pk})
+        self.assertEqual(ServiceProvider.objects.get_validated_history([self.sp.pk])[self.sp.pk], latest)
+        archived = ArchivedServiceProvider.objects.get(pk=oldest.pk)
+        self.assertEqual(list(archived.admins.all()), [user])
+        self.assertTrue(ArchivedServiceProvider.objects.filter(pk=unvalidated.pk).exists())
+        versions = get_history_versions(self.sp.pk)
+        self.assertEqual([version.pk for version in versions], [oldest.pk, unvalidated.pk, latest.pk])
+        self.assertEqual(versions[0].validated, oldest.validated)
+
+    def test_linked_objects_at(self):
+        call_command("archivehistory", stdout=StringIO())
+        with self.assertNumQueries(1):
+            objects = get_linked_objects_at(self.sp, Endpoint, self.now - relativedelta(years=2, days=1))
+        self.assertEqual([obj.pk for obj in objects], [self.old.pk])
+        self.assertEqual(objects[0].location, "https://sp.example.org/old")
+        self.assertEqual(objects[0].sp_id, self.sp.pk)
+        objects = get_linked_objects_at(self.sp.pk, Endpoint, timezone.now())
+        self.assertEqual([obj.pk for obj in objects], [self.active.pk])
@@ -3,10 +3,15 @@ from io import StringIO
 from dateutil.relativedelta import relativedelta
 from django.contrib.auth.models import User
 from django.core.management import call_command
-from django.test import RequestFactory, TestCase
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from rr.models.contact import Contact
+from rr.models.endpoint import Endpoint
+from rr.models.metadatacache import MetadataCache
+from rr.models.servicehost import ServiceHost
 from rr.models.serviceprovider import ServiceProvider
 from rr.models.spadmin import Keystore
 
@@ -40,7 +45,10 @@ class CleanDBTest(TestCase):
         self.sp2.save()
         out = StringIO()
         call_command("cleandb", "-l", "-s", stdout=out)
-        self.assertIn("(List only) Removing service provider: test:entity:1", out.getvalue())
+        self.assertEqual(
+            out.getvalue(),
+            "(List only) Number of service providers (history): 0\n(List only) Number of service providers: 1\n",
+        )
         self.assertEqual(ServiceProvider.objects.all().count(), 2)
 
     def test_cleandb_contacts(self):
@@ -79,3 +87,73 @@ class CleanDBTest(TestCase):
         )
         call_command("cleandb", "-i")
         self.assertEqual(Keystore.objects.all().count(), 1)
+
+    def test_cleandb_serviceprovider_history(self):
+        self.sp1.end_at = timezone.now() - relativedelta(days=365)
+        self.sp1.save()
+        ServiceProvider.objects.create(entity_id="test:entity:1", service_type="saml", history=self.sp1.pk)
+        ServiceProvider.objects.create(
+            entity_id="https://sp2.example.org/sp", service_type="saml", history=self.sp2.pk
+        )
+        call_command("cleandb", "-s")
+        self.assertEqual(ServiceProvider.objects.all().count(), 2)
+        self.assertFalse(ServiceProvider.objects.filter(entity_id="test:entity:1").exists())
+
+    def test_cleandb_chunks(self):
+        for i in range(5):
+            User.objects.create(username="tester%s" % i, last_login=timezone.now() - relativedelta(days=365))
+        call_command("cleandb", "-u", "-b", "2")
+        self.assertEqual(User.objects.all().count(), 0)
+
+    def test_cleandb_users_listonly_counts(self):
+        for i in range(5):
+            User.objects.create(username="tester%s" % i, last_login=timezone.now() - relativedelta(days=365))
+        self.sp1.admins.add(User.objects.get(username="tester0"))
+        out = StringIO()
+        with self.assertNumQueries(1):
+            call_command("cleandb", "-l", "-u", "-b", "2", stdout=out)
+        self.assertEqual(out.getvalue(), "(List only) Number of users: 4\n")
+        self.assertEqual(User.objects.all().count(), 5)
+
+    def test_cleandb_contacts_listonly(self):
+        self.sp1.end_at = timezone.now() - relativedelta(days=365)
+        self.sp1.save()
+        history = ServiceProvider.objects.create(entity_id="test:entity:1", service_type="saml", history=self.sp1.pk)
+        Contact.objects.create(sp=self.sp1, type="administrative", firstname="Teppo", lastname="Testaaja")
+        Contact.objects.create(sp=history, type="administrative", firstname="Matti", lastname="Meikäläinen")
+        out = StringIO()
+        call_command("cleandb", "-l", "-c", stdout=out)
+        self.assertIn("(List only) Number of contacts (history): 1", out.getvalue())
+        self.assertIn("(List only) Number of contacts: 1", out.getvalue())
+        self.assertEqual(Contact.objects.all().count(), 2)
+
+    def _create_removed_sps(self, start, end):
+        for i in range(start, end):
+            sp = ServiceProvider.objects.create(
+                entity_id="https://sp%s.example.org/removed" % i,
+                service_type="saml",
+                end_at=timezone.now() - relativedelta(days=400),
+            )
+            Contact.objects.create(sp=sp, type="technical", email="tech%s@example.org" % i)
+            Endpoint.objects.create(
+                sp=sp, type="AssertionConsumerService", location="https://sp%s.example.org/acs" % i
+            )
+            MetadataCache.objects.create(sp=sp, options="test", validated=False, metadata="<EntityDescriptor/>")
+            ServiceHost.objects.create(sp=sp, host="sp%s.example.org" % i, source=ServiceHost.ENDPOINT)
+            history = ServiceProvider.objects.create(
+                entity_id=sp.entity_id, service_type="saml", history=sp.pk, end_at=sp.end_at
+            )
+            Contact.objects.create(sp=history, type="technical", email="tech%s@example.org" % i)
+
+    @override_settings(METADATA_CACHE=True)
+    def test_cleandb_serviceprovider_query_count(self):
+        self._create_removed_sps(0, 2)
+        with CaptureQueriesContext(connection) as queries:
+            call_command("cleandb", "-s", "-b", "10")
+        self._create_removed_sps(2, 7)
+        with self.assertNumQueries(len(queries)):
+            call_command("cleandb", "-s", "-b", "10")
+        self.assertEqual(ServiceProvider.objects.count(), 2)
+        self.assertFalse(MetadataCache.objects.exists())
+        self.assertFalse(ServiceHost.objects.exists())
+        self.assertFalse(Contact.objects.exists())
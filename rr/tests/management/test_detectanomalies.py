@@ -0,0 +1,96 @@
+import math
+from array import array
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from rr.models.serviceprovider import ServiceProvider
+from rr.models.statistics import Statistics, StatisticsAlert
+from rr.utils.statistics_alerts import (
+    detect_statistics_alerts,
+    load_login_series,
+    rolling_deviations,
+)
+
+
+class DetectAnomaliesTest(TestCase):
+    def setUp(self):
+        created_at = timezone.now() - timedelta(days=365)
+        self.yesterday = date.today() - timedelta(days=1)
+        self.normal_sp = ServiceProvider.objects.create(
+            entity_id="https://normal.example.org/sp", service_type="saml", production=True
+        )
+        self.dropped_sp = ServiceProvider.objects.create(
+            entity_id="https://dropped.example.org/sp", service_type="oidc", production=True
+        )
+        self.dormant_sp = ServiceProvider.objects.create(
+            entity_id="https://dormant.example.org/sp", service_type="saml", production=True
+        )
+        self.new_sp = ServiceProvider.objects.create(
+            entity_id="https://new.example.org/sp", service_type="saml", production=True
+        )
+        self.noisy_sp = ServiceProvider.objects.create(
+            entity_id="https://noisy.example.org/sp", service_type="saml", production=True
+        )
+        ServiceProvider.objects.filter(
+            pk__in=[self.normal_sp.pk, self.dropped_sp.pk, self.dormant_sp.pk, self.noisy_sp.pk]
+        ).update(created_at=created_at)
+        statistics = []
+        for days in range(1, 46):
+            day = self.yesterday - timedelta(days=days - 1)
+            statistics.append(Statistics(sp=self.normal_sp, date=day, logins=100))
+            statistics.append(Statistics(sp=self.dropped_sp, date=day, logins=1 if days <= 7 else 50))
+            # Recent logins dropped, but within normal variation
+            statistics.append(Statistics(sp=self.noisy_sp, date=day, logins=5 if days <= 7 else days % 2 * 100))
+        statistics.append(Statistics(sp=self.dormant_sp, date=self.yesterday - timedelta(days=200), logins=5))
+        Statistics.objects.bulk_create(statistics)
+
+    def test_load_login_series(self):
+        with self.assertNumQueries(1):
+            series = load_login_series(
+                [self.normal_sp.pk, self.new_sp.pk], self.yesterday - timedelta(days=39), self.yesterday
+            )
+        self.assertEqual(list(series[self.normal_sp.pk]), [100] * 40)
+        self.assertEqual(list(series[self.new_sp.pk]), [0] * 40)
+
+    def test_detect_statistics_alerts(self):
+        alerts = {alert.sp_id: alert for alert in detect_statistics_alerts()}
+        self.assertEqual(set(alerts), {self.dropped_sp.pk, self.dormant_sp.pk})
+        self.assertEqual(alerts[self.dropped_sp.pk].type, StatisticsAlert.ANOMALY)
+        self.assertEqual(alerts[self.dropped_sp.pk].baseline, 50)
+        self.assertEqual(alerts[self.dropped_sp.pk].recent, 1)
+        self.assertAlmostEqual(alerts[self.dropped_sp.pk].deviation, -49 / math.sqrt(50))
+        self.assertEqual(alerts[self.dormant_sp.pk].type, StatisticsAlert.DORMANT)
+        self.assertEqual(alerts[self.dormant_sp.pk].last_login, self.yesterday - timedelta(days=200))
+
+    def test_rolling_deviations(self):
+        logins = array("l", [10, 30] * 5 + [20, 0])
+        results = rolling_deviations(logins, baseline_days=4, recent_days=2)
+        self.assertEqual([(mean, std) for mean, std, score in results], [(20, 10), (20, 10)])
+        self.assertEqual([score for mean, std, score in results], [0, -2])
+        # Standard deviation is at least the square root of the mean
+        self.assertEqual(rolling_deviations(array("l", [100] * 7), 4, 2), [(100, 10, 0), (100, 10, 0)])
+
+    def test_detectanomalies_save(self):
+        StatisticsAlert.objects.create(sp=self.normal_sp, type=StatisticsAlert.DORMANT)
+        out = StringIO()
+        call_command("detectanomalies", "-s", "-p", stdout=out)
+        self.assertEqual(
+            set(StatisticsAlert.objects.values_list("sp", "type")),
+            {(self.dropped_sp.pk, StatisticsAlert.ANOMALY), (self.dormant_sp.pk, StatisticsAlert.DORMANT)},
+        )
+        self.assertIn("anomaly: https://dropped.example.org/sp, 50.0 -> 1.0 (-6.9)", out.getvalue())
+
+    def test_detectanomalies_threshold(self):
+        call_command("detectanomalies", "-s", "-t", "0.01")
+        self.assertEqual(list(StatisticsAlert.objects.values_list("sp", flat=True)), [self.dormant_sp.pk])
+
+    def test_detectanomalies_deviation(self):
+        call_command("detectanomalies", "-s", "-z", "0.5")
+        self.assertEqual(
+            set(StatisticsAlert.objects.values_list("sp", flat=True)),
+            {self.dropped_sp.pk, self.dormant_sp.pk, self.noisy_sp.pk},
+        )
@@ -1,4 +1,6 @@
+import hashlib
 import os
+import tempfile
 from io import StringIO
 
 from django.core.management import call_command
@@ -27,6 +29,38 @@ class ExportMetadataTest(TestCase):
     def test_exportmetadata(self):
         out = StringIO()
         call_command("exportmetadata", "-p", "-u", stdout=out)
-        self.assertIn('<EntitiesDescriptor xmlns:ds="http://www.w3.org/2000/09/xmldsig#"', out.getvalue())
-        self.assertIn('<EntityDescriptor entityID="https://sp.example.org/sp">', out.getvalue())
-        self.assertIn('<EntityDescriptor entityID="test:entity:1">', out.getvalue())
+        self.assertTrue(out.getvalue().startswith('<?xml version="1.0" encoding="UTF-8"?>\n<EntitiesDescriptor '))
+        self.assertIn('\n  <EntityDescriptor xmlns:ds="http://www.w3.org/2000/09/xmldsig#" ', out.getvalue())
+        self.assertNotIn("xmlns:xmlns", out.getvalue())
+        tree = etree.fromstring(out.getvalue().encode())
+        self.assertEqual(
+            [entity.tag for entity in tree], ["{urn:oasis:names:tc:SAML:2.0:metadata}EntityDescriptor"] * 2
+        )
+        self.assertEqual([entity.get("entityID") for entity in tree], ["https://sp.example.org/sp", "test:entity:1"])
+
+    def test_exportmetadata_to_file(self):
+        with tempfile.NamedTemporaryFile() as f:
+            call_command("exportmetadata", "-p", "-u", "-m", f.name)
+            tree = etree.parse(f.name).getroot()
+        self.assertEqual(tree.tag, "{urn:oasis:names:tc:SAML:2.0:metadata}EntitiesDescriptor")
+        self.assertEqual([entity.get("entityID") for entity in tree], ["https://sp.example.org/sp", "test:entity:1"])
+
+    def test_exportmetadata_individual_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            stale_file = os.path.join(directory, hashlib.sha1(b"removed:entity").hexdigest() + ".xml")
+            other_file = os.path.join(directory, "other.xml")
+            for file_name in [stale_file, other_file]:
+                open(file_name, "w").close()
+            call_command("exportmetadata", "-p", "-u", "-d", directory)
+            self.assertTrue(os.path.exists(stale_file))
+            call_command("exportmetadata", "-p", "-u", "-r", "-d", directory)
+            self.assertEqual(
+                sorted(os.listdir(directory)),
+                sorted(
+                    [
+                        hashlib.sha1(b"https://sp.example.org/sp").hexdigest() + ".xml",
+                        hashlib.sha1(b"test:entity:1").hexdigest() + ".xml",
+                        "other.xml",
+                    ]
+                ),
+            )
@@ -0,0 +1,70 @@
+import gzip
+import os
+import tempfile
+from datetime import date
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from rr.models.serviceprovider import ServiceProvider
+from rr.models.statistics import MonthlyStatistics, Statistics
+
+SP = "https://sp.example.org/sp"
+
+
+SSO_PROFILE = "http://shibboleth.net/ns/profiles/saml2/sso/browser"
+LOGOUT_PROFILE = "http://shibboleth.net/ns/profiles/saml2/logout"
+
+
+def audit_log_line(timestamp, user, sp=SP, profile=SSO_PROFILE):
+    return "192.0.2.1|%s|%s|%s|%s|%s|||||||||||||||\n" % (timestamp, timestamp, user, sp, profile)
+
+
+class ImportAuditLogTest(TestCase):
+    def setUp(self):
+        self.sp = ServiceProvider.objects.create(entity_id=SP, service_type="saml")
+        self.directory = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.directory.name, "idp-audit.log")
+        with open(self.log, "w") as f:
+            f.write(audit_log_line("20230705T112233Z", "user1"))
+            f.write(audit_log_line("20230705T112234Z", "user1"))
+            f.write(audit_log_line("20230705T112235Z", "user2"))
+            f.write(audit_log_line("20230706T000000Z", "user1"))
+            f.write(audit_log_line("20230706T000000Z", "user1", sp="https://unknown.example.org/sp"))
+            f.write(audit_log_line("20230706T000000Z", ""))
+            f.write(audit_log_line("20230706T000001Z", "user1", profile=LOGOUT_PROFILE))
+            f.write("invalid line\n")
+        self.gzip_log = os.path.join(self.directory.name, "idp-audit-2.log.gz")
+        with gzip.open(self.gzip_log, "wt") as f:
+            f.write(audit_log_line("2023-07-05T23:59:59Z", "user3"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_importauditlog(self):
+        out = StringIO()
+        call_command("importauditlog", self.log, self.gzip_log, "-p", stdout=out)
+        self.assertIn("UNKNOWN SP;https://unknown.example.org/sp;2023-07-06;1;1", out.getvalue())
+        statistics = Statistics.objects.get(sp=self.sp, date=date(2023, 7, 5))
+        self.assertEqual((statistics.logins, statistics.users), (4, 3))
+        self.assertEqual(Statistics.objects.get(sp=self.sp, date=date(2023, 7, 6)).logins, 1)
+        monthly = MonthlyStatistics.objects.get(sp=self.sp)
+        self.assertEqual((monthly.logins, monthly.unique_users), (5, 3))
+
+    def test_importauditlog_replaces_earlier_import(self):
+        call_command("importauditlog", self.log, self.gzip_log)
+        call_command("importauditlog", self.log, self.gzip_log, "-w", "2")
+        statistics = Statistics.objects.get(sp=self.sp, date=date(2023, 7, 5))
+        self.assertEqual((statistics.logins, statistics.users), (4, 3))
+        call_command("importauditlog", self.gzip_log)
+        statistics = Statistics.objects.get(sp=self.sp, date=date(2023, 7, 5))
+        self.assertEqual((statistics.logins, statistics.users), (1, 1))
+
+    def test_importauditlog_workers(self):
+        call_command("importauditlog", self.log, self.gzip_log, "-w", "2")
+        self.assertEqual(Statistics.objects.get(sp=self.sp, date=date(2023, 7, 5)).users, 3)
+
+    def test_importauditlog_all_events(self):
+        call_command("importauditlog", self.log, "--profile-field", "-1")
+        self.assertEqual(Statistics.objects.get(sp=self.sp, date=date(2023, 7, 6)).logins, 2)
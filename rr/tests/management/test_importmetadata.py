@@ -0,0 +1,121 @@
+import gzip
+import os
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from lxml import etree
+
+from rr.models.attribute import Attribute
+from rr.models.metadataimport import MetadataImportHash
+from rr.models.nameidformat import NameIDFormat
+from rr.models.serviceprovider import ServiceProvider
+from rr.utils.saml_metadata_parser import iter_metadata_entities
+
+TESTDATA_FILENAME = os.path.join(os.path.dirname(__file__), "../../testdata/metadata.xml")
+
+
+class ImportMetadataTest(TestCase):
+    def setUp(self):
+        Attribute.objects.create(
+            friendlyname="cn", name="urn:oid:2.5.4.3", attributeid="id-urn:mace:dir:attribute-def:cn"
+        )
+        Attribute.objects.create(
+            friendlyname="eduPersonPrincipalName",
+            name="urn:oid:1.3.6.1.4.1.5923.1.1.1.6",
+            attributeid="id-urn:mace:dir:attribute-def:eduPersonPrincipalName",
+        )
+        NameIDFormat.objects.create(nameidformat="urn:oasis:names:tc:SAML:2.0:nameid-format:transient")
+        self.directory = tempfile.TemporaryDirectory()
+        entity = etree.parse(TESTDATA_FILENAME).getroot()
+        aggregate = etree.Element("{urn:oasis:names:tc:SAML:2.0:metadata}EntitiesDescriptor")
+        for n in range(3):
+            copy = etree.fromstring(etree.tostring(entity))
+            copy.set("entityID", "https://sp%s.example.org/sp" % n)
+            aggregate.append(copy)
+        self.metadata = etree.tostring(aggregate)
+        self.filename = os.path.join(self.directory.name, "metadata.xml")
+        with open(self.filename, "wb") as f:
+            f.write(self.metadata)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_iter_metadata_entities_clears_processed(self):
+        entities = []
+        for entity in iter_metadata_entities(self.filename):
+            self.assertGreater(len(entity), 0)
+            entities.append(entity)
+        self.assertEqual(len(entities), 3)
+        self.assertEqual(len(entities[0]), 0)
+        self.assertIsNone(entities[0].getparent())
+        self.assertEqual(len(entities[-1].getparent()), 1)
+
+    def test_importmetadata_gzip(self):
+        filename = os.path.join(self.directory.name, "metadata.xml.gz")
+        with gzip.open(filename, "wb") as f:
+            f.write(self.metadata)
+        err = StringIO()
+        call_command("importmetadata", "-i", filename, "-p", "2", stdout=StringIO(), stderr=err)
+        self.assertEqual(
+            sorted(ServiceProvider.objects.values_list("entity_id", flat=True)),
+            ["https://sp%s.example.org/sp" % n for n in range(3)],
+        )
+        self.assertEqual(
+            err.getvalue().splitlines(),
+            ["%s: 2 entities processed" % filename, "%s: 3 entities processed" % filename],
+        )
+
+    def test_importmetadata_single_entity(self):
+        call_command("importmetadata", "-i", TESTDATA_FILENAME, verbosity=0)
+        self.assertEqual(ServiceProvider.objects.get().entity_id, "https://sp.example.org/sp")
+        self.assertGreater(ServiceProvider.objects.get().endpoints.count(), 0)
+
+    def test_importmetadata_skips_unchanged(self):
+        call_command("importmetadata", "-i", self.filename, verbosity=0)
+        self.assertEqual(MetadataImportHash.objects.count(), 3)
+        aggregate = etree.fromstring(self.metadata)
+        aggregate[1].find("{*}ContactPerson/{*}EmailAddress").text = "changed@example.org"
+        with open(self.filename, "wb") as f:
+            f.write(etree.tostring(aggregate, pretty_print=True))
+        out = StringIO()
+        call_command("importmetadata", "-i", self.filename, "-o", stdout=out, stderr=StringIO())
+        self.assertIn("Created: 0, updated: 1, skipped: 0, unchanged: 2, errors: 0", out.getvalue())
+        sp = ServiceProvider.objects.get(entity_id="https://sp1.example.org/sp")
+        self.assertTrue(sp.contacts.filter(email="changed@example.org").exists())
+        out = StringIO()
+        call_command("importmetadata", "-i", self.filename, "-f", stdout=out, stderr=StringIO())
+        self.assertIn("Created: 0, updated: 0, skipped: 3, unchanged: 0, errors: 0", out.getvalue())
+
+    def test_importmetadata_options_change_hash(self):
+        call_command("importmetadata", "-i", self.filename, verbosity=0)
+        out = StringIO()
+        call_command("importmetadata", "-i", self.filename, "-o", "-a", stdout=out, stderr=StringIO())
+        self.assertIn("Created: 0, updated: 3, skipped: 0, unchanged: 0, errors: 0", out.getvalue())
+        out = StringIO()
+        call_command("importmetadata", "-i", self.filename, "-o", "-a", stdout=out, stderr=StringIO())
+        self.assertIn("Created: 0, updated: 0, skipped: 0, unchanged: 3, errors: 0", out.getvalue())
+
+    def test_importmetadata_messages_do_not_prevent_skipping(self):
+        out = StringIO()
+        with redirect_stdout(out):
+            call_command("importmetadata", "-i", self.filename, "-o", verbosity=3, stderr=StringIO())
+        self.assertIn("https://sp0.example.org/sp : EntityID does not exist, creating", out.getvalue())
+        self.assertEqual(MetadataImportHash.objects.count(), 3)
+        out = StringIO()
+        with redirect_stdout(out):
+            call_command("importmetadata", "-i", self.filename, "-o", verbosity=2, stderr=StringIO())
+        self.assertIn("Created: 0, updated: 0, skipped: 0, unchanged: 3, errors: 0", out.getvalue())
+
+    def test_importmetadata_hash_not_stored_with_errors(self):
+        aggregate = etree.fromstring(self.metadata)
+        aggregate[1].find("{*}SPSSODescriptor/{*}AssertionConsumerService").set("Binding", "urn:invalid:binding")
+        with open(self.filename, "wb") as f:
+            f.write(etree.tostring(aggregate, pretty_print=True))
+        call_command("importmetadata", "-i", self.filename, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(
+            sorted(MetadataImportHash.objects.values_list("entity_id", flat=True)),
+            ["https://sp0.example.org/sp", "https://sp2.example.org/sp"],
+        )
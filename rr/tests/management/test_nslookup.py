@@ -0,0 +1,107 @@
+import json
+import socket
+import threading
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from rr.models.endpoint import Endpoint
+from rr.models.redirecturi import RedirectUri
+from rr.models.serviceprovider import ServiceProvider
+from rr.utils.nslookup import (
+    NOT_FOUND,
+    RESOLVED,
+    TIMEOUT,
+    get_service_hosts,
+    resolve_host,
+    resolve_hosts,
+)
+
+
+class StubResolver:
+    """Resolves names ending with .example.org, counting lookups"""
+
+    def __init__(self):
+        self.lookups = []
+
+    def __call__(self, host, port):
+        self.lookups.append(host)
+        if host.startswith("slow."):
+            raise socket.gaierror(socket.EAI_AGAIN, "Temporary failure in name resolution")
+        if not host.endswith(".example.org"):
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("192.0.2.1", 0))]
+
+
+class NslookupTest(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.saml = ServiceProvider.objects.create(entity_id="https://sp.example.org/sp", service_type="saml")
+            Endpoint.objects.create(
+                sp=self.saml, type="AssertionConsumerService", location="https://sp.example.org/acs"
+            )
+            Endpoint.objects.create(sp=self.saml, type="SingleLogoutService", location="https://sp.invalid:8443/slo")
+            self.oidc = ServiceProvider.objects.create(entity_id="oidc-client", service_type="oidc")
+            RedirectUri.objects.create(sp=self.oidc, uri="https://sp.example.org/callback")
+            RedirectUri.objects.create(sp=self.oidc, uri="https://slow.example.com/callback")
+            self.ldap = ServiceProvider.objects.create(
+                entity_id="ldap-service", service_type="ldap", server_names="ldap.example.org\nldap.invalid\n"
+            )
+        self.resolver = StubResolver()
+
+    def test_get_service_hosts(self):
+        with self.assertNumQueries(1):
+            hosts = get_service_hosts([self.saml, self.oidc, self.ldap])
+        self.assertEqual(hosts[self.saml.pk], {"sp.example.org", "sp.invalid"})
+        self.assertEqual(hosts[self.oidc.pk], {"sp.example.org", "slow.example.com"})
+        self.assertEqual(hosts[self.ldap.pk], {"ldap.example.org", "ldap.invalid"})
+
+    def test_resolve_hosts(self):
+        statuses = resolve_hosts(
+            ["sp.example.org", "sp.invalid", "sp.example.org", "slow.example.com"], workers=2, resolver=self.resolver
+        )
+        self.assertEqual(statuses, {"sp.example.org": RESOLVED, "sp.invalid": NOT_FOUND, "slow.example.com": TIMEOUT})
+        self.assertEqual(sorted(self.resolver.lookups), ["slow.example.com", "sp.example.org", "sp.invalid"])
+
+    def test_resolve_host_timeout(self):
+        released = threading.Event()
+
+        def blocking_resolver(host, port):
+            released.wait()
+            return []
+
+        try:
+            self.assertEqual(resolve_host("sp.example.org", timeout=0.1, resolver=blocking_resolver), TIMEOUT)
+        finally:
+            released.set()
+
+    def test_nslookup_json(self):
+        out = StringIO()
+        with patch("rr.utils.nslookup.socket.getaddrinfo", self.resolver):
+            call_command("nslookup", "-s", "-o", "-l", "-a", "-j", stdout=out)
+        self.assertEqual(
+            json.loads(out.getvalue()),
+            [
+                {"service_type": "ldap", "entity_id": "ldap-service", "address": "ldap.invalid", "status": NOT_FOUND},
+                {"service_type": "oidc", "entity_id": "oidc-client", "address": "slow.example.com", "status": TIMEOUT},
+                {
+                    "service_type": "saml",
+                    "entity_id": "https://sp.example.org/sp",
+                    "address": "sp.invalid",
+                    "status": NOT_FOUND,
+                },
+            ],
+        )
+        self.assertEqual(self.resolver.lookups.count("sp.example.org"), 1)
+
+    def test_nslookup_production_only(self):
+        ServiceProvider.objects.filter(pk=self.ldap.pk).update(production=True)
+        out = StringIO()
+        with patch("rr.utils.nslookup.socket.getaddrinfo", self.resolver):
+            call_command("nslookup", "-s", "-o", "-l", stdout=out)
+        self.assertEqual(
+            out.getvalue(),
+            "Address does not resolve | LDAP entity: ldap-service | address: ldap.invalid | not found\n",
+        )
@@ -0,0 +1,79 @@
+from io import StringIO
+from unittest.mock import call, patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from rr.models.endpoint import Endpoint
+from rr.models.redirecturi import RedirectUri
+from rr.models.servicehost import ServiceHost
+from rr.models.serviceprovider import ServiceProvider
+from rr.utils.hosts import find_service_hosts
+
+
+class ServiceHostTest(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.saml = ServiceProvider.objects.create(entity_id="https://sp.example.org/sp", service_type="saml")
+            self.endpoint = Endpoint.objects.create(
+                sp=self.saml, type="AssertionConsumerService", location="https://SP.example.org:8443/acs"
+            )
+            self.oidc = ServiceProvider.objects.create(entity_id="oidc-client", service_type="oidc")
+            RedirectUri.objects.create(sp=self.oidc, uri="https://sp.example.org/callback")
+            self.ldap = ServiceProvider.objects.create(
+                entity_id="ldap-service", service_type="ldap", server_names="ldap.example.org\nldap2.example.org."
+            )
+
+    def _hosts(self):
+        return set(ServiceHost.objects.values_list("sp", "host", "source"))
+
+    def test_hosts_maintained(self):
+        self.assertEqual(
+            self._hosts(),
+            {
+                (self.saml.pk, "sp.example.org", ServiceHost.ENDPOINT),
+                (self.oidc.pk, "sp.example.org", ServiceHost.REDIRECT_URI),
+                (self.ldap.pk, "ldap.example.org", ServiceHost.SERVER_NAME),
+                (self.ldap.pk, "ldap2.example.org", ServiceHost.SERVER_NAME),
+            },
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.endpoint.end_at = timezone.now()
+            self.endpoint.save()
+            self.ldap.server_names = "ldap.example.org"
+            self.ldap.save()
+            self.oidc.end_at = timezone.now()
+            self.oidc.save()
+        self.assertEqual(self._hosts(), {(self.ldap.pk, "ldap.example.org", ServiceHost.SERVER_NAME)})
+
+    def test_hosts_updated_once_per_commit(self):
+        with patch("rr.utils.hosts.update_service_hosts") as update_service_hosts:
+            with self.captureOnCommitCallbacks(execute=True):
+                for i in range(3):
+                    Endpoint.objects.create(
+                        sp=self.saml, type="SingleLogoutService", location="https://sp%s.example.org/slo" % i
+                    )
+                RedirectUri.objects.create(sp=self.oidc, uri="https://sp.example.org/logout")
+                self.saml.save()
+        self.assertEqual(
+            update_service_hosts.mock_calls,
+            [call({self.saml.pk}, [ServiceHost.ENDPOINT]), call({self.oidc.pk}, [ServiceHost.REDIRECT_URI])],
+        )
+
+    def test_find_service_hosts(self):
+        self.assertEqual(
+            sorted(find_service_hosts("SP.example.org").values_list("sp", flat=True)), [self.saml.pk, self.oidc.pk]
+        )
+        self.assertEqual(
+            list(find_service_hosts("sp.example.org", [ServiceHost.ENDPOINT]).values_list("sp", flat=True)),
+            [self.saml.pk],
+        )
+
+    def test_rebuildhosts(self):
+        ServiceHost.objects.all().delete()
+        ServiceHost.objects.create(sp=self.saml, host="old.example.org", source=ServiceHost.ENDPOINT)
+        out = StringIO()
+        call_command("rebuildhosts", "-c", "2", stdout=out)
+        self.assertEqual(out.getvalue(), "ServiceHost: 4\n")
+        self.assertFalse(ServiceHost.objects.filter(host="old.example.org").exists())
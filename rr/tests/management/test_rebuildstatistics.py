@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from rr.models.serviceprovider import ServiceProvider
+from rr.models.statistics import MonthlyStatistics, Statistics, WeeklyStatistics
+
+
+class RebuildStatisticsTest(TestCase):
+    def setUp(self):
+        self.sp = ServiceProvider.objects.create(entity_id="https://sp.example.org/sp", service_type="saml")
+        self.day = date(2023, 5, 31)
+        Statistics.objects.create(sp=self.sp, date=self.day, logins=10, users=5)
+        Statistics.objects.create(sp=self.sp, date=self.day + timedelta(days=1), logins=20, users=8)
+        Statistics.objects.create(sp=self.sp, date=self.day + timedelta(days=7), logins=30, users=3)
+
+    def test_rebuildstatistics(self):
+        out = StringIO()
+        call_command("rebuildstatistics", stdout=out)
+        self.assertIn("WeeklyStatistics: 2", out.getvalue())
+        week = WeeklyStatistics.objects.get(sp=self.sp, date=date(2023, 5, 29))
+        self.assertEqual((week.logins, week.users), (30, 8))
+        self.assertEqual(
+            list(MonthlyStatistics.objects.order_by("date").values_list("date", "logins")),
+            [(date(2023, 5, 1), 10), (date(2023, 6, 1), 50)],
+        )
+
+    def test_rebuildstatistics_days(self):
+        Statistics.objects.create(sp=self.sp, date=date.today(), logins=40, users=3)
+        call_command("rebuildstatistics", "-d", "1")
+        self.assertEqual(MonthlyStatistics.objects.get().logins, 40)
+        self.assertEqual(WeeklyStatistics.objects.get().logins, 40)
@@ -11,16 +11,17 @@ class RemoveServerNameTest(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
         self.server_names = "ldap.example.org\nldap2.example.org\nldap3.example.org"
-        self.sp = ServiceProvider.objects.create(
-            entity_id="ldapentity",
-            service_type="ldap",
-            server_names=self.server_names,
-        )
-        self.sp2 = ServiceProvider.objects.create(
-            entity_id="ldapentity2",
-            service_type="ldap",
-            server_names="ldap3.example.org",
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sp = ServiceProvider.objects.create(
+                entity_id="ldapentity",
+                service_type="ldap",
+                server_names=self.server_names,
+            )
+            self.sp2 = ServiceProvider.objects.create(
+                entity_id="ldapentity2",
+                service_type="ldap",
+                server_names="ldap3.example.org",
+            )
 
     def test_remove_server_names_list_only(self):
         out = StringIO()
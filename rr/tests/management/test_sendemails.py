@@ -0,0 +1,163 @@
+import socketserver
+import threading
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from rr.models.email import OutgoingEmail
+from rr.utils.outbox import queue_email, send_queued_emails
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise SMTPException("Relay unavailable")
+
+
+class StatusCheckingEmailBackend(BaseEmailBackend):
+    """Records database status of messages while sending, fails for failing@example.org"""
+
+    statuses = []
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            self.statuses.append(OutgoingEmail.objects.get(recipient=message.to[0]).status)
+            if message.to[0] == "failing@example.org":
+                raise SMTPException("Recipient rejected")
+        return len(email_messages)
+
+
+class DebuggingSMTPHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP server storing received messages"""
+
+    def reply(self, text):
+        self.wfile.write(text.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 localhost")
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == "QUIT":
+                self.reply("221 Bye")
+                break
+            if command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in self.rfile:
+                    if data_line == b".\r\n":
+                        break
+                    data.append(data_line.decode())
+                self.server.messages.append("".join(data))
+            self.reply("250 OK")
+
+
+class DebuggingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), DebuggingSMTPHandler)
+        self.connections = 0
+        self.messages = []
+
+
+class SendEmailsTest(TestCase):
+    def test_send_queued_emails(self):
+        queue_email("Test subject", "Test message", ["b@example.org", "a@example.org", "a@example.org", ""])
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.QUEUED).count(), 2)
+        out = StringIO()
+        call_command("sendemails", stdout=out)
+        self.assertIn("Sent: 2, unsent: 0", out.getvalue())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ["a@example.org", "b@example.org"])
+        self.assertEqual(mail.outbox[0].subject, "Test subject")
+        self.assertFalse(OutgoingEmail.objects.exclude(status=OutgoingEmail.SENT).exists())
+        self.assertFalse(OutgoingEmail.objects.filter(sent_at=None).exists())
+
+    def test_send_batches(self):
+        queue_email("Test subject", "Test message", ["user%s@example.org" % i for i in range(5)])
+        self.assertEqual(send_queued_emails(batch_size=2), (2, 0))
+        call_command("sendemails", "-b", "2", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 5)
+
+    @override_settings(
+        EMAIL_BACKEND="rr.tests.management.test_sendemails.FailingEmailBackend",
+        EMAIL_OUTBOX_MAX_ATTEMPTS=3,
+        EMAIL_OUTBOX_RETRY_DELAY=60,
+    )
+    def test_retry_with_backoff(self):
+        email = queue_email("Test subject", "Test message", ["test@example.org"])[0]
+        start = timezone.now()
+        with self.assertLogs("rr.utils.outbox", level="WARNING"):
+            self.assertEqual(send_queued_emails(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.QUEUED)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.error, "Relay unavailable")
+        self.assertGreaterEqual(email.next_attempt_at, start + timedelta(seconds=60))
+        # Not due yet
+        self.assertEqual(send_queued_emails(), (0, 0))
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        with self.assertLogs("rr.utils.outbox", level="WARNING"):
+            send_queued_emails()
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 2)
+        self.assertGreaterEqual(email.next_attempt_at, start + timedelta(seconds=120))
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        with self.assertLogs("rr.utils.outbox", level="ERROR"):
+            send_queued_emails()
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.FAILED)
+        self.assertEqual(email.attempts, 3)
+
+    @override_settings(EMAIL_BACKEND="rr.tests.management.test_sendemails.StatusCheckingEmailBackend")
+    def test_status_saved_for_each_message(self):
+        StatusCheckingEmailBackend.statuses = []
+        queue_email("Test subject", "Test message", ["failing@example.org", "user@example.org"])
+        with self.assertLogs("rr.utils.outbox", level="WARNING"):
+            self.assertEqual(send_queued_emails(), (1, 1))
+        self.assertEqual(StatusCheckingEmailBackend.statuses, [OutgoingEmail.SENDING, OutgoingEmail.SENDING])
+        self.assertEqual(
+            dict(OutgoingEmail.objects.values_list("recipient", "status")),
+            {"failing@example.org": OutgoingEmail.QUEUED, "user@example.org": OutgoingEmail.SENT},
+        )
+
+    @override_settings(EMAIL_OUTBOX_LEASE_TIME=300)
+    def test_expired_lease_claimed_again(self):
+        email = queue_email("Test subject", "Test message", ["test@example.org"])[0]
+        OutgoingEmail.objects.filter(pk=email.pk).update(
+            status=OutgoingEmail.SENDING, attempts=1, next_attempt_at=timezone.now() + timedelta(seconds=300)
+        )
+        self.assertEqual(send_queued_emails(), (0, 0))
+        OutgoingEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(send_queued_emails(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.SENT)
+        self.assertEqual(email.attempts, 2)
+
+    def test_smtp_connection_reuse(self):
+        server = DebuggingSMTPServer()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            queue_email("Test subject", "Test message", ["user%s@example.org" % i for i in range(3)])
+            with override_settings(
+                EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+                EMAIL_HOST="127.0.0.1",
+                EMAIL_PORT=server.server_address[1],
+                EMAIL_USE_TLS=False,
+                EMAIL_HOST_USER="",
+                EMAIL_HOST_PASSWORD="",
+            ):
+                self.assertEqual(send_queued_emails(), (3, 0))
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(len(server.messages), 3)
+        self.assertIn("Subject: Test subject", server.messages[0])
@@ -117,3 +117,30 @@ rKLt+NcwtbkI6weLISJu9lFZnPMYT7LpqDWD4aMHHUWr8THO0T6mbCeQRYMlfSpU
         response = certificate_list(request, pk=self.user_sp.pk)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(Certificate.objects.filter(sp=self.user_sp).count(), 1)
+
+    def test_certificate_fingerprints_stored(self):
+        certificate = Certificate.objects.add_certificate(self.valid_certificate, self.user_sp)
+        self.assertEqual(len(certificate.fingerprint_sha256), 64)
+        self.assertEqual(len(certificate.fingerprint_sha1), 40)
+        self.assertEqual(len(certificate.fingerprint_md5), 32)
+        self.assertEqual(len(certificate.public_key_sha256), 64)
+        self.assertEqual(certificate.serial_number, str(0xA39C7887F7928A97))
+
+    def test_certificate_form_duplicate(self):
+        Certificate.objects.add_certificate(self.valid_certificate, self.user_sp)
+        form_data = {"certificate": self.valid_certificate, "encryption": True, "signing": True}
+        form = CertificateForm(sp=self.user_sp, data=form_data)
+        self.assertFalse(form.is_valid())
+        form = CertificateForm(sp=self.admin_sp, data=form_data)
+        self.assertTrue(form.is_valid())
+
+    def test_certificate_info_shared_key(self):
+        certificate = Certificate.objects.add_certificate(self.valid_certificate, self.user_sp)
+        Certificate.objects.add_certificate(self.valid_certificate, self.admin_sp)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("certificate-info", kwargs={"pk": certificate.pk}))
+        self.assertContains(response, certificate.fingerprint_sha256)
+        self.assertNotContains(response, self.admin_sp.entity_id)
+        self.client.force_login(self.superuser)
+        response = self.client.get(reverse("certificate-info", kwargs={"pk": certificate.pk}))
+        self.assertContains(response, self.admin_sp.entity_id)
@@ -0,0 +1,60 @@
+from django.contrib.auth.models import User
+from django.core import mail
+from django.test import TestCase
+from django.urls import reverse
+
+from rr.models.contact import Contact
+from rr.models.email import OutgoingEmail, Template
+from rr.models.serviceprovider import ServiceProvider
+
+
+class EmailViewTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="tester")
+        self.superuser = User.objects.create(username="superuser", is_superuser=True)
+        self.sp = ServiceProvider.objects.create(entity_id="test:entity:1", service_type="saml", production=True)
+        Contact.objects.create(sp=self.sp, type="technical", email="Tech@example.org")
+        self.template = Template.objects.create(title="Maintenance", body="Maintenance break")
+
+    def test_email_view_queues_messages(self):
+        self.client.force_login(self.superuser)
+        response = self.client.post(
+            reverse("email-list"),
+            {
+                "service_type": ["saml"],
+                "production_sp": "on",
+                "technical_contacts": "on",
+                "template": self.template.pk,
+                "send_email": "ok",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.recipient, "tech@example.org")
+        self.assertEqual(email.subject, "Maintenance")
+        self.assertEqual(email.status, OutgoingEmail.QUEUED)
+        self.assertEqual(email.created_by, self.superuser)
+
+    def test_email_outbox_view(self):
+        OutgoingEmail.objects.create(
+            subject="Test", body="Test", from_email="noreply@example.org", recipient="a@example.org"
+        )
+        OutgoingEmail.objects.create(
+            subject="Test",
+            body="Test",
+            from_email="noreply@example.org",
+            recipient="b@example.org",
+            status=OutgoingEmail.FAILED,
+        )
+        self.client.force_login(self.superuser)
+        response = self.client.get(reverse("email-outbox"))
+        self.assertEqual(len(response.context["object_list"]), 2)
+        self.assertIn(("failed", "Failed", 1), response.context["counts"])
+        response = self.client.get(reverse("email-outbox") + "?status=failed")
+        self.assertEqual([email.recipient for email in response.context["object_list"]], ["b@example.org"])
+
+    def test_email_outbox_view_denies_user(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("email-outbox"))
+        self.assertEqual(response.status_code, 403)
@@ -3,7 +3,7 @@ from datetime import datetime, timezone
 from io import StringIO
 
 from django.core.management import call_command
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from lxml import etree
 
 from rr.models.attribute import Attribute
@@ -51,6 +51,13 @@ class LdapMetadataTestCase(TestCase):
         metadata = etree.tostring(metadata_tree, pretty_print=True, encoding="UTF-8")
         self.assertEqual(metadata.decode("utf-8"), self.test_metadata)
 
+    @override_settings(METADATA_CACHE=True)
+    def test_ldap_metadata_generation_cached(self):
+        metadata_tree = ldap_metadata_generator_list(validated=True, production=True, include=None)
+        metadata_tree = ldap_metadata_generator_list(validated=True, production=True, include=None)
+        metadata = etree.tostring(metadata_tree, pretty_print=True, encoding="UTF-8")
+        self.assertEqual(metadata.decode("utf-8"), self.test_metadata)
+
     def test_exportldap_management_command(self):
         out = StringIO()
         call_command("exportldap", "-p", stdout=out)
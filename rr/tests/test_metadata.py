@@ -1,17 +1,34 @@
+import hashlib
 import os
+import tempfile
+from io import BytesIO
 
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from git import Repo
 from lxml import etree
 
 from rr.models.attribute import Attribute
+from rr.models.metadatacache import MetadataCache
 from rr.models.nameidformat import NameIDFormat
 from rr.models.organization import Organization
+from rr.models.serviceprovider import ServiceProvider
+from rr.utils.metadata_cache import get_cached_metadata
+from rr.utils.saml_metadata_export import (
+    saml_metadata_export_files,
+    saml_metadata_file_name,
+)
 from rr.utils.saml_metadata_generator import (
     saml_metadata_generator,
     saml_metadata_generator_list,
+    saml_metadata_generator_stream,
 )
-from rr.utils.saml_metadata_parser import saml_metadata_parser
+from rr.utils.saml_metadata_parser import MetadataImportCache, saml_metadata_parser
+from rr.utils.serviceprovider import create_sp_history_copy
+from rr.views.metadata import _get_metadata_diff, _write_medadata
 
 TESTDATA_FILENAME = os.path.join(os.path.dirname(__file__), "../testdata/metadata.xml")
 TESTDATA_MINIMAL_FILENAME = os.path.join(os.path.dirname(__file__), "../testdata/metadata_minimal.xml")
@@ -76,7 +93,7 @@ class MetadataParserGenerationTestCase(TestCase):
 
     def test_metadata_generation(self):
         metadata_tree = saml_metadata_generator(sp=self.sp)
-        metadata = etree.tostring(metadata_tree, pretty_print=True, encoding="UTF-8").replace(b"xmlns:xmlns", b"xmlns")
+        metadata = etree.tostring(metadata_tree, pretty_print=True, encoding="UTF-8")
         self.assertEqual(metadata.decode("utf-8"), self.test_metadata)
 
 
@@ -136,15 +153,17 @@ class MetadataMinimalParserGenerationTestCase(TestCase):
 
     def test_metadata_generation(self):
         metadata_tree = saml_metadata_generator(sp=self.sp)
-        metadata = etree.tostring(metadata_tree, pretty_print=True, encoding="UTF-8").replace(b"xmlns:xmlns", b"xmlns")
+        metadata = etree.tostring(metadata_tree, pretty_print=True, encoding="UTF-8")
         self.assertEqual(metadata.decode("utf-8"), self.test_metadata)
 
     def test_metadata_generation_as_list(self):
         metadata_list = saml_metadata_generator_list(production=True)
-        metadata = etree.tostring(metadata_list[0], pretty_print=True, encoding="UTF-8").replace(
-            b"xmlns:xmlns", b"xmlns"
+        # Serialized child element declares its own namespace first, compare canonical forms
+        metadata = etree.fromstring(etree.tostring(metadata_list[0], pretty_print=True))
+        self.assertEqual(
+            etree.tostring(metadata, method="c14n2"),
+            etree.tostring(etree.fromstring(self.test_metadata.encode()), method="c14n2"),
         )
-        self.assertEqual(metadata.decode("utf-8"), self.test_metadata)
 
     def test_metadata_organization_generation(self):
         organization = Organization.objects.create(
@@ -161,5 +180,285 @@ class MetadataMinimalParserGenerationTestCase(TestCase):
         self.sp.privacypolicy_org = True
         self.sp.save()
         metadata_tree = saml_metadata_generator(sp=self.sp)
-        metadata = etree.tostring(metadata_tree, pretty_print=True, encoding="UTF-8").replace(b"xmlns:xmlns", b"xmlns")
+        metadata = etree.tostring(metadata_tree, pretty_print=True, encoding="UTF-8")
         self.assertEqual(metadata.decode("utf-8"), open(TESTDATA_MINIMAL_ORGANIZATION_FILENAME).read())
+
+
+class MetadataListTestMixin:
+    def setUp(self):
+        Attribute.objects.create(
+            friendlyname="cn",
+            name="urn:oid:2.5.4.3",
+            attributeid="id-urn:mace:dir:attribute-def:cn",
+            nameformat="urn:oasis:names:tc:SAML:2.0:attrname-format:uri",
+        )
+        Attribute.objects.create(
+            friendlyname="eduPersonPrincipalName",
+            name="urn:oid:1.3.6.1.4.1.5923.1.1.1.6",
+            attributeid="id-urn:mace:dir:attribute-def:eduPersonPrincipalName",
+            nameformat="urn:oasis:names:tc:SAML:2.0:attrname-format:uri",
+        )
+        NameIDFormat.objects.create(nameidformat="urn:oasis:names:tc:SAML:2.0:nameid-format:transient")
+        self.organization = Organization.objects.create(name_en="Test Organization", url_en="https://example.org/")
+        self.test_metadata = open(TESTDATA_FILENAME).read()
+
+    def _create_sps(self, start, count):
+        parser = etree.XMLParser(ns_clean=True, remove_comments=True, remove_blank_text=True)
+        for n in range(start, start + count):
+            entity = etree.fromstring(self.test_metadata, parser)
+            entity.set("entityID", "https://sp%s.example.org/sp" % n)
+            sp, errors = saml_metadata_parser(entity, overwrite=False, verbosity=0, validate=True)
+            sp.production = True
+            sp.organization = self.organization
+            sp.save()
+            if n % 2:
+                # Modify validated SP, metadata is generated from history
+                create_sp_history_copy(ServiceProvider.objects.get(pk=sp.pk))
+                sp.name_en = "Modified name"
+                sp.validated = None
+                sp.save()
+                sp.contacts.update(end_at=timezone.now())
+
+
+class MetadataListQueryCountTestCase(MetadataListTestMixin, TestCase):
+    def _metadata_lists(self, validated):
+        metadata_list = saml_metadata_generator_list(validated=validated, production=True, as_list=True)
+        self.assertEqual(
+            {metadata.tag for metadata in metadata_list}, {"{urn:oasis:names:tc:SAML:2.0:metadata}EntityDescriptor"}
+        )
+        metadata_list = [etree.tostring(metadata, pretty_print=True) for metadata in metadata_list]
+        individual_list = [
+            etree.tostring(saml_metadata_generator(sp=sp, validated=validated), pretty_print=True)
+            for sp in ServiceProvider.objects.filter(end_at=None)
+        ]
+        return metadata_list, individual_list
+
+    def test_metadata_list_query_count(self):
+        self._create_sps(0, 2)
+        with self.assertNumQueries(8):
+            saml_metadata_generator_list(production=True)
+        self._create_sps(2, 6)
+        with self.assertNumQueries(8):
+            tree = saml_metadata_generator_list(production=True)
+        self.assertEqual(len(tree), 8)
+
+    def test_metadata_list_unvalidated_query_count(self):
+        self._create_sps(0, 6)
+        with self.assertNumQueries(6):
+            saml_metadata_generator_list(validated=False, production=True)
+
+    def test_metadata_list_matches_individual_metadata(self):
+        self._create_sps(0, 4)
+        metadata_list, individual_list = self._metadata_lists(validated=True)
+        self.assertEqual(metadata_list, individual_list)
+        self.assertNotIn(b"Modified name", b"".join(metadata_list))
+        self.assertEqual(b"".join(metadata_list).count(b"<ContactPerson"), 8)
+        metadata_list, individual_list = self._metadata_lists(validated=False)
+        self.assertEqual(metadata_list, individual_list)
+        self.assertIn(b"Modified name", b"".join(metadata_list))
+        self.assertEqual(b"".join(metadata_list).count(b"<ContactPerson"), 4)
+
+    def test_metadata_stream_matches_metadata_tree(self):
+        self._create_sps(0, 5)
+        for validated in [True, False]:
+            tree = saml_metadata_generator_list(validated=validated, production=True)
+            tree = etree.fromstring(etree.tostring(tree, pretty_print=True))
+            output = BytesIO()
+            saml_metadata_generator_stream(output, validated=validated, production=True, chunk_size=2)
+            self.assertEqual(
+                etree.tostring(etree.fromstring(output.getvalue()), method="c14n2"),
+                etree.tostring(tree, method="c14n2"),
+            )
+
+    def test_metadata_stream_query_count(self):
+        self._create_sps(0, 4)
+        with self.assertNumQueries(17):
+            saml_metadata_generator_stream(BytesIO(), production=True, chunk_size=2)
+
+
+@override_settings(METADATA_CACHE=True)
+class MetadataCacheTestCase(MetadataListQueryCountTestCase):
+    def _aggregate(self, validated=True):
+        tree = saml_metadata_generator_list(validated=validated, production=True)
+        return etree.tostring(tree, pretty_print=True, encoding=str)
+
+    def test_metadata_list_query_count(self):
+        self._create_sps(0, 4)
+        with self.assertNumQueries(12):
+            saml_metadata_generator_list(production=True)
+        with self.assertNumQueries(4):
+            saml_metadata_generator_list(production=True)
+
+    def test_metadata_stream_query_count(self):
+        self._create_sps(0, 4)
+        with self.assertNumQueries(25):
+            saml_metadata_generator_stream(BytesIO(), production=True, chunk_size=2)
+        with self.assertNumQueries(9):
+            saml_metadata_generator_stream(BytesIO(), production=True, chunk_size=2)
+
+    def test_metadata_list_unvalidated_query_count(self):
+        self._create_sps(0, 4)
+        saml_metadata_generator_list(validated=False, production=True)
+        self.assertEqual(MetadataCache.objects.filter(validated=False).count(), 4)
+
+    def test_metadata_cache_matches_uncached_metadata(self):
+        self._create_sps(0, 4)
+        for validated in [True, False]:
+            with override_settings(METADATA_CACHE=False):
+                uncached = self._aggregate(validated)
+            self.assertEqual(self._aggregate(validated), uncached)
+            self.assertEqual(self._aggregate(validated), uncached)
+
+    def test_metadata_cache_invalidation(self):
+        self._create_sps(0, 4)
+        self._aggregate(validated=False)
+        sp = ServiceProvider.objects.get(entity_id="https://sp0.example.org/sp")
+        contact = sp.contacts.first()
+        contact.email = "changed@example.org"
+        contact.save()
+        self.assertEqual(MetadataCache.objects.count(), 3)
+        self.assertIn("changed@example.org", self._aggregate(validated=False))
+        sp.nameidformat.clear()
+        self.assertEqual(MetadataCache.objects.count(), 3)
+        create_sp_history_copy(ServiceProvider.objects.get(pk=sp.pk))
+        self.assertEqual(MetadataCache.objects.count(), 3)
+        self.organization.save()
+        self.assertEqual(MetadataCache.objects.count(), 0)
+
+    def test_metadata_cache_invalidated_while_rendering(self):
+        self._create_sps(0, 1)
+        sp = ServiceProvider.objects.get(entity_id="https://sp0.example.org/sp")
+
+        def render_stale(missing):
+            contact = sp.contacts.first()
+            contact.email = "changed@example.org"
+            contact.save()
+            return {sp.pk: "stale"}
+
+        self.assertEqual(get_cached_metadata([sp], False, "test", render_stale), ["stale"])
+        self.assertEqual(MetadataCache.objects.count(), 1)
+        self.assertEqual(get_cached_metadata([sp], False, "test", lambda missing: {sp.pk: "fresh"}), ["fresh"])
+        self.assertEqual(get_cached_metadata([sp], False, "test", lambda missing: {sp.pk: "unused"}), ["fresh"])
+
+
+@override_settings(METADATA_EXPORT_INCREMENTAL=True, SAML_METADATA_EXPORT_INDIVIDUAL_FILES=True)
+class MetadataExportTestCase(MetadataListTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.repo = Repo.init(self.directory.name)
+        self.override = override_settings(METADATA_GIT_REPOSITORIO=self.directory.name + "/")
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+        self._create_sps(0, 3)
+
+    def test_incremental_export_writes_only_changed_files(self):
+        changed = _write_medadata(self.repo, "saml")
+        self.assertEqual(len(changed), 3)
+        self.assertEqual(self.repo.git.diff("--cached", "--name-only").split(), sorted(changed))
+        self.assertEqual(_write_medadata(self.repo, "saml"), [])
+        sp = ServiceProvider.objects.get(entity_id="https://sp0.example.org/sp")
+        sp.contacts.update(email="changed@example.org")
+        changed = _write_medadata(self.repo, "saml")
+        self.assertEqual(changed, [hashlib.sha1(sp.entity_id.encode()).hexdigest() + ".xml"])
+        with open(os.path.join(self.directory.name, changed[0])) as f:
+            self.assertIn("changed@example.org", f.read())
+
+    def test_incremental_export_removes_stale_file(self):
+        changed = _write_medadata(self.repo, "saml")
+        ServiceProvider.objects.filter(entity_id="https://sp0.example.org/sp").update(end_at=timezone.now())
+        removed = saml_metadata_file_name("https://sp0.example.org/sp")
+        self.assertEqual(_write_medadata(self.repo, "saml"), [removed])
+        self.assertFalse(os.path.exists(os.path.join(self.directory.name, removed)))
+        self.assertEqual(self.repo.git.diff("--cached", "--name-only").split(), sorted(set(changed) - {removed}))
+
+    def test_incremental_export_restores_removed_file(self):
+        changed = _write_medadata(self.repo, "saml")
+        os.remove(os.path.join(self.directory.name, changed[0]))
+        self.assertEqual(_write_medadata(self.repo, "saml"), [changed[0]])
+        self.assertEqual(self.repo.git.status("--porcelain").split().count(changed[0]), 1)
+
+    def test_incremental_export_diff(self):
+        changed = _write_medadata(self.repo, "saml")
+        diff = _get_metadata_diff(self.repo)
+        for path in changed:
+            self.assertIn("+++ b/" + path, diff)
+        readme = os.path.join(self.directory.name, "README")
+        with open(readme, "w") as f:
+            f.write("Metadata\n")
+        self.repo.index.add(["README"])
+        self.repo.index.commit("Initial metadata")
+        self.assertEqual(_write_medadata(self.repo, "saml"), [])
+        self.assertEqual(_get_metadata_diff(self.repo), "")
+        # Only staged paths are included in the diff
+        with open(readme, "w") as f:
+            f.write("Not exported\n")
+        self.assertIn("README", self.repo.git.diff("HEAD"))
+        sp = ServiceProvider.objects.get(entity_id="https://sp0.example.org/sp")
+        sp.contacts.update(email="changed@example.org")
+        changed = _write_medadata(self.repo, "saml")
+        diff = _get_metadata_diff(self.repo)
+        self.assertIn("+++ b/" + changed[0], diff)
+        self.assertIn("changed@example.org", diff)
+        self.assertNotIn("README", diff)
+
+    @override_settings(SAML_METADATA_EXPORT_INDIVIDUAL_FILES=False, METADATA_FILENAME="metadata.xml")
+    def test_incremental_export_aggregate(self):
+        self.assertEqual(_write_medadata(self.repo, "saml"), ["metadata.xml"])
+        self.assertEqual(_write_medadata(self.repo, "saml"), [])
+        tree = etree.parse(os.path.join(self.directory.name, "metadata.xml")).getroot()
+        self.assertEqual(len(tree), 3)
+
+    def test_metadata_export_files_with_workers(self):
+        self._create_sps(3, 2)
+        with tempfile.TemporaryDirectory() as directory:
+            file_names, removed = saml_metadata_export_files(directory, production=True, workers=1, chunk_size=2)
+            files = {}
+            for file_name in file_names:
+                with open(os.path.join(directory, file_name)) as f:
+                    files[file_name] = f.read()
+            file_names, removed = saml_metadata_export_files(directory, production=True, workers=2, chunk_size=2)
+            self.assertEqual(sorted(file_names), sorted(files))
+            for file_name in file_names:
+                with open(os.path.join(directory, file_name)) as f:
+                    self.assertEqual(f.read(), files[file_name])
+            self.assertEqual(sorted(os.listdir(directory)), sorted(files))
+
+
+class MetadataImportTestCase(MetadataListTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.parser = etree.XMLParser(ns_clean=True, remove_comments=True, remove_blank_text=True)
+        self.cache = MetadataImportCache()
+
+    def _import(self, entity_id, overwrite=False):
+        entity = etree.fromstring(self.test_metadata, self.parser)
+        entity.set("entityID", entity_id)
+        return saml_metadata_parser(entity, overwrite=overwrite, verbosity=0, validate=True, cache=self.cache)
+
+    def _linked_counts(self, sp):
+        return (
+            sp.certificates.count(),
+            sp.endpoints.count(),
+            sp.contacts.count(),
+            sp.spattributes.count(),
+            sp.nameidformat.count(),
+        )
+
+    def test_metadata_import_query_count(self):
+        # Host index is updated once after the import transaction is committed
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            sp, errors = self._import("https://sp1.example.org/sp")
+        self.assertEqual(errors, [])
+        self.assertLess(len(queries), 20)
+        with self.assertNumQueries(15), self.captureOnCommitCallbacks(execute=True):
+            self._import("https://sp2.example.org/sp")
+
+    def test_metadata_reimport_does_not_duplicate(self):
+        sp, errors = self._import("https://sp1.example.org/sp")
+        counts = self._linked_counts(sp)
+        self.assertNotIn(0, counts)
+        sp, errors = self._import("https://sp1.example.org/sp", overwrite=True)
+        self.assertEqual(self._linked_counts(sp), counts)
+        self.assertEqual(ServiceProvider.objects.filter(entity_id="https://sp1.example.org/sp").count(), 1)
@@ -1,8 +1,26 @@
 from django.contrib.auth.models import Group, User
+from django.db import connection
 from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
+from rr.models.contact import Contact
+from rr.models.endpoint import Endpoint
+from rr.models.redirecturi import RedirectUri
 from rr.models.serviceprovider import ServiceProvider
+from rr.models.spadmin import Keystore
+from rr.models.statistics import StatisticsAlert
+from rr.utils.missing_data import (
+    MISSING_APPLICATION_PORTFOLIO,
+    MISSING_CERTIFICATE,
+    MISSING_DESCRIPTION,
+    MISSING_NAME,
+    MISSING_PRIVACY_POLICY,
+    MISSING_TECHNICAL_CONTACT,
+    get_missing_sp_data,
+    get_missing_sp_data_flags,
+)
 from rr.views.serviceprovider import ServiceProviderList
 
 
@@ -61,6 +79,57 @@ class ServiceProviderListTestCase(TestCase):
         self.assertTrue(self.admin_sp in response.context_data["object_list"])
         self.assertTrue(self.user_sp in response.context_data["object_list"])
 
+    def test_sp_view_list_annotations(self):
+        ServiceProvider.objects.create(
+            entity_id="test:entity:1",
+            service_type="saml",
+            history=self.admin_sp.pk,
+            production=True,
+            validated=timezone.now(),
+            end_at=timezone.now(),
+        )
+        Keystore.objects.create_key(sp=self.user_sp, creator=self.user, email="tester@example.org")
+        StatisticsAlert.objects.create(sp=self.user_sp, type=StatisticsAlert.DORMANT)
+        self.user_sp.validated = timezone.now()
+        self.user_sp.modified = False
+        self.user_sp.save()
+        request = self.factory.get(reverse("serviceprovider-list"))
+        request.user = self.superuser
+        response = ServiceProviderList.as_view()(request)
+        providers = {sp.pk: sp for sp in response.context_data["object_list"]}
+        self.assertTrue(providers[self.admin_sp.pk].production_status)
+        self.assertTrue(providers[self.admin_sp.pk].pending_change)
+        self.assertEqual(providers[self.admin_sp.pk].invite_count, 0)
+        self.assertTrue(providers[self.user_sp.pk].production_status)
+        self.assertFalse(providers[self.user_sp.pk].pending_change)
+        self.assertTrue(providers[self.user_sp.pk].missing_data)
+        self.assertEqual(providers[self.user_sp.pk].invite_count, 1)
+        self.assertIsNone(providers[self.admin_sp.pk].statistics_alert)
+        self.assertEqual(providers[self.user_sp.pk].statistics_alert, StatisticsAlert.DORMANT)
+
+    def test_sp_view_list_query_count(self):
+        self.client.force_login(self.superuser)
+        for service_type in ["saml", "ldap", "oidc"]:
+            ServiceProvider.objects.create(entity_id="test:%s" % service_type, service_type=service_type)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("serviceprovider-list"))
+        for n in range(10):
+            for service_type in ["saml", "ldap", "oidc"]:
+                sp = ServiceProvider.objects.create(
+                    entity_id="test:%s:%s" % (service_type, n), service_type=service_type
+                )
+                sp.admins.add(self.user)
+                ServiceProvider.objects.create(
+                    entity_id=sp.entity_id,
+                    service_type=service_type,
+                    history=sp.pk,
+                    validated=timezone.now(),
+                    end_at=timezone.now(),
+                )
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(reverse("serviceprovider-list"))
+        self.assertEqual(len(response.context["ldap_providers"]), 11)
+
 
 class ServiceProviderDetailTestCase(TestCase):
     def setUp(self):
@@ -201,3 +270,64 @@ class ServiceProviderBasicInformationTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertNotIn("Name in English or in Finnish is required.", response.content.decode())
+
+
+class ServiceProviderValidatedHistoryTestCase(TestCase):
+    def setUp(self):
+        self.sp = ServiceProvider.objects.create(entity_id="https://sp.example.org/sp", service_type="saml")
+        self.sp2 = ServiceProvider.objects.create(entity_id="https://sp2.example.org/sp", service_type="saml")
+        self.old = ServiceProvider.objects.create(
+            entity_id="https://sp.example.org/sp", service_type="saml", history=self.sp.pk, validated=timezone.now()
+        )
+        self.latest = ServiceProvider.objects.create(
+            entity_id="https://sp.example.org/sp", service_type="saml", history=self.sp.pk, validated=timezone.now()
+        )
+        ServiceProvider.objects.create(entity_id="https://sp.example.org/sp", service_type="saml", history=self.sp.pk)
+
+    def test_get_validated_history(self):
+        with self.assertNumQueries(1):
+            history = ServiceProvider.objects.get_validated_history([self.sp.pk, self.sp2.pk])
+        self.assertEqual(history, {self.sp.pk: self.latest})
+
+    def test_get_validated_history_empty(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(ServiceProvider.objects.get_validated_history([]), {})
+
+
+class MissingDataTestCase(TestCase):
+    def setUp(self):
+        self.saml_sp = ServiceProvider.objects.create(
+            entity_id="https://sp.example.org/sp", service_type="saml", name_en="Test", privacypolicy_org=True
+        )
+        self.oidc_sp = ServiceProvider.objects.create(
+            entity_id="oidc_client", service_type="oidc", description_fi="Test", application_portfolio="https://x.y/"
+        )
+        self.ldap_sp = ServiceProvider.objects.create(entity_id="ldap_client", service_type="ldap")
+        Contact.objects.create(sp=self.saml_sp, type="technical", email="tester@example.org")
+        Endpoint.objects.create(
+            sp=self.saml_sp, type="AssertionConsumerService", binding="urn:binding", location="https://sp/acs"
+        )
+        RedirectUri.objects.create(sp=self.oidc_sp, uri="https://sp.example.org/redirect")
+
+    def test_get_missing_sp_data_flags(self):
+        with self.assertNumQueries(1):
+            flags = get_missing_sp_data_flags(ServiceProvider.objects.all())
+        self.assertEqual(
+            flags[self.saml_sp.pk], MISSING_DESCRIPTION | MISSING_APPLICATION_PORTFOLIO | MISSING_CERTIFICATE
+        )
+        self.assertEqual(flags[self.oidc_sp.pk], MISSING_NAME | MISSING_TECHNICAL_CONTACT | MISSING_PRIVACY_POLICY)
+        self.assertEqual(
+            flags[self.ldap_sp.pk],
+            MISSING_NAME | MISSING_DESCRIPTION | MISSING_APPLICATION_PORTFOLIO | MISSING_TECHNICAL_CONTACT,
+        )
+
+    def test_get_missing_sp_data(self):
+        self.assertEqual(
+            get_missing_sp_data(self.saml_sp, links=False),
+            ["Service description in English or in Finnish", "Application portfolio URL", "Certificate"],
+        )
+        self.assertEqual(
+            get_missing_sp_data(self.oidc_sp)[0],
+            "<a href='%s'>Service name in English or in Finnish</a>"
+            % reverse("basicinformation-update", args=[self.oidc_sp.pk]),
+        )
@@ -2,14 +2,18 @@ import json
 import os
 
 from django.contrib.auth.models import User
-from django.test import RequestFactory, TestCase
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 
 from rr.models.attribute import Attribute
+from rr.models.metadatacache import MetadataCache
 from rr.models.oidc import GrantType, OIDCScope, ResponseType
 from rr.models.redirecturi import RedirectUri
 from rr.models.serviceprovider import ServiceProvider, SPAttribute
-from rr.utils.oidc_metadata_generator import oidc_metadata_generator
+from rr.utils.oidc_metadata_generator import (
+    oidc_metadata_generator,
+    oidc_metadata_generator_list,
+)
 
 TESTDATA_OIDC_FILENAME = os.path.join(os.path.dirname(__file__), "../testdata/metadata_oidc.json")
 
@@ -195,3 +199,20 @@ class ServiceProviderOIDCTechnicalTestCase(TestCase):
         self.user_sp.save()
         metadata = oidc_metadata_generator(sp=self.user_sp, validated=False)
         self.assertNotIn("client_secret", metadata)
+
+    @override_settings(METADATA_CACHE=True)
+    def test_sp_oidc_metadata_cache(self):
+        self.user_sp.encrypted_client_secret = "abc"
+        self.user_sp.application_type = "web"
+        self.user_sp.save()
+        RedirectUri.objects.create(sp=self.user_sp, uri="https://sp2.example.org/redirect_uri")
+        include = [self.user_sp.entity_id]
+        metadata = oidc_metadata_generator_list(validated=False, include=include)
+        self.assertEqual(metadata, [oidc_metadata_generator(sp=self.user_sp, validated=False)])
+        self.assertEqual(oidc_metadata_generator_list(validated=False, include=include), metadata)
+        RedirectUri.objects.create(sp=self.user_sp, uri="https://sp2.example.org/redirect_uri2")
+        metadata = oidc_metadata_generator_list(validated=False, include=include)
+        self.assertEqual(len(metadata[0]["redirect_uris"]), 2)
+        MetadataCache.objects.all().delete()
+        oidc_metadata_generator_list(validated=False, include=include, client_secret_encryption="decrypted")
+        self.assertFalse(MetadataCache.objects.exists())
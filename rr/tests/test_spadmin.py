@@ -4,8 +4,10 @@ from django.test import RequestFactory, TestCase
 from django.urls import reverse
 
 from rr.forms.spadmin import SPAdminForm
+from rr.models.email import OutgoingEmail
 from rr.models.serviceprovider import ServiceProvider
 from rr.models.spadmin import Keystore
+from rr.utils.outbox import send_queued_emails
 
 
 class SPAdminFormTestCase(TestCase):
@@ -66,7 +68,12 @@ class SPAdminFormTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.context["object_list"]), 1)
+        self.assertEqual(response.context["object_list"][0].email_status, OutgoingEmail.QUEUED)
+        self.assertEqual(len(mail.outbox), 0)
+        send_queued_emails()
         self.assertEqual(mail.outbox[0].subject, "[SP-Registry] Access key for managing the service provider")
+        self.assertEqual(mail.outbox[0].to, ["test@example.org"])
+        self.assertEqual(Keystore.objects.get().emails.get().status, OutgoingEmail.SENT)
 
     def test_spadmin_view_use_invite(self):
         key = Keystore.objects.create_key(sp=self.admin_sp, creator=self.superuser, email="test@example.org")
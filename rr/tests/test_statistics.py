@@ -1,11 +1,25 @@
+import sqlite3
 from datetime import date, timedelta
 
 from django.contrib.auth.models import User
 from django.test import RequestFactory, TestCase
 from django.urls import reverse
+from django.utils import timezone
 
 from rr.models.serviceprovider import ServiceProvider
-from rr.models.statistics import Statistics
+from rr.models.statistics import (
+    MonthlyStatistics,
+    Statistics,
+    StatisticsAlert,
+    WeeklyStatistics,
+)
+from rr.utils.hyperloglog import HyperLogLog
+from rr.utils.statistics import (
+    get_statistics_watermark,
+    import_statistics,
+    rebuild_statistics_rollups,
+    week_start,
+)
 
 
 class StatisticsTestCase(TestCase):
@@ -44,6 +58,16 @@ class StatisticsTestCase(TestCase):
         self.assertIn("1561", response.content.decode())
         self.assertNotIn("3356", response.content.decode())
 
+    def test_statistics_view_list_rollups(self):
+        rebuild_statistics_rollups()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("statistics-list", kwargs={"pk": self.user_sp.pk}) + "?days=0")
+        self.assertEqual(response.context["period"], "month")
+        self.assertEqual(sum(stats.logins for stats in response.context["object_list"]), 5041)
+        response = self.client.get(reverse("statistics-list", kwargs={"pk": self.user_sp.pk}) + "?days=365")
+        self.assertEqual(response.context["period"], "week")
+        self.assertEqual(sum(stats.logins for stats in response.context["object_list"]), 5041)
+
 
 class StatisticsSummaryTestCase(TestCase):
     def setUp(self):
@@ -57,6 +81,7 @@ class StatisticsSummaryTestCase(TestCase):
         Statistics.objects.create(sp=self.user_sp, date=date.today() - timedelta(days=1), logins=1561)
         Statistics.objects.create(sp=self.user_sp, date=date.today() - timedelta(days=2), logins=124)
         Statistics.objects.create(sp=self.user_sp, date=date.today() - timedelta(days=33), logins=3356)
+        rebuild_statistics_rollups()
 
     def test_statistics_summary_view_denies_anonymous(self):
         response = self.client.get(reverse("statistics-summary-list"), follow=True)
@@ -77,3 +102,134 @@ class StatisticsSummaryTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn("1685", response.content.decode())
         self.assertIn("5041", response.content.decode())
+
+    def test_statistics_summary_view_sort_and_query_count(self):
+        sp = ServiceProvider.objects.create(
+            entity_id="https://sp3.example.org/sp", service_type="saml", production=True
+        )
+        Statistics.objects.create(sp=sp, date=date.today() - timedelta(days=1), logins=20000, users=150)
+        Statistics.objects.create(sp=self.user_sp, date=date.today() - timedelta(days=3), logins=10, users=80)
+        rebuild_statistics_rollups()
+        self.client.force_login(self.superuser)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("statistics-summary-list") + "?order=-week")
+        rows = list(response.context["object_list"])
+        self.assertEqual([row.pk for row in rows], [sp.pk, self.user_sp.pk])
+        self.assertEqual(rows[0].users, 150)
+        self.assertEqual(rows[1].week, 1695)
+        self.assertEqual(rows[1].year, 5051)
+        response = self.client.get(reverse("statistics-summary-list") + "?order=users")
+        self.assertEqual([row.pk for row in response.context["object_list"]], [self.user_sp.pk, sp.pk])
+
+    def test_statistics_summary_view_unique_users(self):
+        sp = ServiceProvider.objects.create(
+            entity_id="https://sp3.example.org/sp", service_type="saml", production=True
+        )
+        for day, users in [(1, range(0, 30)), (2, range(20, 50))]:
+            sketch = HyperLogLog()
+            for user in users:
+                sketch.add("user%s" % user)
+            Statistics.objects.create(
+                sp=sp, date=date.today() - timedelta(days=day), logins=30, users=30, users_sketch=sketch.to_bytes()
+            )
+        self.client.force_login(self.superuser)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("statistics-summary-list") + "?order=-unique_users")
+        rows = response.context["object_list"]
+        self.assertEqual([row.pk for row in rows], [sp.pk, self.user_sp.pk])
+        self.assertEqual(rows[0].unique_users, 50)
+        self.assertIsNone(rows[1].unique_users)
+
+
+class StatisticsImportTestCase(TestCase):
+    def setUp(self):
+        self.sp = ServiceProvider.objects.create(entity_id="https://sp.example.org/sp", service_type="saml")
+        self.sp2 = ServiceProvider.objects.create(entity_id="https://sp2.example.org/sp", service_type="saml")
+        self.today = date.today()
+        Statistics.objects.create(sp=self.sp, date=self.today - timedelta(days=2), logins=10, users=5)
+        Statistics.objects.create(sp=self.sp, date=self.today - timedelta(days=1), logins=10, users=5)
+
+    def _cursor(self, rows):
+        cursor = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_COLNAMES).cursor()
+        cursor.execute("CREATE TABLE stats (entity_id TEXT, date DATE, logins INTEGER, users INTEGER)")
+        cursor.executemany("INSERT INTO stats VALUES (?, ?, ?, ?)", rows)
+        cursor.execute('SELECT entity_id, date AS "date [date]", logins, users FROM stats ORDER BY date')
+        return cursor
+
+    def test_import_statistics(self):
+        rows = [
+            (self.sp.entity_id, self.today - timedelta(days=2), 10, 5),
+            (self.sp.entity_id, self.today - timedelta(days=1), 12, 6),
+            (self.sp2.entity_id, self.today - timedelta(days=1), 3, 2),
+            ("https://unknown.example.org/sp", self.today - timedelta(days=1), 1, 1),
+        ]
+        with self.assertNumQueries(21):
+            results = list(import_statistics(self._cursor(rows), chunk_size=2))
+        self.assertEqual([status for status, row in results], ["EXISTS", "UPDATED", "CREATED", "UNKNOWN SP"])
+        self.assertEqual(Statistics.objects.get(sp=self.sp, date=self.today - timedelta(days=1)).logins, 12)
+        self.assertEqual(Statistics.objects.get(sp=self.sp2).users, 2)
+        self.assertEqual(Statistics.objects.count(), 3)
+        self.assertEqual(get_statistics_watermark(), self.today - timedelta(days=1))
+        self.assertEqual(
+            WeeklyStatistics.objects.get(sp=self.sp, date=week_start(self.today - timedelta(days=1))).logins,
+            sum(
+                stats.logins
+                for stats in Statistics.objects.filter(
+                    sp=self.sp, date__gte=week_start(self.today - timedelta(days=1))
+                )
+            ),
+        )
+        self.assertEqual(MonthlyStatistics.objects.get(sp=self.sp2).logins, 3)
+
+    def test_import_statistics_sketches(self):
+        rows = [(self.sp.entity_id, self.today - timedelta(days=8), "user%s" % n, 2) for n in range(100)] + [
+            (self.sp.entity_id, self.today - timedelta(days=7), "user%s" % n, 1) for n in range(50, 200)
+        ]
+        # Logins without a principal name are not counted as users
+        rows += [
+            (self.sp.entity_id, self.today - timedelta(days=8), None, 5),
+            (self.sp.entity_id, self.today - timedelta(days=7), "", 5),
+            (self.sp.entity_id, self.today - timedelta(days=6), None, 3),
+        ]
+        cursor = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_COLNAMES).cursor()
+        cursor.execute("CREATE TABLE stats (entity_id TEXT, date DATE, user TEXT, logins INTEGER)")
+        cursor.executemany("INSERT INTO stats VALUES (?, ?, ?, ?)", rows)
+        cursor.execute('SELECT entity_id, date AS "date [date]", user, logins FROM stats ORDER BY date, entity_id')
+        results = list(import_statistics(cursor, chunk_size=10, sketches=True))
+        self.assertEqual([row[2:4] for status, row in results], [(205, 100), (155, 150), (3, 0)])
+        statistics = Statistics.objects.get(sp=self.sp, date=self.today - timedelta(days=7))
+        self.assertAlmostEqual(HyperLogLog.from_bytes(statistics.users_sketch).count(), 150, delta=10)
+        for model in [WeeklyStatistics, MonthlyStatistics]:
+            for rollup in model.objects.filter(sp=self.sp):
+                if rollup.logins in (360, 363):
+                    self.assertAlmostEqual(rollup.unique_users, 200, delta=10)
+
+
+class StatisticsAlertTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="tester")
+        self.superuser = User.objects.create(username="superuser", is_superuser=True)
+        self.sp = ServiceProvider.objects.create(
+            entity_id="https://sp.example.org/sp", service_type="saml", production=True
+        )
+        ServiceProvider.objects.filter(pk=self.sp.pk).update(created_at=timezone.now() - timedelta(days=365))
+
+    def test_statistics_alert_view_denies_unauthorized_user(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("statistics-alert-list"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_statistics_alert_view_list(self):
+        self.client.force_login(self.superuser)
+        response = self.client.get(reverse("statistics-alert-list"))
+        self.assertNotContains(response, "https://sp.example.org/sp")
+        response = self.client.get(reverse("statistics-alert-list") + "?live")
+        self.assertContains(response, "https://sp.example.org/sp")
+        self.assertContains(response, "No logins")
+
+    def test_statistics_alert_view_list_saved(self):
+        StatisticsAlert.objects.create(sp=self.sp, type=StatisticsAlert.DORMANT)
+        self.client.force_login(self.superuser)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("statistics-alert-list"))
+        self.assertContains(response, "https://sp.example.org/sp")
@@ -0,0 +1,197 @@
+"""
+Archival of ended history rows
+
+Ended linked objects and service provider history copies are moved to archive
+tables with the same fields, so queries for active rows only read current data.
+Only rows which are no longer used by views or metadata generation are archived:
+
+- Linked objects which ended before the SP, or its latest validated history copy, was validated.
+- History copies other than the latest validated history copy of each SP.
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from rr.models.archive import ARCHIVE_MODELS
+from rr.models.certificate import Certificate
+from rr.models.contact import Contact
+from rr.models.endpoint import Endpoint
+from rr.models.redirecturi import RedirectUri
+from rr.models.serviceprovider import ServiceProvider, SPAttribute
+from rr.models.usergroup import UserGroup
+from rr.utils.signals import receivers_disabled
+
+logger = logging.getLogger(__name__)
+
+LINKED_MODELS = [Certificate, Contact, Endpoint, RedirectUri, SPAttribute, UserGroup]
+
+
+def archivable_linked_objects(model, cutoff):
+    """
+    Returns queryset of linked objects which ended before cutoff and before the
+    last validation of their service provider.
+
+    model: linked model, i.e. Certificate
+    cutoff: datetime limit for end_at
+    """
+    latest_validation = (
+        ServiceProvider.objects.filter(history=OuterRef("sp"))
+        .exclude(validated=None)
+        .order_by("-pk")
+        .values("validated")[:1]
+    )
+    return (
+        model.objects.annotate(last_validation=Coalesce("sp__validated", Subquery(latest_validation)))
+        .filter(end_at__lt=cutoff)
+        .filter(end_at__lt=F("last_validation"))
+    )
+
+
+def archivable_history(cutoff):
+    """
+    Returns queryset of history copies which ended before cutoff, excluding the
+    latest validated history copy of each service provider.
+
+    cutoff: datetime limit for end_at
+    """
+    latest = (
+        ServiceProvider.objects.filter(history__isnull=False)
+        .exclude(validated=None)
+        .values("history")
+        .annotate(latest=Max("pk"))
+        .values("latest")
+    )
+    return ServiceProvider.objects.filter(history__isnull=False, end_at__lt=cutoff).exclude(pk__in=latest)
+
+
+def _auto_many_to_many(model):
+    """Returns many-to-many fields of model without an explicit through model"""
+    return [field for field in model._meta.local_many_to_many if field.remote_field.through._meta.auto_created]
+
+
+def archive_objects(model, pks):
+    """
+    Moves objects to the archive model in a single transaction, including
+    many-to-many relations.
+
+    model: archived model
+    pks: list of object pks
+
+    return number of archived objects
+    """
+    archive = ARCHIVE_MODELS[model]
+    fields = [field.attname for field in model._meta.local_fields]
+    with transaction.atomic():
+        rows = list(model.objects.filter(pk__in=pks).select_for_update().values(*fields))
+        archive.objects.bulk_create([archive(**row) for row in rows])
+        pks = [row["id"] for row in rows]
+        for field in _auto_many_to_many(model):
+            through = field.remote_field.through
+            archive_field = archive._meta.get_field(field.name)
+            archive_through = archive_field.remote_field.through
+            links = through.objects.filter(**{field.m2m_field_name() + "__in": pks}).values_list(
+                field.m2m_column_name(), field.m2m_reverse_name()
+            )
+            archive_through.objects.bulk_create(
+                [
+                    archive_through(
+                        **{archive_field.m2m_column_name(): source, archive_field.m2m_reverse_name(): target}
+                    )
+                    for source, target in links
+                ]
+            )
+        # Archived rows are not used in metadata or host index, so metadata
+        # cache and host index receivers are not run for each deleted object.
+        with receivers_disabled():
+            model.objects.filter(pk__in=pks).delete()
+    return len(rows)
+
+
+def archive_queryset(queryset, chunk_size=1000, list_only=False):
+    """
+    Archives objects in queryset in chunks, each chunk in its own transaction.
+
+    queryset: queryset of archivable objects
+    chunk_size: number of objects archived in a transaction
+    list_only: count objects without archiving them
+
+    return number of archived objects
+    """
+    if list_only:
+        return queryset.count()
+    pks = queryset.order_by("pk").values_list("pk", flat=True)
+    count = 0
+    last_pk = None
+    while True:
+        chunk = list((pks.filter(pk__gt=last_pk) if last_pk is not None else pks)[:chunk_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1]
+        count += archive_objects(queryset.model, chunk)
+    logger.debug("Archived %s objects from %s", count, queryset.model.__name__)
+    return count
+
+
+def archive_ended_rows(cutoff, chunk_size=1000, list_only=False):
+    """
+    Archives ended linked objects and history copies.
+
+    cutoff: only rows ended before cutoff are archived
+    chunk_size: number of objects archived in a transaction
+    list_only: count objects without archiving them
+
+    return dictionary of number of archived objects by model name
+    """
+    counts = {}
+    for model in LINKED_MODELS:
+        counts[model.__name__] = archive_queryset(archivable_linked_objects(model, cutoff), chunk_size, list_only)
+    counts[ServiceProvider.__name__] = archive_queryset(archivable_history(cutoff), chunk_size, list_only)
+    return counts
+
+
+def _union_with_archive(model, query):
+    """
+    Returns unsaved objects of model matching query from both the model table and
+    its archive table, read with a single UNION query and ordered by pk.
+
+    model: archived model, i.e. Certificate
+    query: Q object for filtering rows
+    """
+    fields = [field.attname for field in model._meta.local_fields]
+    rows = (
+        model.objects.filter(query)
+        .values(*fields)
+        .union(ARCHIVE_MODELS[model].objects.filter(query).values(*fields), all=True)
+        .order_by(model._meta.pk.attname)
+    )
+    return [model(**row) for row in rows]
+
+
+def get_linked_objects_at(sp, model, moment):
+    """
+    Returns objects linked to SP which were active at moment, including archived
+    objects. Objects are returned as unsaved objects of the model.
+
+    sp: ServiceProvider object or pk
+    model: linked model, i.e. Certificate
+    moment: point in time
+
+    return list of objects ordered by pk
+    """
+    return _union_with_archive(model, Q(sp=sp, created_at__lte=moment) & (Q(end_at=None) | Q(end_at__gt=moment)))
+
+
+def get_history_versions(pk):
+    """
+    Returns history copies of a service provider, including archived ones.
+    Copies are returned as unsaved ServiceProvider objects without many-to-many
+    relations.
+
+    pk: ServiceProvider pk
+
+    return list of ServiceProvider objects ordered by pk
+    """
+    return _union_with_archive(ServiceProvider, Q(history=pk))
@@ -0,0 +1,141 @@
+"""
+Functions for reading login statistics from Shibboleth IdP audit log files
+"""
+
+import gzip
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from django.db import connections
+
+from rr.utils.hyperloglog import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+# Field positions in the default Shibboleth IdP audit log format
+# %a|%ST|%T|%u|%SP|%i|%ac|%t|%attr|%n|%f|%SSO|%XX|%XA|%b|%bb|%e|%S|%SS|%s|%UA
+AUDIT_LOG_TIME_FIELD = 2
+AUDIT_LOG_USER_FIELD = 3
+AUDIT_LOG_SP_FIELD = 4
+AUDIT_LOG_PROFILE_FIELD = 5
+
+# Profiles of authentication events. Other events, like logouts, attribute
+# queries and CAS ticket validations, are not counted as logins.
+AUDIT_LOG_LOGIN_PROFILES = {
+    "http://shibboleth.net/ns/profiles/saml2/sso/browser",
+    "http://shibboleth.net/ns/profiles/saml2/sso/ecp",
+    "http://shibboleth.net/ns/profiles/saml1/sso/browser",
+    "http://shibboleth.net/ns/profiles/shibboleth/sso/browser",
+    "http://shibboleth.net/ns/profiles/oidc/sso/browser",
+    "https://www.apereo.org/cas/protocol/login",
+}
+
+
+def parse_audit_log_date(value):
+    """
+    Returns date from audit log timestamp, i.e. 20230705T112233Z or 2023-07-05T11:22:33Z,
+    or None if timestamp is invalid.
+    """
+    digits = value[:10].replace("-", "")
+    try:
+        return date(int(digits[0:4]), int(digits[4:6]), int(digits[6:8]))
+    except ValueError:
+        return None
+
+
+def open_audit_log(path):
+    """Opens audit log file for reading, gzip compressed if name ends with .gz"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def read_audit_log(
+    path,
+    delimiter="|",
+    time_field=AUDIT_LOG_TIME_FIELD,
+    user_field=AUDIT_LOG_USER_FIELD,
+    sp_field=AUDIT_LOG_SP_FIELD,
+    profile_field=AUDIT_LOG_PROFILE_FIELD,
+):
+    """
+    Reads an audit log file line by line and aggregates logins per relying party and day.
+    Only lines of authentication events, by profile, are counted as logins.
+    Unique users are counted with a sketch, so memory use does not depend on the
+    number of users.
+
+    path: audit log file path
+    delimiter: field delimiter
+    time_field, user_field, sp_field: field positions
+    profile_field: profile field position, negative to count all lines as logins
+
+    return dictionary of (logins, sketch) tuples by (entity_id, date)
+    """
+    totals = {}
+    max_field = max(time_field, user_field, sp_field, profile_field)
+    skipped = 0
+    ignored = 0
+    with open_audit_log(path) as f:
+        for line in f:
+            fields = line.rstrip("\n").split(delimiter)
+            if len(fields) <= max_field or not fields[user_field] or not fields[sp_field]:
+                skipped += 1
+                continue
+            if profile_field >= 0 and fields[profile_field] not in AUDIT_LOG_LOGIN_PROFILES:
+                ignored += 1
+                continue
+            day = parse_audit_log_date(fields[time_field])
+            if not day:
+                skipped += 1
+                continue
+            key = (fields[sp_field], day)
+            if key not in totals:
+                totals[key] = [0, HyperLogLog()]
+            totals[key][0] += 1
+            totals[key][1].add(fields[user_field])
+    if skipped:
+        logger.debug("Skipped %s lines in %s", skipped, path)
+    if ignored:
+        logger.debug("Ignored %s non-login events in %s", ignored, path)
+    return {key: (logins, sketch.to_bytes()) for key, (logins, sketch) in totals.items()}
+
+
+def audit_log_rows(totals):
+    """
+    Returns list of (entity_id, date, logins, users, sketch) rows from read_audit_log
+    results, ordered by date and entity_id.
+    """
+    rows = []
+    for (entity_id, day), (logins, sketch) in sorted(totals.items(), key=lambda item: (item[0][1], item[0][0])):
+        rows.append((entity_id, day, logins, HyperLogLog.from_bytes(sketch).count(), sketch))
+    return rows
+
+
+def read_audit_logs(paths, workers=1, **options):
+    """
+    Reads audit log files one at a time, using a pool of worker processes if
+    workers is over 1. Results are yielded for each file, so only results of
+    files being read or saved are kept in memory.
+
+    paths: list of audit log file paths
+    workers: number of worker processes
+    options: options for read_audit_log
+
+    yield list of (entity_id, date, logins, users, sketch) rows for each file, ordered by date and entity_id
+    """
+    if workers > 1 and len(paths) > 1:
+        # Forked workers must not share database connections with this process
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for path in paths:
+                pending.append(executor.submit(read_audit_log, path, **options))
+                if len(pending) >= workers:
+                    yield audit_log_rows(pending.popleft().result())
+            while pending:
+                yield audit_log_rows(pending.popleft().result())
+    else:
+        for path in paths:
+            yield audit_log_rows(read_audit_log(path, **options))
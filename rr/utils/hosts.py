@@ -0,0 +1,181 @@
+"""
+Host name index of service endpoints, redirect URIs and server names
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from urllib.parse import urlparse
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rr.models.endpoint import Endpoint
+from rr.models.redirecturi import RedirectUri
+from rr.models.servicehost import ServiceHost
+from rr.models.serviceprovider import ServiceProvider
+from rr.utils.signals import receivers_enabled
+
+logger = logging.getLogger(__name__)
+
+# Service provider pks waiting for host index update, by source
+_pending = threading.local()
+
+ALL_SOURCES = [ServiceHost.ENDPOINT, ServiceHost.REDIRECT_URI, ServiceHost.SERVER_NAME]
+
+
+def normalize_host(host):
+    """Returns host name in lower case without trailing dot"""
+    return host.strip().lower().rstrip(".")
+
+
+def url_hostname(url):
+    """Returns normalized host name part of URL, or empty string"""
+    try:
+        return normalize_host(urlparse(url).hostname or "")
+    except ValueError:
+        return ""
+
+
+def _current_hosts(serviceproviders, sources):
+    """
+    Returns set of (sp pk, host, source) tuples read from current endpoints,
+    redirect URIs and server names.
+
+    serviceproviders: dictionary of server names by SP pk
+    sources: list of sources
+    """
+    hosts = set()
+    if ServiceHost.ENDPOINT in sources:
+        for sp, location in Endpoint.objects.filter(sp__in=serviceproviders, end_at=None).values_list(
+            "sp", "location"
+        ):
+            hosts.add((sp, url_hostname(location), ServiceHost.ENDPOINT))
+    if ServiceHost.REDIRECT_URI in sources:
+        for sp, uri in RedirectUri.objects.filter(sp__in=serviceproviders, end_at=None).values_list("sp", "uri"):
+            hosts.add((sp, url_hostname(uri), ServiceHost.REDIRECT_URI))
+    if ServiceHost.SERVER_NAME in sources:
+        for sp, server_names in serviceproviders.items():
+            for server_name in server_names.splitlines():
+                hosts.add((sp, normalize_host(server_name), ServiceHost.SERVER_NAME))
+    return {host for host in hosts if host[1]}
+
+
+def update_service_hosts(pks, sources=None):
+    """
+    Updates host index for service providers. Hosts of ended service providers are removed.
+
+    pks: iterable of ServiceProvider pks
+    sources: list of updated sources, default all
+    """
+    sources = sources or ALL_SOURCES
+    pks = set(pks)
+    serviceproviders = dict(ServiceProvider.objects.filter(pk__in=pks, end_at=None).values_list("pk", "server_names"))
+    with transaction.atomic(savepoint=False):
+        ended = pks - serviceproviders.keys()
+        if ended:
+            ServiceHost.objects.filter(sp__in=ended).delete()
+        if not serviceproviders:
+            return
+        current = _current_hosts(serviceproviders, sources)
+        existing = {
+            (sp, host, source): pk
+            for pk, sp, host, source in ServiceHost.objects.filter(
+                sp__in=serviceproviders, source__in=sources
+            ).values_list("pk", "sp", "host", "source")
+        }
+        removed = [pk for key, pk in existing.items() if key not in current]
+        if removed:
+            ServiceHost.objects.filter(pk__in=removed).delete()
+        ServiceHost.objects.bulk_create(
+            [ServiceHost(sp_id=sp, host=host, source=source) for sp, host, source in current - existing.keys()]
+        )
+
+
+def rebuild_service_hosts(chunk_size=1000):
+    """
+    Rebuilds host index for all current service providers, in chunks.
+
+    return number of indexed hosts
+    """
+    ServiceHost.objects.exclude(sp__end_at=None).delete()
+    pks = list(ServiceProvider.objects.filter(end_at=None).order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(pks), chunk_size):
+        update_service_hosts(pks[start : start + chunk_size])
+    return ServiceHost.objects.count()
+
+
+def find_service_hosts(host, sources=None):
+    """
+    Returns ServiceHost queryset for a host name.
+
+    host: host name
+    sources: list of sources, default all
+    """
+    return ServiceHost.objects.filter(host=normalize_host(host), source__in=sources or ALL_SOURCES)
+
+
+def _update_pending_service_hosts():
+    """
+    Updates host index for pending service providers. Callback is registered for
+    each change, so the first callback after commit updates all pending changes
+    and the rest have nothing to do.
+    """
+    pending = getattr(_pending, "hosts", None)
+    _pending.hosts = defaultdict(set)
+    if not pending:
+        return
+    for source in ALL_SOURCES:
+        if pending[source]:
+            update_service_hosts(pending[source], [source])
+
+
+def schedule_service_hosts_update(pk, source):
+    """
+    Updates host index for a service provider source when the current transaction
+    is committed, only once for each SP and source.
+
+    pk: ServiceProvider pk
+    source: updated source
+    """
+    if not hasattr(_pending, "hosts") or not transaction.get_connection().run_on_commit:
+        # Nothing is waiting for commit, so pending updates are from a rolled back transaction
+        _pending.hosts = defaultdict(set)
+    _pending.hosts[source].add(pk)
+    transaction.on_commit(_update_pending_service_hosts)
+
+
+@receiver([post_save, post_delete], sender=Endpoint)
+def endpoint_changed(sender, instance, **kwargs):
+    """Updates endpoint hosts of SP"""
+    if not kwargs.get("raw") and receivers_enabled():
+        schedule_service_hosts_update(instance.sp_id, ServiceHost.ENDPOINT)
+
+
+@receiver([post_save, post_delete], sender=RedirectUri)
+def redirecturi_changed(sender, instance, **kwargs):
+    """Updates redirect URI hosts of SP"""
+    if not kwargs.get("raw") and receivers_enabled():
+        schedule_service_hosts_update(instance.sp_id, ServiceHost.REDIRECT_URI)
+
+
+@receiver(post_save, sender=ServiceProvider)
+def serviceprovider_changed(sender, instance, **kwargs):
+    """
+    Updates server name hosts of SP, or removes all hosts if SP has ended.
+    History copies, new SPs and SAML SPs without server names have no server
+    name hosts to update.
+    """
+    if kwargs.get("raw") or instance.history or not receivers_enabled():
+        return
+    update_fields = kwargs.get("update_fields")
+    if update_fields and not {"server_names", "end_at"} & set(update_fields):
+        return
+    if (
+        not instance.server_names
+        and not instance.end_at
+        and (kwargs.get("created") or instance.service_type == "saml")
+    ):
+        return
+    schedule_service_hosts_update(instance.pk, ServiceHost.SERVER_NAME)
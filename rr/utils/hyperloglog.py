@@ -0,0 +1,73 @@
+"""
+HyperLogLog cardinality sketch for approximate unique user counts.
+
+Sketches are stored as compressed registers and can be merged, so unique
+users for any time window are estimated from daily sketches.
+"""
+
+import hashlib
+import math
+import zlib
+
+# Number of registers is 2^PRECISION, standard error is about 1.04 / sqrt(2^PRECISION)
+PRECISION = 11
+
+
+class HyperLogLog:
+    def __init__(self, precision=PRECISION, registers=None):
+        self.precision = precision
+        self.registers = bytearray(registers) if registers else bytearray(1 << precision)
+
+    def add(self, value):
+        """Adds a string value to the sketch"""
+        hashed = int.from_bytes(hashlib.sha1(value.encode("utf-8")).digest()[:8], "big")
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Merges another sketch with the same precision to this sketch"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        """Returns estimated number of unique values"""
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0**-register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self):
+        """Returns compressed sketch, first byte is precision"""
+        return zlib.compress(bytes([self.precision]) + bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = zlib.decompress(data)
+        return cls(precision=data[0], registers=data[1:])
+
+
+def merge_sketches(sketches):
+    """
+    Merges stored sketches, ignoring missing ones.
+
+    sketches: iterable of sketches from to_bytes, or None
+
+    return HyperLogLog or None if there were no sketches
+    """
+    merged = None
+    for data in sketches:
+        if not data:
+            continue
+        sketch = HyperLogLog.from_bytes(data)
+        if merged is None:
+            merged = sketch
+        else:
+            merged.merge(sketch)
+    return merged
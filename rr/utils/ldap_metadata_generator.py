@@ -10,7 +10,12 @@ from lxml import etree
 from rr.models.contact import Contact
 from rr.models.serviceprovider import ServiceProvider, SPAttribute
 from rr.models.usergroup import UserGroup
-from rr.utils.metadata_generator_common import get_entity
+from rr.utils.metadata_cache import (
+    get_cached_metadata,
+    metadata_cache_enabled,
+    metadata_cache_key,
+)
+from rr.utils.metadata_generator_common import get_entity, prefetch_validated_history
 
 logger = logging.getLogger(__name__)
 
@@ -127,8 +132,42 @@ def ldap_metadata_generator_list(validated=True, production=False, include=None)
     Using CamelCase instead of regular underscore attribute names in element tree.
     """
     tree = etree.Element("LdapEntities", Name="ldap2015.helsinki.fi")
-    serviceproviders = ServiceProvider.objects.filter(end_at=None, service_type="ldap")
-    for sp in filter(lambda x: not x.uses_ldapauth, serviceproviders):
-        if (production and sp.production) or (include and sp.entity_id in include):
-            ldap_metadata_generator(sp, validated, tree)
+    serviceproviders = [
+        sp
+        for sp in ServiceProvider.objects.filter(end_at=None, service_type="ldap")
+        if not sp.uses_ldapauth and ((production and sp.production) or (include and sp.entity_id in include))
+    ]
+    if metadata_cache_enabled():
+        tree.extend(ldap_metadata_cached_list(serviceproviders, validated))
+        return tree
+    if validated:
+        prefetch_validated_history(serviceproviders)
+    for sp in serviceproviders:
+        ldap_metadata_generator(sp, validated, tree)
     return tree
+
+
+def ldap_metadata_cached_list(serviceproviders, validated):
+    """
+    Returns list of Entity elements for service providers, using cached metadata where available.
+
+    serviceproviders: list of ServiceProvider objects
+    validated: if false, using unvalidated metadata
+    """
+
+    def render(missing):
+        if validated:
+            prefetch_validated_history(missing)
+        rendered = {}
+        for sp in missing:
+            tree = ldap_metadata_generator(sp, validated, etree.Element("LdapEntities"))
+            rendered[sp.pk] = etree.tostring(tree[0], encoding=str) if len(tree) else ""
+        return rendered
+
+    key = metadata_cache_key("ldap", validated=validated)
+    parser = etree.XMLParser(remove_blank_text=True)
+    return [
+        etree.fromstring(metadata, parser)
+        for metadata in get_cached_metadata(serviceproviders, validated, key, render)
+        if metadata
+    ]
@@ -0,0 +1,219 @@
+"""
+Cache for rendered metadata of individual entities
+"""
+
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from rr.models.attribute import Attribute
+from rr.models.certificate import Certificate
+from rr.models.contact import Contact
+from rr.models.endpoint import Endpoint
+from rr.models.metadatacache import MetadataCache, MetadataCacheVersion, MetadataVersion
+from rr.models.nameidformat import NameIDFormat
+from rr.models.oidc import GrantType, OIDCScope, ResponseType
+from rr.models.organization import Organization
+from rr.models.redirecturi import RedirectUri
+from rr.models.serviceprovider import ServiceProvider, SPAttribute
+from rr.models.usergroup import UserGroup
+from rr.utils.signals import receivers_enabled
+
+logger = logging.getLogger(__name__)
+
+# Settings which are used in metadata generation
+METADATA_SETTINGS = ["DISABLE_METADATA_ENTITY_EXTENSIONS", "INDEXED_ENDPOINT_TYPES", "MFA_AUTHENTICATION_CONTEXT"]
+
+
+def metadata_cache_enabled():
+    """Returns true if rendered metadata should be cached"""
+    return hasattr(settings, "METADATA_CACHE") and settings.METADATA_CACHE
+
+
+def metadata_cache_key(metadata_format, **options):
+    """
+    Returns cache key for metadata format and generator options.
+    Settings used in metadata generation are included in the key.
+
+    metadata_format: "saml", "oidc" or "ldap"
+    options: generator options
+    """
+    options["format"] = metadata_format
+    options["settings"] = [getattr(settings, name, None) for name in METADATA_SETTINGS]
+    return hashlib.sha1(json.dumps(options, sort_keys=True).encode()).hexdigest()
+
+
+def metadata_settings_key():
+    """Returns hash of settings used in metadata generation"""
+    return hashlib.sha1(json.dumps([getattr(settings, name, None) for name in METADATA_SETTINGS]).encode()).hexdigest()
+
+
+def get_shared_metadata_changed():
+    """
+    Returns time of the latest change in objects shared between service providers
+    or in metadata settings, or None. A change in settings is stored when it is
+    first noticed.
+    """
+    settings_key = metadata_settings_key()
+    version, created = MetadataVersion.objects.get_or_create(pk=1, defaults={"settings_key": settings_key})
+    if version.settings_key != settings_key:
+        version.settings_key = settings_key
+        version.changed_at = timezone.now()
+        version.save()
+    return version.changed_at
+
+
+def shared_metadata_changed():
+    """
+    Stores time of a change in objects shared between service providers
+    """
+    now = timezone.now()
+    if not MetadataVersion.objects.filter(pk=1).update(changed_at=now):
+        MetadataVersion.objects.create(pk=1, changed_at=now, settings_key=metadata_settings_key())
+
+
+def get_metadata_versions(serviceproviders):
+    """
+    Returns metadata versions for a list of service providers. Version changes
+    when the service provider is saved, its cached metadata is invalidated, or
+    objects shared between service providers are changed.
+
+    serviceproviders: list of ServiceProvider objects
+
+    return dictionary of version hashes by SP pk
+    """
+    shared_changed = MetadataVersion.objects.filter(pk=1).values_list("changed_at", flat=True).first()
+    invalidations = dict(
+        MetadataCacheVersion.objects.filter(sp__in=[sp.pk for sp in serviceproviders]).values_list(
+            "sp", "invalidations"
+        )
+    )
+    return {
+        sp.pk: hashlib.sha1(
+            json.dumps([str(sp.updated_at), invalidations.get(sp.pk, 0), str(shared_changed)]).encode()
+        ).hexdigest()
+        for sp in serviceproviders
+    }
+
+
+def get_cached_metadata(serviceproviders, validated, key, render):
+    """
+    Returns rendered metadata for a list of service providers, using cached
+    metadata where available.
+
+    Versions are read before rendering and stored with the rendered metadata.
+    If metadata is invalidated while it is rendered, the stored version is
+    already outdated and the metadata is not used.
+
+    serviceproviders: list of ServiceProvider objects
+    validated: if false, using unvalidated metadata
+    key: cache key from metadata_cache_key
+    render: function rendering metadata for a list of service providers,
+      returning a dictionary of rendered metadata strings by SP pk.
+      Empty string is used if SP has no metadata.
+
+    return list of rendered metadata strings in the same order as serviceproviders
+    """
+    versions = get_metadata_versions(serviceproviders)
+    cache = {
+        sp: metadata
+        for sp, metadata, version in MetadataCache.objects.filter(
+            sp__in=[sp.pk for sp in serviceproviders], validated=validated, options=key
+        ).values_list("sp", "metadata", "version")
+        if version == versions[sp]
+    }
+    missing = [sp for sp in serviceproviders if sp.pk not in cache]
+    if missing:
+        rendered = render(missing)
+        MetadataCache.objects.bulk_create(
+            [
+                MetadataCache(sp_id=pk, validated=validated, options=key, metadata=metadata, version=versions[pk])
+                for pk, metadata in rendered.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["sp", "validated", "options"],
+            update_fields=["metadata", "version"],
+        )
+        cache.update(rendered)
+        logger.debug("Rendered metadata for %s service providers", len(missing))
+    return [cache[sp.pk] for sp in serviceproviders]
+
+
+def invalidate_metadata_cache(*pks):
+    """
+    Removes cached metadata for listed SP pks and updates their invalidation
+    counts, if cache is enabled.
+    """
+    pks = {pk for pk in pks if pk}
+    if pks and metadata_cache_enabled():
+        MetadataCache.objects.filter(sp__in=pks).delete()
+        MetadataCacheVersion.objects.filter(sp__in=pks).update(invalidations=F("invalidations") + 1)
+        MetadataCacheVersion.objects.bulk_create(
+            [MetadataCacheVersion(sp=pk, invalidations=1) for pk in pks], ignore_conflicts=True
+        )
+
+
+def clear_metadata_cache():
+    """
+    Removes all cached metadata, if cache is enabled.
+    """
+    if metadata_cache_enabled():
+        MetadataCache.objects.all().delete()
+
+
+@receiver([post_save, post_delete], sender=ServiceProvider)
+def serviceprovider_changed(sender, instance, **kwargs):
+    """Invalidates SP cache, history copies invalidate the original SP"""
+    if receivers_enabled():
+        invalidate_metadata_cache(instance.pk, instance.history)
+
+
+@receiver([post_save, post_delete], sender=Certificate)
+@receiver([post_save, post_delete], sender=Contact)
+@receiver([post_save, post_delete], sender=Endpoint)
+@receiver([post_save, post_delete], sender=RedirectUri)
+@receiver([post_save, post_delete], sender=SPAttribute)
+@receiver([post_save, post_delete], sender=UserGroup)
+def linked_object_changed(sender, instance, **kwargs):
+    """Invalidates cache for SP linked to changed object"""
+    if receivers_enabled():
+        invalidate_metadata_cache(instance.sp_id)
+
+
+@receiver(m2m_changed, sender=ServiceProvider.nameidformat.through)
+@receiver(m2m_changed, sender=ServiceProvider.grant_types.through)
+@receiver(m2m_changed, sender=ServiceProvider.response_types.through)
+@receiver(m2m_changed, sender=ServiceProvider.oidc_scopes.through)
+def serviceprovider_m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidates cache for SPs with changed many-to-many relations"""
+    if action not in ["post_add", "post_remove", "post_clear"] or not receivers_enabled():
+        return
+    if not reverse:
+        invalidate_metadata_cache(instance.pk, instance.history)
+    elif pk_set:
+        invalidate_metadata_cache(*pk_set)
+    else:
+        clear_metadata_cache()
+        shared_metadata_changed()
+
+
+@receiver([post_save, post_delete], sender=Attribute)
+@receiver([post_save, post_delete], sender=GrantType)
+@receiver([post_save, post_delete], sender=NameIDFormat)
+@receiver([post_save, post_delete], sender=OIDCScope)
+@receiver([post_save, post_delete], sender=Organization)
+@receiver([post_save, post_delete], sender=ResponseType)
+def shared_object_changed(sender, instance, **kwargs):
+    """
+    Objects shared between SPs are rarely changed, remove all cached metadata
+    and update the metadata version
+    """
+    if receivers_enabled() and not kwargs.get("raw"):
+        clear_metadata_cache()
+        shared_metadata_changed()
@@ -1,3 +1,5 @@
+from django.db.models import Q, prefetch_related_objects
+
 from rr.models.serviceprovider import ServiceProvider
 
 
@@ -5,7 +7,10 @@ def get_entity(sp, validated):
     """Set history object if using validated metadata and newest version is not validated.
     Set validation_date to last point where metadata was validated"""
     if validated and not sp.validated:
-        history = ServiceProvider.objects.filter(history=sp.pk).exclude(validated=None).last()
+        if hasattr(sp, "validated_history"):
+            history = sp.validated_history
+        else:
+            history = ServiceProvider.objects.get_validated_history([sp.pk]).get(sp.pk)
         if not history:
             return None, None, None
         validation_date = history.validated
@@ -22,3 +27,58 @@ def get_entity(sp, validated):
         entity = sp
 
     return entity, history, validation_date
+
+
+def prefetch_validated_history(serviceproviders, *lookups):
+    """
+    Sets validated_history attribute for each unvalidated SP in a list, using a single query.
+    validated_history is the latest validated history version of the SP, or None.
+
+    serviceproviders: list of ServiceProvider objects
+    lookups: related lookups prefetched for the history objects
+    """
+    history = ServiceProvider.objects.get_validated_history([sp.pk for sp in serviceproviders if not sp.validated])
+    if lookups and history:
+        prefetch_related_objects(list(history.values()), *lookups)
+    for sp in serviceproviders:
+        if not sp.validated:
+            sp.validated_history = history.get(sp.pk)
+
+
+def get_linked_objects_filter(serviceproviders, validated):
+    """
+    Returns filter for linked objects which may be included in metadata of any listed SP,
+    or None if metadata is not generated for any of them.
+    Exact filtering for each SP is done in get_linked_objects.
+
+    serviceproviders: list of ServiceProvider objects
+    validated: if false, using unvalidated metadata
+    """
+    if not validated:
+        return Q(end_at=None)
+    validation_dates = [get_entity(sp, validated)[2] for sp in serviceproviders]
+    validation_dates = [validation_date for validation_date in validation_dates if validation_date]
+    if not validation_dates:
+        return None
+    return (Q(end_at=None) | Q(end_at__gt=min(validation_dates))) & ~Q(validated=None)
+
+
+def get_linked_objects(sp, related_name, validation_date):
+    """
+    Returns objects linked to SP which are included in metadata.
+    Uses prefetched objects if available.
+
+    sp: ServiceProvider object
+    related_name: related name of the linked model, i.e. "certificates"
+    validation_date: if None, using unvalidated metadata
+    """
+    manager = getattr(sp, related_name)
+    if related_name in getattr(sp, "_prefetched_objects_cache", {}):
+        if validation_date:
+            return [
+                obj for obj in manager.all() if obj.validated and (obj.end_at is None or obj.end_at > validation_date)
+            ]
+        return [obj for obj in manager.all() if obj.end_at is None]
+    if validation_date:
+        return manager.filter(Q(end_at=None) | Q(end_at__gt=validation_date)).exclude(validated=None)
+    return manager.filter(end_at=None)
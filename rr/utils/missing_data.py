@@ -2,13 +2,37 @@
 Missing data checks
 """
 
+from django.db.models import Case, Exists, IntegerField, OuterRef, Q, Value, When
 from django.urls.base import reverse
 from django.utils.translation import gettext as _
+from django.utils.translation import gettext_noop
 
 from rr.models.certificate import Certificate
 from rr.models.contact import Contact
 from rr.models.endpoint import Endpoint
 from rr.models.redirecturi import RedirectUri
+from rr.models.serviceprovider import ServiceProvider
+
+MISSING_NAME = 1
+MISSING_DESCRIPTION = 2
+MISSING_APPLICATION_PORTFOLIO = 4
+MISSING_TECHNICAL_CONTACT = 8
+MISSING_PRIVACY_POLICY = 16
+MISSING_CERTIFICATE = 32
+MISSING_ACS_ENDPOINT = 64
+MISSING_REDIRECT_URI = 128
+
+# Missing data flags with messages and URL names for correcting the data, in display order
+MISSING_DATA_MESSAGES = [
+    (MISSING_NAME, gettext_noop("Service name in English or in Finnish"), "basicinformation-update"),
+    (MISSING_DESCRIPTION, gettext_noop("Service description in English or in Finnish"), "basicinformation-update"),
+    (MISSING_APPLICATION_PORTFOLIO, gettext_noop("Application portfolio URL"), "basicinformation-update"),
+    (MISSING_TECHNICAL_CONTACT, gettext_noop("Technical contact"), "contact-list"),
+    (MISSING_PRIVACY_POLICY, gettext_noop("Privacy policy URL in English or in Finnish"), "basicinformation-update"),
+    (MISSING_CERTIFICATE, gettext_noop("Certificate"), "certificate-list"),
+    (MISSING_ACS_ENDPOINT, gettext_noop("AssertionConsumerService endpoint"), "endpoint-list"),
+    (MISSING_REDIRECT_URI, gettext_noop("Redirect URI"), "redirecturi-list"),
+]
 
 
 def _format_missing_message(links, msg, url=None):
@@ -18,31 +42,77 @@ def _format_missing_message(links, msg, url=None):
         return msg
 
 
-def _get_missing_privacy_data(sp, missing, links):
-    if not sp.privacypolicy_org and not sp.privacypolicy_en and not sp.privacypolicy_fi and sp.attributes:
-        msg = _("Privacy policy URL in English or in Finnish")
-        url = reverse("basicinformation-update", args=[sp.pk])
-        missing.append(_format_missing_message(links, msg, url))
-    return missing
+def _missing_data_conditions():
+    """
+    Returns list of (flag, condition) tuples for service provider querysets.
+    """
+    active = {"sp": OuterRef("pk"), "end_at": None}
+    return [
+        (MISSING_NAME, Q(name_en="", name_fi="")),
+        (MISSING_DESCRIPTION, Q(description_en="", description_fi="")),
+        (MISSING_APPLICATION_PORTFOLIO, Q(application_portfolio="")),
+        (MISSING_TECHNICAL_CONTACT, ~Exists(Contact.objects.filter(type="technical", **active))),
+        (
+            MISSING_PRIVACY_POLICY,
+            Q(service_type__in=["saml", "oidc"], privacypolicy_org=False, privacypolicy_en="", privacypolicy_fi=""),
+        ),
+        (MISSING_CERTIFICATE, Q(~Exists(Certificate.objects.filter(**active)), service_type="saml")),
+        (
+            MISSING_ACS_ENDPOINT,
+            Q(~Exists(Endpoint.objects.filter(type="AssertionConsumerService", **active)), service_type="saml"),
+        ),
+        (MISSING_REDIRECT_URI, Q(~Exists(RedirectUri.objects.filter(**active)), service_type="oidc")),
+    ]
 
 
-def _get_missing_saml_data(sp, missing, links):
-    if not Certificate.objects.filter(sp=sp, end_at=None):
-        msg = _("Certificate")
-        url = reverse("certificate-list", args=[sp.pk])
-        missing.append(_format_missing_message(links, msg, url))
-    if not Endpoint.objects.filter(sp=sp, end_at=None, type="AssertionConsumerService"):
-        msg = _("AssertionConsumerService endpoint")
-        url = reverse("endpoint-list", args=[sp.pk])
-        missing.append(_format_missing_message(links, msg, url))
-    return missing
+def missing_sp_data_condition():
+    """
+    Returns condition for service providers missing any data listed by
+    get_missing_sp_data, for use in queryset filters and annotations.
+    """
+    condition = Q()
+    for flag, missing in _missing_data_conditions():
+        condition |= missing
+    return condition
+
+
+def annotate_missing_sp_data(queryset):
+    """
+    Annotates service provider queryset with missing_data_flags, a bitmask
+    of MISSING_* flags.
+    """
+    flags = Value(0, output_field=IntegerField())
+    for flag, missing in _missing_data_conditions():
+        flags += Case(When(missing, then=Value(flag)), default=Value(0), output_field=IntegerField())
+    return queryset.annotate(missing_data_flags=flags)
 
 
-def _get_missing_oidc_data(sp, missing, links):
-    if not RedirectUri.objects.filter(sp=sp, end_at=None):
-        msg = _("Redirect URI")
-        url = reverse("redirecturi-list", args=[sp.pk])
-        missing.append(_format_missing_message(links, msg, url))
+def get_missing_sp_data_flags(queryset):
+    """
+    Returns dictionary of missing data bitmasks by service provider pk,
+    loaded in a single query.
+
+    queryset: ServiceProvider queryset
+    """
+    return dict(annotate_missing_sp_data(queryset.order_by()).values_list("pk", "missing_data_flags"))
+
+
+def get_missing_sp_data_messages(sp, flags, links=True):
+    """
+    Returns list of missing data messages for a missing data bitmask.
+
+    sp: ServiceProvider object or pk, used in links
+    flags: bitmask of MISSING_* flags
+    links (boolean): include html links in list
+    """
+    pk = getattr(sp, "pk", sp)
+    missing = []
+    urls = {}
+    for flag, msg, url_name in MISSING_DATA_MESSAGES:
+        if flags & flag:
+            if links and url_name not in urls:
+                urls[url_name] = reverse(url_name, args=[pk])
+            missing.append(_format_missing_message(links, _(msg), urls.get(url_name)))
     return missing
 
 
@@ -53,27 +123,5 @@ def get_missing_sp_data(sp, links=True):
     sp: ServiceProvider object
     links (boolean): include html links in list
     """
-    missing = []
-    if not sp.name_en and not sp.name_fi:
-        msg = _("Service name in English or in Finnish")
-        url = reverse("basicinformation-update", args=[sp.pk])
-        missing.append(_format_missing_message(links, msg, url))
-    if not sp.description_en and not sp.description_fi:
-        msg = _("Service description in English or in Finnish")
-        url = reverse("basicinformation-update", args=[sp.pk])
-        missing.append(_format_missing_message(links, msg, url))
-    if not sp.application_portfolio:
-        msg = _("Application portfolio URL")
-        url = reverse("basicinformation-update", args=[sp.pk])
-        missing.append(_format_missing_message(links, msg, url))
-    if not Contact.objects.filter(sp=sp, end_at=None, type="technical"):
-        msg = _("Technical contact")
-        url = reverse("contact-list", args=[sp.pk])
-        missing.append(_format_missing_message(links, msg, url))
-    if sp.service_type == "saml":
-        missing = _get_missing_privacy_data(sp, missing, links)
-        missing = _get_missing_saml_data(sp, missing, links)
-    elif sp.service_type == "oidc":
-        missing = _get_missing_privacy_data(sp, missing, links)
-        missing = _get_missing_oidc_data(sp, missing, links)
-    return missing
+    flags = get_missing_sp_data_flags(ServiceProvider.objects.filter(pk=sp.pk)).get(sp.pk, 0)
+    return get_missing_sp_data_messages(sp, flags, links)
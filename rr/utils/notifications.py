@@ -6,7 +6,7 @@ import logging
 from smtplib import SMTPException
 
 from django.conf import settings
-from django.core.mail import mail_admins, send_mail
+from django.core.mail import mail_admins
 from django.core.mail.message import BadHeaderError
 from django.template.loader import render_to_string
 
@@ -81,8 +81,11 @@ def _render_validation_notification_message(sp):
 
 def validation_notification(sp):
     """
-    Sends validation message to SP admins.
+    Queues validation message to SP admins.
     """
+    # Imported here, as outbox models depend on the service provider model using this module
+    from rr.utils.outbox import queue_email
+
     admin_emails = []
     if hasattr(settings, "VALIDATION_NOTIFICATION_ADMINS") and settings.VALIDATION_NOTIFICATION_ADMINS:
         admins = sp.admins.all()
@@ -108,8 +111,6 @@ def validation_notification(sp):
         subject = render_to_string("email/validation_notification_subject.txt")
         message = _render_validation_notification_message(sp)
         try:
-            send_mail(subject, message, settings.SERVER_EMAIL, admin_emails, fail_silently=False)
-        except SMTPException:
-            logger.warning("SMTP error when sending validation notification.")
+            queue_email(subject, message, admin_emails)
         except BadHeaderError:
             logger.error("Validation notification email contained invalid headers.")
@@ -0,0 +1,100 @@
+"""
+Functions for checking that service host names are found in DNS
+"""
+
+import logging
+import socket
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from rr.models.servicehost import ServiceHost
+
+logger = logging.getLogger(__name__)
+
+# Lookup results
+RESOLVED = "resolved"
+NOT_FOUND = "not found"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+# Host index source checked for each service type
+SERVICE_HOST_SOURCES = {
+    "saml": ServiceHost.ENDPOINT,
+    "oidc": ServiceHost.REDIRECT_URI,
+    "ldap": ServiceHost.SERVER_NAME,
+}
+
+
+def get_service_hosts(services):
+    """
+    Returns host names of services from the host index, with a single query.
+
+    SAML services use endpoint locations, OIDC services redirect URIs and LDAP services server names.
+
+    services: list of ServiceProvider objects
+
+    return dictionary of sets of host names by SP pk
+    """
+    sources = {sp.pk: SERVICE_HOST_SOURCES.get(sp.service_type) for sp in services}
+    hosts = defaultdict(set)
+    for sp, host, source in ServiceHost.objects.filter(sp__in=sources).values_list("sp", "host", "source"):
+        if source == sources[sp]:
+            hosts[sp].add(host)
+    return hosts
+
+
+def _lookup(host, resolver, future):
+    """Runs a lookup and sets its result or exception to future"""
+    try:
+        future.set_result(resolver(host, None))
+    except BaseException as e:
+        future.set_exception(e)
+
+
+def resolve_host(host, timeout=5.0, resolver=None):
+    """
+    Looks up a host name.
+
+    Name resolution can not be interrupted, so the lookup is run in a daemon thread
+    which is abandoned if it does not return in timeout seconds. Temporary failures
+    are reported as timeouts as well.
+
+    host: host name
+    timeout: timeout in seconds
+    resolver: function with getaddrinfo interface, default socket.getaddrinfo
+
+    return RESOLVED, NOT_FOUND, TIMEOUT or ERROR
+    """
+    resolver = resolver or socket.getaddrinfo
+    future = Future()
+    threading.Thread(target=_lookup, args=(host, resolver, future), daemon=True).start()
+    try:
+        future.result(timeout=timeout)
+    except FutureTimeoutError:
+        return TIMEOUT
+    except socket.gaierror as e:
+        return TIMEOUT if e.errno == socket.EAI_AGAIN else NOT_FOUND
+    except (OSError, UnicodeError):
+        return ERROR
+    return RESOLVED
+
+
+def resolve_hosts(hosts, workers=10, timeout=5.0, resolver=None):
+    """
+    Looks up host names concurrently, each host only once.
+
+    hosts: iterable of host names
+    workers: number of concurrent lookups
+    timeout: timeout in seconds for a single lookup
+    resolver: function with getaddrinfo interface, default socket.getaddrinfo
+
+    return dictionary of lookup results by host name
+    """
+    hosts = sorted(set(hosts))
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        results = executor.map(lambda host: resolve_host(host, timeout, resolver), hosts)
+        statuses = dict(zip(hosts, results))
+    logger.debug("Resolved %s host names", len(statuses))
+    return statuses
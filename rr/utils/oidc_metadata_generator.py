@@ -9,7 +9,12 @@ from django.db.models import Q
 
 from rr.models.redirecturi import RedirectUri
 from rr.models.serviceprovider import ServiceProvider, SPAttribute
-from rr.utils.metadata_generator_common import get_entity
+from rr.utils.metadata_cache import (
+    get_cached_metadata,
+    metadata_cache_enabled,
+    metadata_cache_key,
+)
+from rr.utils.metadata_generator_common import get_entity, prefetch_validated_history
 
 logger = logging.getLogger(__name__)
 
@@ -180,10 +185,48 @@ def oidc_metadata_generator_list(
     return json object list
     """
     metadata = []
-    serviceproviders = ServiceProvider.objects.filter(end_at=None, service_type="oidc")
+    serviceproviders = [
+        sp
+        for sp in ServiceProvider.objects.filter(end_at=None, service_type="oidc")
+        if (production and sp.production) or (test and sp.test) or (include and sp.entity_id in include)
+    ]
+    # Decrypted client secrets are never cached
+    if metadata_cache_enabled() and client_secret_encryption != "decrypted":
+        return oidc_metadata_cached_list(serviceproviders, validated, privacypolicy, client_secret_encryption)
+    if validated:
+        prefetch_validated_history(serviceproviders)
     for sp in serviceproviders:
-        if (production and sp.production) or (test and sp.test) or (include and sp.entity_id in include):
-            sp_metadata = oidc_metadata_generator(sp, validated, privacypolicy, client_secret_encryption)
-            if sp_metadata:
-                metadata.append(sp_metadata)
+        sp_metadata = oidc_metadata_generator(sp, validated, privacypolicy, client_secret_encryption)
+        if sp_metadata:
+            metadata.append(sp_metadata)
     return metadata
+
+
+def oidc_metadata_cached_list(serviceproviders, validated, privacypolicy, client_secret_encryption):
+    """
+    Returns list of RP metadata for service providers, using cached metadata where available.
+
+    serviceproviders: list of ServiceProvider objects
+    validated: if false, using unvalidated metadata
+    privacypolicy: fill empty privacypolicy URLs with default value
+    client_secret_encryption: set to "encrypted" for encrypted client secrets,
+      otherwise the client secret is obfuscated.
+
+    return json object list
+    """
+
+    def render(missing):
+        if validated:
+            prefetch_validated_history(missing)
+        rendered = {}
+        for sp in missing:
+            sp_metadata = oidc_metadata_generator(sp, validated, privacypolicy, client_secret_encryption)
+            rendered[sp.pk] = json.dumps(sp_metadata) if sp_metadata else ""
+        return rendered
+
+    key = metadata_cache_key(
+        "oidc", validated=validated, privacypolicy=privacypolicy, client_secret_encryption=client_secret_encryption
+    )
+    return [
+        json.loads(metadata) for metadata in get_cached_metadata(serviceproviders, validated, key, render) if metadata
+    ]
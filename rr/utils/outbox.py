@@ -0,0 +1,189 @@
+"""
+Email outbox
+
+Messages are queued to the database and sent by the sendemails command in
+batches, using a single SMTP connection for each batch. Failed messages are
+retried with an exponential backoff.
+
+A batch is claimed in a short transaction, setting messages to sending status
+with a lease. Messages are sent outside the transaction and the status of each
+message is saved after sending it. If a worker stops while sending, messages
+are claimed again after the lease has expired.
+"""
+
+import logging
+from datetime import timedelta
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.message import BadHeaderError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from rr.models.email import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, message, recipients, from_email=None, created_by=None, invite=None):
+    """
+    Queues a message for each recipient.
+
+    subject: message subject
+    message: message body
+    recipients: list of email addresses
+    from_email: sender address, default SERVER_EMAIL
+    created_by: User who created the message
+    invite: Keystore object the message is sent for
+
+    return list of created OutgoingEmail objects
+    """
+    if "\n" in subject or "\r" in subject:
+        raise BadHeaderError("Header values can't contain newlines")
+    return OutgoingEmail.objects.bulk_create(
+        [
+            OutgoingEmail(
+                subject=subject,
+                body=message,
+                from_email=from_email or settings.SERVER_EMAIL,
+                recipient=recipient,
+                created_by=created_by,
+                invite=invite,
+            )
+            for recipient in sorted(set(recipients))
+            if recipient
+        ]
+    )
+
+
+def retry_delay(attempts):
+    """Returns delay before the next sending attempt, doubling after each failed attempt"""
+    base = settings.EMAIL_OUTBOX_RETRY_DELAY if hasattr(settings, "EMAIL_OUTBOX_RETRY_DELAY") else 60
+    return timedelta(seconds=base * 2 ** (attempts - 1))
+
+
+def max_attempts():
+    """Returns number of sending attempts before message is marked as failed"""
+    return settings.EMAIL_OUTBOX_MAX_ATTEMPTS if hasattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS") else 5
+
+
+def lease_time():
+    """Returns time a claimed message is reserved for the sending worker"""
+    seconds = settings.EMAIL_OUTBOX_LEASE_TIME if hasattr(settings, "EMAIL_OUTBOX_LEASE_TIME") else 600
+    return timedelta(seconds=seconds)
+
+
+def _sending_failed(email, error):
+    """Sets message to be retried later, or failed if there are no attempts left"""
+    email.error = str(error)
+    if email.attempts >= max_attempts():
+        email.status = OutgoingEmail.FAILED
+        logger.error("Could not send email {pk} to {email}".format(pk=email.pk, email=email.recipient))
+    else:
+        email.status = OutgoingEmail.QUEUED
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+        logger.warning("Could not send email {pk} to {email}, retrying".format(pk=email.pk, email=email.recipient))
+
+
+def _send_message(connection, email):
+    """
+    Sends a claimed message with an open connection and updates its status.
+
+    return True if message was sent
+    """
+    try:
+        sent = connection.send_messages(
+            [EmailMessage(email.subject, email.body, email.from_email, [email.recipient], connection=connection)]
+        )
+        if not sent:
+            raise SMTPException("Message was not sent")
+    except BadHeaderError as e:
+        email.status = OutgoingEmail.FAILED
+        email.error = str(e)
+        logger.error("Email {pk} to {email} contained invalid headers.".format(pk=email.pk, email=email.recipient))
+        return False
+    except (SMTPException, OSError) as e:
+        _sending_failed(email, e)
+        return False
+    email.status = OutgoingEmail.SENT
+    email.sent_at = timezone.now()
+    email.error = ""
+    logger.info("Sent email {pk} to {email}".format(pk=email.pk, email=email.recipient))
+    return True
+
+
+def _reconnect(connection):
+    """
+    Reopens connection after a sending error, as the server may have closed it.
+    If connecting fails, the next message is sent with a new connection.
+    """
+    connection.close()
+    try:
+        connection.open()
+    except (SMTPException, OSError):
+        pass
+
+
+def _claim_emails(batch_size):
+    """
+    Claims a batch of due messages, including messages with an expired lease,
+    in a short transaction. Each claim is counted as a sending attempt.
+
+    return list of claimed OutgoingEmail objects
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=OutgoingEmail.QUEUED) | Q(status=OutgoingEmail.SENDING), next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "pk")[:batch_size]
+        )
+        for email in emails:
+            email.status = OutgoingEmail.SENDING
+            email.attempts += 1
+            email.next_attempt_at = now + lease_time()
+        OutgoingEmail.objects.bulk_update(emails, ["status", "attempts", "next_attempt_at"])
+    return emails
+
+
+def _save_status(*emails):
+    """Saves sending status of messages"""
+    OutgoingEmail.objects.bulk_update(emails, ["status", "next_attempt_at", "error", "sent_at"])
+
+
+def send_queued_emails(batch_size=100):
+    """
+    Sends a batch of queued messages which are due, using a single connection.
+    Messages are claimed before sending, so multiple workers may run at the same time.
+
+    batch_size: maximum number of messages sent
+
+    return tuple of number of sent and unsent messages
+    """
+    sent = 0
+    failed = 0
+    emails = _claim_emails(batch_size)
+    if not emails:
+        return sent, failed
+    connection = get_connection()
+    try:
+        connection.open()
+    except (SMTPException, OSError) as e:
+        logger.warning("Could not connect to email server: {error}".format(error=e))
+        for email in emails:
+            _sending_failed(email, e)
+        _save_status(*emails)
+        return sent, len(emails)
+    try:
+        for email in emails:
+            if _send_message(connection, email):
+                sent += 1
+            else:
+                failed += 1
+                _reconnect(connection)
+            _save_status(email)
+    finally:
+        connection.close()
+    return sent, failed
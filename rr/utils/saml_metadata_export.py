@@ -0,0 +1,145 @@
+"""
+Functions for exporting SAML metadata of service providers to individual files
+"""
+
+import hashlib
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from itertools import chain
+
+import django
+from django.conf import settings
+from django.db import connections
+from lxml import etree
+
+from rr.models.serviceprovider import ServiceProvider
+from rr.utils.saml_metadata_generator import (
+    saml_metadata_generator,
+    saml_metadata_prefetch,
+    saml_metadata_serviceprovider_queryset,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def saml_metadata_file_name(entity_id):
+    """
+    Returns file name for individual metadata file of an entity.
+    """
+    return hashlib.sha1(entity_id.encode()).hexdigest() + ".xml"
+
+
+def write_file_atomic(path, content):
+    """
+    Writes content to a temporary file in the same directory and renames it,
+    so that the file is never seen partially written.
+    """
+    temp_path = "%s.%s.tmp" % (path, os.getpid())
+    try:
+        with open(temp_path, "w") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _write_saml_metadata_files(directory, pks, validated, privacypolicy, disable_entity_extensions):
+    """
+    Writes individual metadata files for a chunk of service providers. Service
+    providers and related objects are loaded by the process writing the files.
+
+    pks: list of ServiceProvider pks
+
+    return list of written file names
+    """
+    file_names = []
+    serviceproviders = list(ServiceProvider.objects.filter(pk__in=pks).select_related("organization"))
+    saml_metadata_prefetch(serviceproviders, validated)
+    for sp in serviceproviders:
+        metadata = saml_metadata_generator(sp, validated, privacypolicy, None, disable_entity_extensions)
+        if metadata is not None and metadata.get("entityID"):
+            file_name = saml_metadata_file_name(metadata.get("entityID"))
+            write_file_atomic(
+                os.path.join(directory, file_name),
+                '<?xml version="1.0" encoding="UTF-8"?>\n' + etree.tostring(metadata, pretty_print=True, encoding=str),
+            )
+            file_names.append(file_name)
+    return file_names
+
+
+def remove_stale_saml_metadata_files(directory, file_names):
+    """
+    Removes individual metadata files which are not listed in file_names.
+    Only files named like individual metadata files are removed.
+
+    return list of removed file names
+    """
+    removed = []
+    for path in glob(os.path.join(directory, "*.xml")):
+        file_name = os.path.basename(path)
+        if re.fullmatch(r"[0-9a-f]{40}\.xml", file_name) and file_name not in file_names:
+            os.remove(path)
+            removed.append(file_name)
+    return removed
+
+
+def saml_metadata_export_files(
+    directory,
+    validated=True,
+    privacypolicy=False,
+    production=False,
+    test=False,
+    include=None,
+    workers=1,
+    chunk_size=100,
+    remove_stale=False,
+):
+    """
+    Exports metadata of service providers to individual files, named by
+    SHA-1 hash of the entityID. Service providers are loaded, rendered and
+    written in chunks, by a pool of worker processes if workers is over 1.
+    Worker processes are forked, so they should only be used in management
+    commands, not while serving requests.
+
+    directory: metadata directory
+    validated: if false, using unvalidated metadata
+    privacypolicy: replace privacy policy if missing
+    production: include production SPs
+    test: include test SPs
+    include: include listed SPs
+    workers: number of worker processes
+    chunk_size: number of service providers given to a worker at once
+    remove_stale: remove other individual metadata files from the directory
+
+    return tuple (list of written file names, list of removed file names)
+    """
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(directory)
+    pks = list(saml_metadata_serviceprovider_queryset(production, test, include).values_list("pk", flat=True))
+    if hasattr(settings, "DISABLE_METADATA_ENTITY_EXTENSIONS") and settings.DISABLE_METADATA_ENTITY_EXTENSIONS:
+        disable_entity_extensions = True
+    else:
+        disable_entity_extensions = False
+    chunks = [pks[n : n + chunk_size] for n in range(0, len(pks), chunk_size)]
+    args = (
+        [directory] * len(chunks),
+        chunks,
+        [validated] * len(chunks),
+        [privacypolicy] * len(chunks),
+        [disable_entity_extensions] * len(chunks),
+    )
+    if workers > 1 and len(chunks) > 1:
+        # Forked workers must not share database connections with this process
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+            file_names = list(chain.from_iterable(executor.map(_write_saml_metadata_files, *args)))
+    else:
+        file_names = list(chain.from_iterable(map(_write_saml_metadata_files, *args)))
+    removed = remove_stale_saml_metadata_files(directory, set(file_names)) if remove_stale else []
+    logger.debug("Exported %s metadata files, removed %s files", len(file_names), len(removed))
+    return file_names, removed
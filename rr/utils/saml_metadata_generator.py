@@ -5,17 +5,45 @@ Functions for genereating metadata of service providers
 import logging
 
 from django.conf import settings
-from django.db.models import Q
+from django.db.models import Prefetch, Q, prefetch_related_objects
 from lxml import etree
 
 from rr.models.certificate import Certificate
 from rr.models.contact import Contact
 from rr.models.endpoint import Endpoint
 from rr.models.serviceprovider import ServiceProvider, SPAttribute
-from rr.utils.metadata_generator_common import get_entity
+from rr.utils.metadata_cache import (
+    get_cached_metadata,
+    metadata_cache_enabled,
+    metadata_cache_key,
+)
+from rr.utils.metadata_generator_common import (
+    get_entity,
+    get_linked_objects,
+    get_linked_objects_filter,
+    prefetch_validated_history,
+)
 
 logger = logging.getLogger(__name__)
 
+SAML_METADATA_NAMESPACE = "urn:oasis:names:tc:SAML:2.0:metadata"
+SAML_METADATA_NSMAP = {
+    "ds": "http://www.w3.org/2000/09/xmldsig#",
+    "mdattr": "urn:oasis:names:tc:SAML:metadata:attribute",
+    "mdui": "urn:oasis:names:tc:SAML:metadata:ui",
+    "saml": "urn:oasis:names:tc:SAML:2.0:assertion",
+    None: SAML_METADATA_NAMESPACE,
+    "xsd": "http://www.w3.org/2001/XMLSchema",
+    "xsi": "http://www.w3.org/2001/XMLSchema-instance",
+}
+
+
+def md_tag(tag):
+    """
+    Returns tag name in the metadata namespace.
+    """
+    return "{%s}%s" % (SAML_METADATA_NAMESPACE, tag)
+
 
 def metadata_spssodescriptor_extensions(element, sp, privacypolicy):
     """
@@ -26,7 +54,7 @@ def metadata_spssodescriptor_extensions(element, sp, privacypolicy):
     privacypolicy: fill empty privacypolicy URLs with default value
     """
 
-    extensions = etree.SubElement(element, "Extensions")
+    extensions = etree.SubElement(element, md_tag("Extensions"))
     if sp.discovery_service_url:
         etree.SubElement(
             extensions,
@@ -81,7 +109,7 @@ def metadata_entity_extensions(element, sp):
     sp: ServiceProvider object
     """
 
-    extensions = etree.SubElement(element, "Extensions")
+    extensions = etree.SubElement(element, md_tag("Extensions"))
     entity_attributes = etree.SubElement(extensions, "{urn:oasis:names:tc:SAML:metadata:attribute}EntityAttributes")
     if not sp.sign_responses:
         attribute = etree.SubElement(
@@ -169,16 +197,9 @@ def metadata_certificates(element, sp, validation_date):
     sp: ServiceProvider object
     validation_date: if None, using unvalidated metadata
     """
-    if validation_date:
-        certificates = (
-            Certificate.objects.filter(sp=sp)
-            .filter(Q(end_at=None) | Q(end_at__gt=validation_date))
-            .exclude(validated=None)
-        )
-    else:
-        certificates = Certificate.objects.filter(sp=sp, end_at=None)
+    certificates = get_linked_objects(sp, "certificates", validation_date)
     for certificate in certificates:
-        key_descriptor = etree.SubElement(element, "KeyDescriptor")
+        key_descriptor = etree.SubElement(element, md_tag("KeyDescriptor"))
         if certificate.signing and not certificate.encryption:
             key_descriptor.attrib["use"] = "signing"
         if certificate.encryption and not certificate.signing:
@@ -202,7 +223,7 @@ def metadata_nameidformat(element, sp):
     nameidformats = sp.nameidformat.all()
 
     for nameid in nameidformats:
-        name_id_format = etree.SubElement(element, "NameIDFormat")
+        name_id_format = etree.SubElement(element, md_tag("NameIDFormat"))
         name_id_format.text = nameid.nameidformat
 
 
@@ -218,16 +239,11 @@ def metadata_endpoints(element, sp, validation_date):
     saml2_support = False
     saml1_support = False
     indexed_endpoints = settings.INDEXED_ENDPOINT_TYPES
-    if validation_date:
-        endpoints = (
-            Endpoint.objects.filter(sp=sp)
-            .filter(Q(end_at=None) | Q(end_at__gt=validation_date))
-            .exclude(validated=None)
-        )
-    else:
-        endpoints = Endpoint.objects.filter(sp=sp, end_at=None)
+    endpoints = get_linked_objects(sp, "endpoints", validation_date)
     for endpoint in endpoints:
-        subelement = etree.SubElement(element, endpoint.type, Binding=endpoint.binding, Location=endpoint.location)
+        subelement = etree.SubElement(
+            element, md_tag(endpoint.type), Binding=endpoint.binding, Location=endpoint.location
+        )
         if endpoint.response_location:
             subelement.set("ResponseLocation", endpoint.response_location)
         if endpoint.type in indexed_endpoints:
@@ -259,13 +275,13 @@ def metadata_attributeconsumingservice_meta(element, sp):
     """
     for lang in ["fi", "en", "sv"]:
         if sp.name(lang):
-            display_name = etree.SubElement(element, "ServiceName")
+            display_name = etree.SubElement(element, md_tag("ServiceName"))
             display_name.attrib["{http://www.w3.org/XML/1998/namespace}lang"] = lang
             display_name.text = sp.name(lang)
 
     for lang in ["fi", "en", "sv"]:
         if sp.description(lang):
-            description = etree.SubElement(element, "ServiceDescription")
+            description = etree.SubElement(element, md_tag("ServiceDescription"))
             description.attrib["{http://www.w3.org/XML/1998/namespace}lang"] = lang
             description.text = sp.description(lang)
 
@@ -279,23 +295,16 @@ def metadata_attributeconsumingservice(element, sp, history, validation_date):
     history: ServiceProvider object if using validated data and most recent is not validated
     validation_date: if None, using unvalidated metadata
     """
-    attribute_consuming_service = etree.SubElement(element, "AttributeConsumingService", index="1")
+    attribute_consuming_service = etree.SubElement(element, md_tag("AttributeConsumingService"), index="1")
     if history:
         metadata_attributeconsumingservice_meta(attribute_consuming_service, history)
     else:
         metadata_attributeconsumingservice_meta(attribute_consuming_service, sp)
-    if validation_date:
-        attributes = (
-            SPAttribute.objects.filter(sp=sp)
-            .filter(Q(end_at=None) | Q(end_at__gt=validation_date))
-            .exclude(validated=None)
-        )
-    else:
-        attributes = SPAttribute.objects.filter(sp=sp, end_at=None)
+    attributes = get_linked_objects(sp, "spattributes", validation_date)
     for attribute in attributes:
         etree.SubElement(
             attribute_consuming_service,
-            "RequestedAttribute",
+            md_tag("RequestedAttribute"),
             FriendlyName=attribute.attribute.friendlyname,
             Name=attribute.attribute.name,
             NameFormat=attribute.attribute.nameformat,
@@ -313,21 +322,14 @@ def metadata_contact(element, sp, validation_date):
     validation_date: if None, using unvalidated metadata
     """
 
-    if validation_date:
-        contacts = (
-            Contact.objects.filter(sp=sp)
-            .filter(Q(end_at=None) | Q(end_at__gt=validation_date))
-            .exclude(validated=None)
-        )
-    else:
-        contacts = Contact.objects.filter(sp=sp, end_at=None)
+    contacts = get_linked_objects(sp, "contacts", validation_date)
     for contact in contacts:
-        contact_person = etree.SubElement(element, "ContactPerson", contactType=contact.type)
-        given_name = etree.SubElement(contact_person, "GivenName")
+        contact_person = etree.SubElement(element, md_tag("ContactPerson"), contactType=contact.type)
+        given_name = etree.SubElement(contact_person, md_tag("GivenName"))
         given_name.text = contact.firstname
-        sur_name = etree.SubElement(contact_person, "SurName")
+        sur_name = etree.SubElement(contact_person, md_tag("SurName"))
         sur_name.text = contact.lastname
-        email_address = etree.SubElement(contact_person, "EmailAddress")
+        email_address = etree.SubElement(contact_person, md_tag("EmailAddress"))
         email_address.text = contact.email
 
 
@@ -341,23 +343,23 @@ def metadata_organization(element, sp):
 
     if sp.organization:
         organization = sp.organization
-        organization_element = etree.SubElement(element, "Organization")
+        organization_element = etree.SubElement(element, md_tag("Organization"))
 
         for lang in ["fi", "en", "sv"]:
             if organization.name(lang):
-                display_name = etree.SubElement(organization_element, "OrganizationName")
+                display_name = etree.SubElement(organization_element, md_tag("OrganizationName"))
                 display_name.attrib["{http://www.w3.org/XML/1998/namespace}lang"] = lang
                 display_name.text = organization.name(lang)
 
         for lang in ["fi", "en", "sv"]:
             if organization.description(lang):
-                description = etree.SubElement(organization_element, "OrganizationDisplayName")
+                description = etree.SubElement(organization_element, md_tag("OrganizationDisplayName"))
                 description.attrib["{http://www.w3.org/XML/1998/namespace}lang"] = lang
                 description.text = organization.description(lang)
 
         for lang in ["fi", "en", "sv"]:
             if organization.url(lang):
-                organization_url = etree.SubElement(organization_element, "OrganizationURL")
+                organization_url = etree.SubElement(organization_element, md_tag("OrganizationURL"))
                 organization_url.attrib["{http://www.w3.org/XML/1998/namespace}lang"] = lang
                 organization_url.text = organization.url(lang)
 
@@ -373,7 +375,7 @@ def metadata_spssodescriptor(element, sp, history, validation_date, privacypolic
     privacypolicy: fill empty privacypolicy URLs with default value
     """
 
-    sp_sso_descriptor = etree.SubElement(element, "SPSSODescriptor")
+    sp_sso_descriptor = etree.SubElement(element, md_tag("SPSSODescriptor"))
     if history:
         if history.sign_assertions:
             sp_sso_descriptor.set("WantAssertionsSigned", "true")
@@ -423,20 +425,10 @@ def saml_metadata_generator(sp, validated=True, privacypolicy=False, tree=None,
     if not entity:
         return tree
     if tree is not None:
-        entity_descriptor = etree.SubElement(tree, "EntityDescriptor", entityID=entity.entity_id)
+        entity_descriptor = etree.SubElement(tree, md_tag("EntityDescriptor"), entityID=entity.entity_id)
     else:
         entity_descriptor = etree.Element(
-            "EntityDescriptor",
-            entityID=entity.entity_id,
-            nsmap={
-                "ds": "http://www.w3.org/2000/09/xmldsig#",
-                "mdattr": "urn:oasis:names:tc:SAML:metadata:attribute",
-                "mdui": "urn:oasis:names:tc:SAML:metadata:ui",
-                "saml": "urn:oasis:names:tc:SAML:2.0:assertion",
-                "xmlns": "urn:oasis:names:tc:SAML:2.0:metadata",
-                "xsd": "http://www.w3.org/2001/XMLSchema",
-                "xsi": "http://www.w3.org/2001/XMLSchema-instance",
-            },
+            md_tag("EntityDescriptor"), entityID=entity.entity_id, nsmap=SAML_METADATA_NSMAP
         )
     if not disable_entity_extensions:
         if history:
@@ -455,6 +447,108 @@ def saml_metadata_generator(sp, validated=True, privacypolicy=False, tree=None,
         return entity_descriptor
 
 
+def saml_metadata_serviceprovider_queryset(production=False, test=False, include=None):
+    """
+    Returns queryset of SAML service providers included in metadata.
+
+    production: include production SPs
+    test: include test SPs
+    include: include listed SPs
+    """
+    selection = Q()
+    if production:
+        selection |= Q(production=True)
+    if test:
+        selection |= Q(test=True)
+    if include:
+        selection |= Q(entity_id__in=include)
+    if not selection:
+        return ServiceProvider.objects.none()
+    return ServiceProvider.objects.filter(selection, end_at=None, service_type="saml").select_related("organization")
+
+
+def saml_metadata_serviceproviders(production=False, test=False, include=None):
+    """
+    Returns list of SAML service providers included in metadata.
+
+    production: include production SPs
+    test: include test SPs
+    include: include listed SPs
+
+    return list of ServiceProvider objects
+    """
+    return list(saml_metadata_serviceprovider_queryset(production, test, include))
+
+
+def saml_metadata_serviceprovider_chunks(production=False, test=False, include=None, chunk_size=100):
+    """
+    Yields lists of SAML service providers included in metadata. Only pks are
+    loaded up front, each chunk is queried when it is needed.
+
+    production: include production SPs
+    test: include test SPs
+    include: include listed SPs
+    chunk_size: number of service providers in a chunk
+    """
+    queryset = saml_metadata_serviceprovider_queryset(production, test, include)
+    pks = list(queryset.values_list("pk", flat=True))
+    for n in range(0, len(pks), chunk_size):
+        yield list(queryset.filter(pk__in=pks[n : n + chunk_size]))
+
+
+def saml_metadata_prefetch(serviceproviders, validated=True):
+    """
+    Loads all objects used in metadata generation for a list of service providers
+    in a fixed number of queries.
+
+    serviceproviders: list of ServiceProvider objects
+    validated: if false, using unvalidated metadata
+    """
+    prefetch_related_objects(serviceproviders, "nameidformat")
+    if validated:
+        prefetch_validated_history(serviceproviders, "nameidformat")
+    linked_filter = get_linked_objects_filter(serviceproviders, validated)
+    if linked_filter is not None:
+        prefetch_related_objects(
+            serviceproviders,
+            Prefetch("certificates", queryset=Certificate.objects.filter(linked_filter)),
+            Prefetch("endpoints", queryset=Endpoint.objects.filter(linked_filter)),
+            Prefetch("spattributes", queryset=SPAttribute.objects.filter(linked_filter).select_related("attribute")),
+            Prefetch("contacts", queryset=Contact.objects.filter(linked_filter)),
+        )
+
+
+def saml_metadata_cached_list(serviceproviders, validated, privacypolicy, disable_entity_extensions):
+    """
+    Returns list of EntityDescriptor elements for service providers, using cached metadata
+    where available.
+
+    serviceproviders: list of ServiceProvider objects
+    validated: if false, using unvalidated metadata
+    privacypolicy: fill empty privacypolicy URLs with default value
+    disable_entity_extensions: do not include entity extensions
+    """
+
+    def render(missing):
+        saml_metadata_prefetch(missing, validated)
+        rendered = {}
+        for sp in missing:
+            metadata = saml_metadata_generator(sp, validated, privacypolicy, None, disable_entity_extensions)
+            if metadata is not None:
+                rendered[sp.pk] = etree.tostring(metadata, encoding=str)
+            else:
+                rendered[sp.pk] = ""
+        return rendered
+
+    key = metadata_cache_key("saml", validated=validated, privacypolicy=privacypolicy)
+    parser = etree.XMLParser(remove_blank_text=True)
+    return [
+        etree.fromstring(metadata, parser)
+        for metadata in get_cached_metadata(serviceproviders, validated, key, render)
+        if metadata
+    ]
+
+
 def saml_metadata_generator_list(
     validated=True, privacypolicy=False, production=False, test=False, include=None, as_list=False
 ):
@@ -466,38 +560,78 @@ def saml_metadata_generator_list(
     production: include production SPs
     test: include test SPs
     include: include listed SPs
-    as_list: return metadata as list of individual metadata instead etree object
+    as_list: return metadata as list of individual metadata instead etree object.
 
     return tree
     """
-    tree = etree.Element(
-        "EntitiesDescriptor",
-        Name="urn:mace:funet.fi:helsinki.fi",
-        nsmap={
-            "ds": "http://www.w3.org/2000/09/xmldsig#",
-            "mdattr": "urn:oasis:names:tc:SAML:metadata:attribute",
-            "mdui": "urn:oasis:names:tc:SAML:metadata:ui",
-            "saml": "urn:oasis:names:tc:SAML:2.0:assertion",
-            "xmlns": "urn:oasis:names:tc:SAML:2.0:metadata",
-            "xsd": "http://www.w3.org/2001/XMLSchema",
-            "xsi": "http://www.w3.org/2001/XMLSchema-instance",
-        },
-    )
     metadata_list = []
-    serviceproviders = ServiceProvider.objects.filter(end_at=None, service_type="saml")
+    serviceproviders = saml_metadata_serviceproviders(production, test, include)
     if hasattr(settings, "DISABLE_METADATA_ENTITY_EXTENSIONS") and settings.DISABLE_METADATA_ENTITY_EXTENSIONS:
         disable_entity_extensions = True
     else:
         disable_entity_extensions = False
-    for sp in serviceproviders:
-        if (production and sp.production) or (test and sp.test) or (include and sp.entity_id in include):
-            if as_list:
-                metadata_list.append(
-                    saml_metadata_generator(sp, validated, privacypolicy, None, disable_entity_extensions)
-                )
-            else:
-                saml_metadata_generator(sp, validated, privacypolicy, tree, disable_entity_extensions)
+    if metadata_cache_enabled():
+        metadata_list = saml_metadata_cached_list(
+            serviceproviders, validated, privacypolicy, disable_entity_extensions
+        )
+    else:
+        saml_metadata_prefetch(serviceproviders, validated)
+        for sp in serviceproviders:
+            metadata = saml_metadata_generator(sp, validated, privacypolicy, None, disable_entity_extensions)
+            if metadata is not None:
+                metadata_list.append(metadata)
     if as_list:
         return metadata_list
+    tree = etree.Element(md_tag("EntitiesDescriptor"), Name="urn:mace:funet.fi:helsinki.fi", nsmap=SAML_METADATA_NSMAP)
+    tree.extend(metadata_list)
+    return tree
+
+
+def saml_metadata_generator_stream(
+    output, validated=True, privacypolicy=False, production=False, test=False, include=None, chunk_size=100
+):
+    """
+    Generates metadata for list of serviceproviders and writes it to output
+    one EntityDescriptor at a time, using metadata namespace as default namespace.
+    Service providers and objects used in metadata generation are loaded in
+    chunks of chunk_size service providers, one chunk at a time.
+
+    output: binary file object
+    validated: if false, using unvalidated metadata
+    privacypolicy: replace privacy policy if missing
+    production: include production SPs
+    test: include test SPs
+    include: include listed SPs
+    chunk_size: number of service providers loaded at once
+    """
+    if hasattr(settings, "DISABLE_METADATA_ENTITY_EXTENSIONS") and settings.DISABLE_METADATA_ENTITY_EXTENSIONS:
+        disable_entity_extensions = True
     else:
-        return tree
+        disable_entity_extensions = False
+    entities = False
+    output.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+    with etree.xmlfile(output, encoding="UTF-8") as xf:
+        with xf.element(md_tag("EntitiesDescriptor"), Name="urn:mace:funet.fi:helsinki.fi", nsmap=SAML_METADATA_NSMAP):
+            for chunk in saml_metadata_serviceprovider_chunks(production, test, include, chunk_size):
+                if metadata_cache_enabled():
+                    entity_descriptors = saml_metadata_cached_list(
+                        chunk, validated, privacypolicy, disable_entity_extensions
+                    )
+                else:
+                    saml_metadata_prefetch(chunk, validated)
+                    entity_descriptors = (
+                        saml_metadata_generator(sp, validated, privacypolicy, None, disable_entity_extensions)
+                        for sp in chunk
+                    )
+                for entity_descriptor in entity_descriptors:
+                    if entity_descriptor is None:
+                        continue
+                    etree.indent(entity_descriptor, level=1)
+                    xf.write("\n  ")
+                    xf.write(entity_descriptor)
+                    entities = True
+                # Drop loaded objects and prefetch caches of the chunk before loading the next one
+                del chunk, entity_descriptors
+            if entities:
+                xf.write("\n")
+    output.write(b"\n")
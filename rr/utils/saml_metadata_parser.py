@@ -2,11 +2,14 @@
 Functions for genereating metadata of service providers
 """
 
+import gzip
+import hashlib
 import logging
+from functools import cached_property
 
 from cryptography.hazmat.primitives.serialization import Encoding
 from django.conf import settings
-from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.utils import timezone
 from django.utils.translation import gettext as _
 from lxml import etree
@@ -15,12 +18,176 @@ from rr.models.attribute import Attribute
 from rr.models.certificate import Certificate, load_certificate
 from rr.models.contact import Contact
 from rr.models.endpoint import Endpoint
+from rr.models.metadataimport import MetadataImportHash
 from rr.models.nameidformat import NameIDFormat
+from rr.models.servicehost import ServiceHost
 from rr.models.serviceprovider import ServiceProvider, SPAttribute
+from rr.utils.hosts import schedule_service_hosts_update
 
 logger = logging.getLogger(__name__)
 
 
+class MetadataImportCache:
+    """
+    Attribute and NameIDFormat catalogs, loaded once per import run.
+    Current entity ids and stored metadata hashes are loaded when first used.
+    """
+
+    def __init__(self):
+        self.attributes_by_name = {}
+        self.attributes_by_friendlyname = {}
+        for attribute in Attribute.objects.order_by("pk"):
+            self.attributes_by_name.setdefault(attribute.name, attribute)
+            self.attributes_by_friendlyname.setdefault(attribute.friendlyname, attribute)
+        self.nameidformats = {}
+        for nameidformat in NameIDFormat.objects.order_by("pk"):
+            self.nameidformats.setdefault(nameidformat.nameidformat, nameidformat)
+
+    @cached_property
+    def entity_ids(self):
+        """Set of entity ids of current service providers"""
+        return set(ServiceProvider.objects.filter(end_at=None).values_list("entity_id", flat=True))
+
+    @cached_property
+    def hashes(self):
+        """Dictionary of metadata hashes of previously imported entities by entity id"""
+        return dict(MetadataImportHash.objects.values_list("entity_id", "content_hash"))
+
+    def get_attribute(self, name, friendly_name):
+        """Returns attribute by name, or by friendly name if name is not found"""
+        return self.attributes_by_name.get(name) or self.attributes_by_friendlyname.get(friendly_name)
+
+
+class MetadataImportBatch:
+    """
+    Collects objects added to a service provider while parsing an entity,
+    checking for existing objects without per element queries.
+    Objects are written with bulk inserts by save().
+    """
+
+    def __init__(self, sp, cache, validate, created=False):
+        """
+        sp: ServiceProvider object where information is linked
+        cache: MetadataImportCache
+        validate: automatically validate added metadata
+        created: service provider was just created and has no linked objects
+        """
+        self.sp = sp
+        self.cache = cache
+        self.validated = timezone.now() if validate else None
+        self.certificates = []
+        self.endpoints = []
+        self.contacts = []
+        self.attributes = []
+        self.nameidformats = []
+        self.existing_certificates = set()
+        self.existing_endpoints = set()
+        self.existing_contacts = set()
+        self.existing_attributes = set()
+        if not created:
+            self.existing_certificates = set(
+                Certificate.objects.filter(sp=sp).values_list("certificate", "signing", "encryption")
+            )
+            for servicetype, binding, location, index, is_default in Endpoint.objects.filter(
+                sp=sp, end_at=None
+            ).values_list("type", "binding", "location", "index", "is_default"):
+                self._add_existing_endpoint(servicetype, binding, location, index, is_default)
+            self.existing_contacts = set(
+                Contact.objects.filter(sp=sp).values_list("type", "firstname", "lastname", "email")
+            )
+            self.existing_attributes = set(
+                SPAttribute.objects.filter(sp=sp).order_by().values_list("attribute", flat=True)
+            )
+
+    def _add_existing_endpoint(self, servicetype, binding, location, index, is_default):
+        self.existing_endpoints.add(("location", servicetype, binding, location))
+        if index:
+            self.existing_endpoints.add(("index", servicetype, binding, index))
+        if is_default:
+            self.existing_endpoints.add(("default", servicetype, binding))
+
+    def add_certificate(self, certificate, signing, encryption):
+        """Adds a certificate unless it exists, returns False if certificate could not be added"""
+        if (certificate, signing, encryption) in self.existing_certificates:
+            return True
+        obj = Certificate.objects.build_certificate(
+            certificate=certificate, sp=self.sp, signing=signing, encryption=encryption
+        )
+        if not obj:
+            return False
+        obj.validated = self.validated
+        self.existing_certificates.add((certificate, signing, encryption))
+        self.certificates.append(obj)
+        return True
+
+    def add_endpoint(self, servicetype, binding, location, response_location, index, is_default):
+        """Adds an endpoint unless an endpoint with same location, index or default exists"""
+        if (
+            ("location", servicetype, binding, location) in self.existing_endpoints
+            or (index and ("index", servicetype, binding, index) in self.existing_endpoints)
+            or (is_default and ("default", servicetype, binding) in self.existing_endpoints)
+        ):
+            return
+        self._add_existing_endpoint(servicetype, binding, location, index, is_default)
+        self.endpoints.append(
+            Endpoint(
+                sp=self.sp,
+                type=servicetype,
+                binding=binding,
+                location=location,
+                response_location=response_location,
+                index=index,
+                is_default=is_default,
+                validated=self.validated,
+            )
+        )
+
+    def add_contact(self, contact_type, first_name, last_name, email):
+        """Adds a contact unless it exists"""
+        if (contact_type, first_name, last_name, email) in self.existing_contacts:
+            return
+        self.existing_contacts.add((contact_type, first_name, last_name, email))
+        self.contacts.append(
+            Contact(
+                sp=self.sp,
+                type=contact_type,
+                firstname=first_name,
+                lastname=last_name,
+                email=email,
+                validated=self.validated,
+            )
+        )
+
+    def add_attribute(self, attribute):
+        """Adds a requested attribute unless it exists"""
+        if attribute.pk in self.existing_attributes:
+            return
+        self.existing_attributes.add(attribute.pk)
+        self.attributes.append(
+            SPAttribute(
+                sp=self.sp,
+                attribute=attribute,
+                reason="initial dump, please give the real reason",
+                validated=self.validated,
+            )
+        )
+
+    def add_nameidformat(self, nameidformat):
+        """Adds a nameid-format"""
+        self.nameidformats.append(nameidformat)
+
+    def save(self):
+        """Writes collected objects to the database"""
+        Certificate.objects.bulk_create(self.certificates)
+        Endpoint.objects.bulk_create(self.endpoints)
+        if self.endpoints:
+            schedule_service_hosts_update(self.sp.pk, ServiceHost.ENDPOINT)
+        Contact.objects.bulk_create(self.contacts)
+        SPAttribute.objects.bulk_create(self.attributes)
+        if self.nameidformats:
+            self.sp.nameidformat.add(*self.nameidformats)
+
+
 def metadata_parser_uiinfo(sp, element):
     """
     Parses SP metadata extensions UIinfo
@@ -135,13 +302,13 @@ def metadata_parser_extensions(sp, element):
             metadata_parser_entityattributes(sp, child)
 
 
-def metadata_parser_keydescriptor(sp, element, validate, errors):
+def metadata_parser_keydescriptor(sp, element, batch, errors):
     """
     Parses SP certificates
 
     sp: ServiceProvider object where information is linked
     element: lxml element which is parsed
-    validate: automatically validate added metadata
+    batch: MetadataImportBatch for added objects
     errors: list of errors
     """
     signing = False
@@ -162,36 +329,33 @@ def metadata_parser_keydescriptor(sp, element, validate, errors):
             .replace("-----BEGIN CERTIFICATE-----\n", "")
             .replace("-----END CERTIFICATE-----\n", "")
         )
-        if not Certificate.objects.filter(
-            certificate=certificate, sp=sp, signing=signing, encryption=encryption
-        ) and not Certificate.objects.add_certificate(
-            certificate=certificate, sp=sp, signing=signing, encryption=encryption, validate=validate
-        ):
+        if not batch.add_certificate(certificate, signing, encryption):
             errors.append(sp.entity_id + " : " + _("Could not add certificate"))
 
 
-def metadata_parser_nameidformat(sp, element, errors):
+def metadata_parser_nameidformat(sp, element, batch, errors):
     """
     Parses SP nameidformat
 
     sp: ServiceProvider object where information is saved
     element: lxml element which is parsed
+    batch: MetadataImportBatch for added objects
     errors: list of errors
     """
-    try:
-        nameid = NameIDFormat.objects.get(nameidformat=element.text)
-        sp.nameidformat.add(nameid)
-    except NameIDFormat.DoesNotExist:
+    nameid = batch.cache.nameidformats.get(element.text)
+    if nameid:
+        batch.add_nameidformat(nameid)
+    else:
         errors.append(sp.entity_id + " : " + _("Unsupported nameid-format") + " : " + str(element.text))
 
 
-def metadata_parser_servicetype(sp, element, validate, errors, servicetype, disable_checks):
+def metadata_parser_servicetype(sp, element, batch, errors, servicetype, disable_checks):
     """
     Parses SP endpoint bindings for a certain servicetype
 
     sp: ServiceProvider object where information is linked
     element: lxml element which is parsed
-    validate: automatically validate added metadata
+    batch: MetadataImportBatch for added objects
     errors: list of errors
     servicetype: parsed servicetype
     disalbe_checks: disable checks for endpoint bindingchoices, creating a new if nesessary
@@ -214,51 +378,7 @@ def metadata_parser_servicetype(sp, element, validate, errors, servicetype, disa
             + binding
         )
     else:
-        if (
-            (
-                Endpoint.objects.filter(
-                    sp=sp, type=servicetype, binding=binding, location=location, end_at=None
-                ).exists()
-            )
-            or (
-                index
-                and Endpoint.objects.filter(
-                    sp=sp, type=servicetype, binding=binding, index=index, end_at=None
-                ).exists()
-            )
-            or (
-                is_default
-                and Endpoint.objects.filter(
-                    sp=sp, type=servicetype, binding=binding, is_default=True, end_at=None
-                ).exists()
-            )
-        ):
-            return
-        try:
-            if validate:
-                Endpoint.objects.create(
-                    sp=sp,
-                    type=servicetype,
-                    binding=binding,
-                    location=location,
-                    response_location=response_location,
-                    index=index,
-                    is_default=is_default,
-                    validated=timezone.now(),
-                )
-            else:
-                Endpoint.objects.create(
-                    sp=sp,
-                    type=servicetype,
-                    binding=binding,
-                    location=location,
-                    response_location=response_location,
-                    index=index,
-                    is_default=is_default,
-                    validated=None,
-                )
-        except ValidationError:
-            errors.append(sp.entity_id + " : " + _("Could not add") + " : " + servicetype)
+        batch.add_endpoint(servicetype, binding, location, response_location, index, is_default)
 
 
 def _parse_index(element):
@@ -271,18 +391,18 @@ def _parse_index(element):
         return None
 
 
-def metadata_parser_attributeconsumingservice(sp, element, validate, errors):
+def metadata_parser_attributeconsumingservice(sp, element, batch, errors):
     """
     Parses SP attribute consuming service
 
     sp: ServiceProvider object where information is saved or linked
     element: lxml element which is parsed
-    validate: automatically validate added metadata
+    batch: MetadataImportBatch for added objects
     errors: list of errors
     """
     for child in element:
         if etree.QName(child.tag).localname == "RequestedAttribute":
-            errors = _parse_attribute(sp, child, validate, errors)
+            errors = _parse_attribute(sp, child, batch, errors)
         if etree.QName(child.tag).localname == "ServiceName":
             if child.values()[0] == "fi" and child.text:
                 sp.name_fi = child.text[:140]
@@ -299,38 +419,25 @@ def metadata_parser_attributeconsumingservice(sp, element, validate, errors):
                 sp.description_sv = child.text[:140]
 
 
-def _parse_attribute(sp, element, validate, errors):
+def _parse_attribute(sp, element, batch, errors):
     friendly_name = element.get("FriendlyName")
     name = element.get("Name")
     if friendly_name:
-        attribute = Attribute.objects.filter(name=name).first()
-        if not attribute:
-            attribute = Attribute.objects.filter(friendlyname=friendly_name).first()
+        attribute = batch.cache.get_attribute(name, friendly_name)
         if attribute:
-            if not SPAttribute.objects.filter(sp=sp, attribute=attribute).exists():
-                if validate:
-                    SPAttribute.objects.create(
-                        sp=sp,
-                        attribute=attribute,
-                        reason="initial dump, please give the real reason",
-                        validated=timezone.now(),
-                    )
-                else:
-                    SPAttribute.objects.create(
-                        sp=sp, attribute=attribute, reason="initial dump, please give the real reason", validated=None
-                    )
+            batch.add_attribute(attribute)
         else:
             errors.append(sp.entity_id + " : " + _("Could not add attribute") + " : " + friendly_name + ", " + name)
     return errors
 
 
-def metadata_parser_ssodescriptor(sp, element, validate, errors, disable_checks):
+def metadata_parser_ssodescriptor(sp, element, batch, errors, disable_checks):
     """
     Parses SP SSODescriptor
 
     sp: ServiceProvider object where information is saved or linked
     element: lxml element which is parsed
-    validate: automatically validate added metadata
+    batch: MetadataImportBatch for added objects
     errors: list of errors
     disalbe_checks: disable checks for endpoint bindingchoices, creating a new if nesessary
     """
@@ -342,46 +449,29 @@ def metadata_parser_ssodescriptor(sp, element, validate, errors, disable_checks)
         if etree.QName(child.tag).localname == "Extensions":
             metadata_parser_spsso_extensions(sp, child)
         if etree.QName(child.tag).localname == "KeyDescriptor":
-            metadata_parser_keydescriptor(sp, child, validate, errors)
+            metadata_parser_keydescriptor(sp, child, batch, errors)
         if etree.QName(child.tag).localname == "NameIDFormat":
-            metadata_parser_nameidformat(sp, child, errors)
+            metadata_parser_nameidformat(sp, child, batch, errors)
         for servicetype in ["ArtifactResolutionService", "SingleLogoutService", "AssertionConsumerService"]:
             if etree.QName(child.tag).localname == servicetype:
-                metadata_parser_servicetype(sp, child, validate, errors, servicetype, disable_checks)
+                metadata_parser_servicetype(sp, child, batch, errors, servicetype, disable_checks)
         if etree.QName(child.tag).localname == "AttributeConsumingService":
-            metadata_parser_attributeconsumingservice(sp, child, validate, errors)
+            metadata_parser_attributeconsumingservice(sp, child, batch, errors)
 
 
-def metadata_parser_contact(sp, element, validate):
+def metadata_parser_contact(sp, element, batch):
     """
     Parses SP contact information
 
     sp: ServiceProvider object where information is linked
     element: lxml element which is parsed
-    validate: automatically validate added metadata
+    batch: MetadataImportBatch for added objects
     """
     contact_type = element.get("contactType")
     if contact_type == "technical" or contact_type == "administrative" or contact_type == "support":
         first_name, last_name, email = _parse_contact_info(element)
-        if (
-            not Contact.objects.filter(
-                sp=sp, type=contact_type, firstname=first_name, lastname=last_name, email=email
-            ).exists()
-            and email
-        ):
-            if validate:
-                Contact.objects.create(
-                    sp=sp,
-                    type=contact_type,
-                    firstname=first_name,
-                    lastname=last_name,
-                    email=email,
-                    validated=timezone.now(),
-                )
-            else:
-                Contact.objects.create(
-                    sp=sp, type=contact_type, firstname=first_name, lastname=last_name, email=email, validated=None
-                )
+        if email:
+            batch.add_contact(contact_type, first_name, last_name, email)
 
 
 def _parse_contact_info(element):
@@ -402,51 +492,121 @@ def _parse_contact_info(element):
     return first_name, last_name, email
 
 
-def metadata_parse_element(element, sp, validate, errors, disable_checks):
+def metadata_parse_element(element, sp, batch, errors, disable_checks):
     if etree.QName(element.tag).localname == "SPSSODescriptor":
-        metadata_parser_ssodescriptor(sp, element, validate, errors, disable_checks)
+        metadata_parser_ssodescriptor(sp, element, batch, errors, disable_checks)
     if etree.QName(element.tag).localname == "ContactPerson":
-        metadata_parser_contact(sp, element, validate)
+        metadata_parser_contact(sp, element, batch)
     if etree.QName(element.tag).localname == "Extensions":
         metadata_parser_extensions(sp, element)
 
 
-def saml_metadata_parser(entity, overwrite, verbosity, validate=False, disable_checks=False):
+def saml_metadata_parser(
+    entity, overwrite, verbosity, validate=False, disable_checks=False, cache=None, messages=None
+):
     """
     Parses metadata and saves information to SP-object
 
+    Each entity is saved in a single transaction, with linked objects created in bulk.
+
     entity: lxml entity for one SP
     overwrite: replace/add data for existing SP
     verbosity: verbosity level for errors
     validate: automatically validate added metadata
     disalbe_checks: disable checks for endpoint bindingchoices, creating a new if nesessary
+    cache: MetadataImportCache, shared when importing multiple entities
+    messages: list for informational messages, added to errors if not given
 
     return sp and possible errors
     """
     errors = []
     entity_id = entity.get("entityID")
     if entity_id:
-        sp, errors = _get_sp(entity_id, errors, validate, overwrite, verbosity)
-        if sp:
-            for element in entity:
-                metadata_parse_element(element, sp, validate, errors, disable_checks)
-            sp.save()
-            return sp, errors
+        if cache is None:
+            cache = MetadataImportCache()
+        with transaction.atomic():
+            sp, created, errors = _get_sp(entity_id, errors, validate, overwrite, verbosity, messages)
+            if sp:
+                batch = MetadataImportBatch(sp, cache, validate, created=created)
+                for element in entity:
+                    metadata_parse_element(element, sp, batch, errors, disable_checks)
+                batch.save()
+                sp.save()
+                return sp, errors
     else:
         errors.append(_("Could not find entityID"))
     return None, errors
 
 
-def _get_sp(entity_id, errors, validate, overwrite, verbosity):
+def metadata_content_hash(entity, **options):
+    """
+    Returns SHA-256 hash of exclusive canonical XML of an entity, so that formatting
+    and namespaces declared outside the entity do not change the hash. Import
+    options are included, so importing with other options does not skip the entity.
+    """
+    content_hash = hashlib.sha256(etree.tostring(entity, method="c14n", exclusive=True))
+    for key, value in sorted(options.items()):
+        content_hash.update(("\n%s=%s" % (key, value)).encode())
+    return content_hash.hexdigest()
+
+
+def saml_metadata_import(entity, overwrite, verbosity, validate=False, disable_checks=False, cache=None, force=False):
+    """
+    Imports metadata of an entity, skipping it if the entity has not changed since
+    it was previously imported with the same options without errors, and a service
+    provider with the entity id exists.
+
+    entity: lxml entity for one SP
+    overwrite: replace/add data for existing SP
+    verbosity: verbosity level for errors
+    validate: automatically validate added metadata
+    disalbe_checks: disable checks for endpoint bindingchoices, creating a new if nesessary
+    cache: MetadataImportCache, shared when importing multiple entities
+    force: import entity even if it has not changed
+
+    return status, sp and possible errors, preceded by informational messages.
+    Status is CREATED, UPDATED, SKIPPED, UNCHANGED or ERROR.
+    """
+    if cache is None:
+        cache = MetadataImportCache()
+    entity_id = entity.get("entityID")
+    messages = []
+    content_hash = metadata_content_hash(entity, validate=validate, disable_checks=disable_checks)
+    exists = entity_id in cache.entity_ids
+    if exists and not force and cache.hashes.get(entity_id) == content_hash:
+        return "UNCHANGED", None, []
+    with transaction.atomic():
+        sp, errors = saml_metadata_parser(
+            entity, overwrite, verbosity, validate, disable_checks, cache=cache, messages=messages
+        )
+        if not sp:
+            return "SKIPPED" if exists else "ERROR", None, messages + errors
+        if errors:
+            # Entity is imported again until it is imported without errors
+            MetadataImportHash.objects.filter(entity_id=entity_id).delete()
+        else:
+            MetadataImportHash.objects.update_or_create(entity_id=entity_id, defaults={"content_hash": content_hash})
+    cache.entity_ids.add(entity_id)
+    if errors:
+        cache.hashes.pop(entity_id, None)
+    else:
+        cache.hashes[entity_id] = content_hash
+    return "UPDATED" if exists else "CREATED", sp, messages + errors
+
+
+def _get_sp(entity_id, errors, validate, overwrite, verbosity, messages=None):
+    created = False
+    if messages is None:
+        messages = errors
     try:
         sp = ServiceProvider.objects.get(entity_id=entity_id, end_at=None)
         if not overwrite:
             sp = None
             if verbosity > 1:
-                errors.append(entity_id + " : " + _("EntityID already exists, skipping"))
+                messages.append(entity_id + " : " + _("EntityID already exists, skipping"))
         else:
             if verbosity > 1:
-                errors.append(entity_id + " : " + _("EntityID already exists, overwriting"))
+                messages.append(entity_id + " : " + _("EntityID already exists, overwriting"))
     except ServiceProvider.DoesNotExist:
         if validate:
             sp = ServiceProvider.objects.create(
@@ -456,6 +616,32 @@ def _get_sp(entity_id, errors, validate, overwrite, verbosity):
             sp = ServiceProvider.objects.create(
                 entity_id=entity_id, service_type="saml", validated=None, modified=True
             )
+        created = True
         if verbosity > 2:
-            errors.append(entity_id + " : " + _("EntityID does not exist, creating"))
-    return sp, errors
+            messages.append(entity_id + " : " + _("EntityID does not exist, creating"))
+    return sp, created, errors
+
+
+def iter_metadata_entities(filename):
+    """
+    Yields EntityDescriptor elements from a metadata file as soon as each of them is parsed.
+    Elements are cleared after they have been processed, so memory use does not depend
+    on the file size.
+
+    filename: metadata file name, gzip compressed if name ends with .gz
+    """
+    source = gzip.open(filename, "rb") if filename.endswith(".gz") else open(filename, "rb")
+    with source:
+        for event, element in etree.iterparse(
+            source,
+            events=("end",),
+            tag="{urn:oasis:names:tc:SAML:2.0:metadata}EntityDescriptor",
+            remove_comments=True,
+            remove_blank_text=True,
+            resolve_entities=False,
+            no_network=True,
+        ):
+            yield element
+            element.clear(keep_tail=True)
+            while element.getprevious() is not None:
+                del element.getparent()[0]
@@ -1,12 +1,28 @@
 import logging
 
 from django.conf import settings
-from django.db.models import Q
+from django.db.models import (
+    BooleanField,
+    Case,
+    Count,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
 from django.http.response import Http404
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from rr.models.serviceprovider import ServiceProvider
+from rr.models.spadmin import Keystore
+from rr.models.statistics import StatisticsAlert
+from rr.utils.missing_data import missing_sp_data_condition
 
 logger = logging.getLogger(__name__)
 
@@ -103,6 +119,41 @@ def get_service_provider_queryset(request, service_type=None):
             ).prefetch_related("admins", "admin_groups")
 
 
+def annotate_service_provider_list(queryset):
+    """
+    Annotate service provider queryset with values shown in service provider lists,
+    so that they are loaded with the service providers.
+
+    production_status: production status of the latest validated version
+    missing_data: data required for production use is missing
+    pending_change: changes are waiting for validation
+    invite_count: number of admin invites
+    statistics_alert: type of saved statistics alert, if any
+
+    return: annotated queryset
+    """
+    validated_production = (
+        ServiceProvider.objects.filter(history=OuterRef("pk"))
+        .exclude(validated=None)
+        .order_by("-pk")
+        .values("production")[:1]
+    )
+    invite_count = (
+        Keystore.objects.filter(sp=OuterRef("pk")).order_by().values("sp").annotate(count=Count("pk")).values("count")
+    )
+    return queryset.annotate(
+        production_status=Case(
+            When(validated__isnull=False, then=F("production")),
+            default=Coalesce(Subquery(validated_production), Value(False)),
+            output_field=BooleanField(),
+        ),
+        missing_data=ExpressionWrapper(missing_sp_data_condition(), output_field=BooleanField()),
+        pending_change=ExpressionWrapper(Q(validated=None) | Q(modified=True), output_field=BooleanField()),
+        invite_count=Coalesce(Subquery(invite_count, output_field=IntegerField()), Value(0)),
+        statistics_alert=Subquery(StatisticsAlert.objects.filter(sp=OuterRef("pk")).values("type")[:1]),
+    )
+
+
 def create_sp_history_copy(sp):
     """
     Create a history copy of SP, with end_at value and new pk
@@ -0,0 +1,27 @@
+"""
+Control of signal receivers for bulk changes
+"""
+
+import threading
+from contextlib import contextmanager
+
+_state = threading.local()
+
+
+def receivers_enabled():
+    """Returns false if signal receivers are disabled in the current thread"""
+    return not getattr(_state, "disabled", False)
+
+
+@contextmanager
+def receivers_disabled():
+    """
+    Disables metadata cache and host index signal receivers in the current thread.
+    Used for bulk changes which update the cache and index once per batch.
+    """
+    disabled = getattr(_state, "disabled", False)
+    _state.disabled = True
+    try:
+        yield
+    finally:
+        _state.disabled = disabled
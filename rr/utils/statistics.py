@@ -0,0 +1,381 @@
+"""
+Functions for importing login statistics
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from itertools import groupby, islice
+
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from rr.models.serviceprovider import ServiceProvider
+from rr.models.statistics import MonthlyStatistics, Statistics, WeeklyStatistics
+from rr.utils.hyperloglog import HyperLogLog, merge_sketches
+
+logger = logging.getLogger(__name__)
+
+
+def week_start(day):
+    """Returns the first day of ISO week"""
+    return day - timedelta(days=day.weekday())
+
+
+def month_start(day):
+    """Returns the first day of month"""
+    return day.replace(day=1)
+
+
+def next_month_start(day):
+    """Returns the first day of the next month"""
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+# Rollup models with functions for period start, period end and database truncation
+ROLLUPS = [
+    (WeeklyStatistics, week_start, lambda day: week_start(day) + timedelta(days=7), TruncWeek),
+    (MonthlyStatistics, month_start, next_month_start, TruncMonth),
+]
+
+
+def _rollup_objects(rollup, queryset, periods=None):
+    """
+    Returns rollup objects for daily statistics in queryset. Unique users
+    are merged from daily sketches if all days in the period have one.
+
+    rollup: tuple from ROLLUPS
+    queryset: Statistics queryset
+    periods: set of (sp pk, period start) tuples to include, default all
+    """
+    model, period_start, period_end, trunc = rollup
+    totals = (
+        queryset.annotate(period=trunc("date"))
+        .order_by()
+        .values("sp", "period")
+        .annotate(total_logins=Sum("logins"), max_users=Max("users"), days=Count("pk"))
+    )
+    sketches = defaultdict(list)
+    for sp, day, sketch in queryset.exclude(users_sketch=None).order_by().values_list("sp", "date", "users_sketch"):
+        sketches[(sp, period_start(day))].append(bytes(sketch))
+    objects = []
+    for row in totals:
+        key = (row["sp"], row["period"])
+        if periods is not None and key not in periods:
+            continue
+        merged = merge_sketches(sketches[key]) if len(sketches[key]) == row["days"] else None
+        objects.append(
+            model(
+                sp_id=row["sp"],
+                date=row["period"],
+                logins=row["total_logins"],
+                users=row["max_users"],
+                unique_users=merged.count() if merged else None,
+                users_sketch=merged.to_bytes() if merged else None,
+            )
+        )
+    return objects
+
+
+def _save_rollups(model, objects):
+    """Bulk insert-or-update rollup objects"""
+    model.objects.bulk_create(
+        objects,
+        update_conflicts=True,
+        unique_fields=["sp", "date"],
+        update_fields=["logins", "users", "unique_users", "users_sketch"],
+        batch_size=1000,
+    )
+
+
+def update_statistics_rollups(keys):
+    """
+    Updates weekly and monthly rollups for periods including changed daily statistics.
+
+    keys: iterable of (sp pk, date) tuples of changed daily statistics
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    for rollup in ROLLUPS:
+        model, period_start, period_end, trunc = rollup
+        periods = {(sp, period_start(day)) for sp, day in keys}
+        queryset = Statistics.objects.filter(
+            sp__in={sp for sp, day in keys},
+            date__gte=min(day for sp, day in periods),
+            date__lt=period_end(max(day for sp, day in periods)),
+        )
+        _save_rollups(model, _rollup_objects(rollup, queryset, periods))
+
+
+def rebuild_statistics_rollups():
+    """
+    Rebuilds all weekly and monthly rollups from daily statistics,
+    one service provider at a time.
+
+    return dictionary of number of rollup rows by model name
+    """
+    counts = {}
+    sps = Statistics.objects.order_by().values_list("sp", flat=True).distinct()
+    with transaction.atomic():
+        for rollup in ROLLUPS:
+            model = rollup[0]
+            model.objects.all().delete()
+            for sp in sps:
+                _save_rollups(model, _rollup_objects(rollup, Statistics.objects.filter(sp=sp)))
+            counts[model.__name__] = model.objects.count()
+    return counts
+
+
+def _bucket_totals(rows, period_start):
+    """
+    Aggregates daily (sp, date, logins, users, sketch) rows to periods. Users is the
+    approximate number of unique users if all days have a sketch, otherwise the
+    highest daily number of users.
+
+    return dictionary of (logins, users) tuples by (sp pk, period start)
+    """
+    buckets = defaultdict(list)
+    for row in rows:
+        buckets[(row[0], period_start(row[1]))].append(row)
+    totals = {}
+    for key, bucket_rows in buckets.items():
+        logins = sum(row[2] for row in bucket_rows)
+        if all(row[4] for row in bucket_rows):
+            users = merge_sketches(bytes(row[4]) for row in bucket_rows).count()
+        else:
+            users = max((row[3] for row in bucket_rows if row[3] is not None), default=None)
+        totals[key] = (logins, users)
+    return totals
+
+
+def get_statistics_series(pks, bucket, start, end):
+    """
+    Returns login statistics time series for service providers.
+
+    Daily buckets are read from daily statistics. Weekly and monthly buckets
+    are read from rollups for periods inside the date range and aggregated
+    from daily statistics for partial periods at the ends of the range.
+    Users is the approximate number of unique users when available,
+    otherwise the highest daily number of unique users.
+
+    pks: list of ServiceProvider pks
+    bucket: "day", "week" or "month"
+    start: first date included
+    end: last date included
+
+    return dictionary of lists of (date, logins, users) tuples by SP pk, ordered by date
+    """
+    series = defaultdict(list)
+    if bucket == "day":
+        rows = (
+            Statistics.objects.filter(sp__in=pks, date__gte=start, date__lte=end)
+            .order_by("date")
+            .values_list("sp", "date", "logins", "users")
+        )
+        for sp, day, logins, users in rows:
+            series[sp].append((day, logins, users))
+        return series
+    model, period_start, period_end, trunc = ROLLUPS[0] if bucket == "week" else ROLLUPS[1]
+    full_start = start if period_start(start) == start else period_end(start)
+    full_end = period_start(end + timedelta(days=1))
+    totals = {}
+    if full_start < full_end:
+        for sp, day, logins, users, unique_users in model.objects.filter(
+            sp__in=pks, date__gte=full_start, date__lt=full_end
+        ).values_list("sp", "date", "logins", "users", "unique_users"):
+            totals[(sp, day)] = (logins, unique_users if unique_users is not None else users)
+        edges = Q(date__gte=start, date__lt=full_start) | Q(date__gte=full_end, date__lte=end)
+    else:
+        edges = Q(date__gte=start, date__lte=end)
+    rows = (
+        Statistics.objects.filter(edges, sp__in=pks)
+        .order_by()
+        .values_list("sp", "date", "logins", "users", "users_sketch")
+    )
+    totals.update(_bucket_totals(rows, period_start))
+    for (sp, day), (logins, users) in sorted(totals.items(), key=lambda item: item[0][1]):
+        series[sp].append((day, logins, users))
+    return series
+
+
+def get_entity_map():
+    """
+    Returns dictionary of current service provider pks by entity_id.
+    If entity_id is not unique, the oldest service provider is used.
+    """
+    entity_map = {}
+    for pk, entity_id in ServiceProvider.objects.filter(end_at=None).order_by("pk").values_list("pk", "entity_id"):
+        entity_map.setdefault(entity_id, pk)
+    return entity_map
+
+
+def get_statistics_watermark():
+    """
+    Returns the latest date with imported statistics, or None.
+    """
+    return Statistics.objects.aggregate(date=Max("date"))["date"]
+
+
+def get_statistics_updated_at():
+    """
+    Returns the time statistics were last created or updated, or None.
+    """
+    return Statistics.objects.aggregate(updated_at=Max("updated_at"))["updated_at"]
+
+
+def aggregate_user_rows(rows):
+    """
+    Aggregates per user rows to statistics rows with a unique users sketch.
+    Logins of rows without a user are counted, but they are not counted as users.
+
+    rows: iterable of (entity_id, date, user, logins) tuples, ordered by date and entity_id
+
+    yield (entity_id, date, logins, users, sketch) tuples
+    """
+    for (entity_id, day), user_rows in groupby(rows, key=lambda row: (row[0], row[1])):
+        sketch = HyperLogLog()
+        logins = 0
+        users = 0
+        for row in user_rows:
+            logins += row[3]
+            if row[2]:
+                sketch.add(row[2])
+                users += 1
+        yield entity_id, day, logins, users, sketch.to_bytes()
+
+
+def save_statistics(rows, entity_map):
+    """
+    Saves a chunk of statistics rows in a single transaction. New rows are
+    inserted and changed rows updated with a bulk insert-or-update, and
+    rollups are updated for the changed periods.
+
+    rows: list of (entity_id, date, logins, users) tuples, with optional unique users sketch as fifth item
+    entity_map: dictionary of service provider pks by entity_id
+
+    return list of (status, row) tuples, status is CREATED, UPDATED, EXISTS or UNKNOWN SP
+    """
+    results = []
+    known = [row for row in rows if row[0] in entity_map]
+    with transaction.atomic():
+        existing = {
+            (sp, day): (logins, users, bytes(sketch) if sketch else None)
+            for sp, day, logins, users, sketch in Statistics.objects.filter(
+                sp__in={entity_map[row[0]] for row in known}, date__in={row[1] for row in known}
+            )
+            .order_by()
+            .values_list("sp", "date", "logins", "users", "users_sketch")
+        }
+        objects = {}
+        for row in rows:
+            sp = entity_map.get(row[0])
+            if not sp:
+                results.append(("UNKNOWN SP", row))
+                continue
+            key = (sp, row[1])
+            sketch = row[4] if len(row) > 4 else None
+            if key not in existing:
+                status = "CREATED"
+            elif existing[key] != (row[2], row[3], sketch):
+                status = "UPDATED"
+            else:
+                results.append(("EXISTS", row))
+                continue
+            objects[key] = Statistics(sp_id=sp, date=row[1], logins=row[2], users=row[3], users_sketch=sketch)
+            results.append((status, row))
+        if objects:
+            Statistics.objects.bulk_create(
+                objects.values(),
+                update_conflicts=True,
+                unique_fields=["sp", "date"],
+                update_fields=["logins", "users", "users_sketch", "updated_at"],
+            )
+            update_statistics_rollups(objects.keys())
+    return results
+
+
+def add_saved_statistics(rows, entity_map, keys, chunk_size=1000):
+    """
+    Adds saved logins and unique users to rows which were already saved in the
+    same import, i.e. from another log file for the same day.
+
+    rows: list of (entity_id, date, logins, users, sketch) rows
+    entity_map: dictionary of service provider pks by entity_id
+    keys: set of (entity_id, date) tuples saved earlier in the import
+
+    return list of rows
+    """
+    results = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start : start + chunk_size]
+        merged = [row for row in chunk if (row[0], row[1]) in keys and row[0] in entity_map]
+        saved = {}
+        if merged:
+            saved = {
+                (sp, day): (logins, bytes(sketch) if sketch else None)
+                for sp, day, logins, sketch in Statistics.objects.filter(
+                    sp__in={entity_map[row[0]] for row in merged}, date__in={row[1] for row in merged}
+                )
+                .order_by()
+                .values_list("sp", "date", "logins", "users_sketch")
+            }
+        for row in chunk:
+            key = (entity_map.get(row[0]), row[1])
+            if (row[0], row[1]) in keys and key in saved:
+                logins, sketch = saved[key]
+                sketch = merge_sketches([sketch, row[4]])
+                row = (row[0], row[1], logins + row[2], sketch.count(), sketch.to_bytes())
+            results.append(row)
+    return results
+
+
+def _fetch_rows(cursor, chunk_size):
+    """Yields rows from a database cursor, fetched in chunks"""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def save_statistics_chunks(rows, chunk_size=1000, entity_map=None):
+    """
+    Saves statistics rows in chunks, each chunk in a single transaction.
+
+    rows: iterable of rows for save_statistics
+    chunk_size: number of rows saved at once
+    entity_map: dictionary of service provider pks by entity_id, default from get_entity_map
+
+    yield (status, row) tuples
+    """
+    if entity_map is None:
+        entity_map = get_entity_map()
+    rows = iter(rows)
+    count = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        count += len(chunk)
+        yield from save_statistics(chunk, entity_map)
+    logger.debug("Imported %s statistics rows", count)
+
+
+def import_statistics(cursor, chunk_size=1000, sketches=False):
+    """
+    Imports statistics rows from a database cursor, fetching and saving
+    them in chunks.
+
+    cursor: DB-API cursor with executed query returning (entity_id, date, logins, users) rows,
+      or (entity_id, date, user, logins) rows ordered by date and entity_id if using sketches
+    chunk_size: number of rows fetched and saved at once
+    sketches: aggregate per user rows and store unique users sketches
+
+    yield (status, row) tuples
+    """
+    rows = _fetch_rows(cursor, chunk_size)
+    if sketches:
+        rows = aggregate_user_rows(rows)
+    yield from save_statistics_chunks(rows, chunk_size)
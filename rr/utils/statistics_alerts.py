@@ -0,0 +1,168 @@
+"""
+Detection of login anomalies and dormant services from login statistics
+"""
+
+import logging
+import math
+from array import array
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.db import transaction
+from django.db.models import Max
+
+from rr.models.serviceprovider import ServiceProvider
+from rr.models.statistics import Statistics, StatisticsAlert
+
+logger = logging.getLogger(__name__)
+
+
+def load_login_series(pks, start, end):
+    """
+    Loads daily logins for service providers with a single query.
+
+    pks: list of ServiceProvider pks
+    start: first date included
+    end: last date included
+
+    return dictionary of arrays of daily logins by SP pk, days without statistics are zero
+    """
+    days = (end - start).days + 1
+    series = {pk: array("l", bytes(array("l").itemsize * days)) for pk in pks}
+    rows = (
+        Statistics.objects.filter(sp__in=pks, date__gte=start, date__lte=end)
+        .order_by()
+        .values_list("sp", "date", "logins")
+    )
+    for sp, day, logins in rows:
+        series[sp][(day - start).days] = logins
+    return series
+
+
+def _window_sum(prefix, start, end):
+    """Returns sum of series[start:end] from prefix sums"""
+    return prefix[end] - prefix[start]
+
+
+def rolling_deviations(logins, baseline_days, recent_days):
+    """
+    Returns rolling baseline mean, standard deviation and deviation score of each
+    recent day.
+
+    The baseline of each day is the baseline_days before it, lagged by recent_days
+    so that recent days are not included in the baseline of any recent day. Means
+    and variances of all windows are computed from prefix sums of logins and
+    squared logins, so each window takes constant time.
+
+    Deviation score is the z-score of the day's logins. Standard deviation is at
+    least the square root of the mean, i.e. the expected random variation of the
+    number of logins, so constant baselines do not give infinite scores.
+
+    logins: array of daily logins, at least baseline_days + 2 * recent_days - 1 long
+    baseline_days: number of days in a baseline window
+    recent_days: number of recent days, last days of logins
+
+    return list of (mean, std, score) tuples of recent days
+    """
+    prefix = array("q", accumulate(logins, initial=0))
+    squares = array("q", accumulate((value * value for value in logins), initial=0))
+    days = len(logins)
+    results = []
+    for day in range(days - recent_days, days):
+        end = day - recent_days + 1
+        start = end - baseline_days
+        mean = _window_sum(prefix, start, end) / baseline_days
+        variance = max(_window_sum(squares, start, end) / baseline_days - mean * mean, 0.0)
+        std = max(math.sqrt(variance), math.sqrt(mean), 1.0)
+        results.append((mean, std, (logins[day] - mean) / std))
+    return results
+
+
+def detect_statistics_alerts(
+    baseline_days=28, recent_days=7, threshold=0.2, min_baseline=10, dormant_days=90, min_deviation=3.0, end=None
+):
+    """
+    Finds production SAML and OIDC services whose logins have dropped, or which have
+    had no logins at all.
+
+    Daily logins are loaded for all services with a single query, and each series
+    is processed in a single pass using prefix sums. Each recent day is compared to
+    its rolling baseline with rolling_deviations, and deviation is the mean score of
+    the recent days. Logins have dropped if the recent daily logins are at most
+    threshold of the baseline of the last day, and the deviation is at least
+    min_deviation standard deviations below it.
+
+    baseline_days: number of days used for baseline, before the recent days
+    recent_days: number of recent days compared to baseline
+    threshold: recent daily logins must be at most this fraction of baseline to be an anomaly
+    min_baseline: minimum baseline daily logins for an anomaly
+    dormant_days: services without logins during this many days are dormant
+    min_deviation: minimum number of standard deviations below baseline for an anomaly
+    end: last day included, default yesterday
+
+    return list of unsaved StatisticsAlert objects
+    """
+    if end is None:
+        end = date.today() - timedelta(days=1)
+    # Rolling baselines of recent days start before the baseline of the last day
+    history_days = baseline_days + 2 * recent_days - 1
+    days = max(history_days, dormant_days)
+    start = end - timedelta(days=days - 1)
+    serviceproviders = dict(
+        ServiceProvider.objects.filter(end_at=None, production=True, service_type__in=["saml", "oidc"])
+        .order_by("pk")
+        .values_list("pk", "created_at")
+    )
+    series = load_login_series(list(serviceproviders), start, end)
+    alerts = []
+    for pk, logins in series.items():
+        age = (end - serviceproviders[pk].date()).days + 1
+        prefix = array("q", accumulate(logins, initial=0))
+        if age >= dormant_days and _window_sum(prefix, days - dormant_days, days) == 0:
+            last_login = None
+            for day in range(days - 1, -1, -1):
+                if logins[day]:
+                    last_login = start + timedelta(days=day)
+                    break
+            alerts.append(StatisticsAlert(sp_id=pk, type=StatisticsAlert.DORMANT, last_login=last_login))
+            continue
+        if age < history_days:
+            continue
+        recent = _window_sum(prefix, days - recent_days, days) / recent_days
+        baseline = _window_sum(prefix, days - recent_days - baseline_days, days - recent_days) / baseline_days
+        if baseline < min_baseline or recent > baseline * threshold:
+            continue
+        deviation = sum(score for mean, std, score in rolling_deviations(logins, baseline_days, recent_days))
+        deviation /= recent_days
+        if deviation <= -min_deviation:
+            alerts.append(
+                StatisticsAlert(
+                    sp_id=pk, type=StatisticsAlert.ANOMALY, baseline=baseline, recent=recent, deviation=deviation
+                )
+            )
+    # Last login date for dormant services, if before the loaded period
+    missing = [alert.sp_id for alert in alerts if alert.type == StatisticsAlert.DORMANT and not alert.last_login]
+    if missing:
+        last_logins = dict(
+            Statistics.objects.filter(sp__in=missing, logins__gt=0)
+            .order_by()
+            .values("sp")
+            .annotate(last_login=Max("date"))
+            .values_list("sp", "last_login")
+        )
+        for alert in alerts:
+            if alert.sp_id in last_logins:
+                alert.last_login = last_logins[alert.sp_id]
+    logger.debug("Found %s statistics alerts from %s services", len(alerts), len(series))
+    return alerts
+
+
+def save_statistics_alerts(alerts):
+    """
+    Replaces saved statistics alerts.
+
+    alerts: list of unsaved StatisticsAlert objects
+    """
+    with transaction.atomic():
+        StatisticsAlert.objects.all().delete()
+        StatisticsAlert.objects.bulk_create(alerts)
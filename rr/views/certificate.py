@@ -1,7 +1,5 @@
-import binascii
 import logging
 
-from cryptography.hazmat.primitives import hashes
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
@@ -11,7 +9,7 @@ from django.utils import timezone
 from django.utils.translation import gettext as _
 
 from rr.forms.certificate import CertificateForm
-from rr.models.certificate import Certificate, load_certificate
+from rr.models.certificate import Certificate
 from rr.models.serviceprovider import ServiceProvider
 from rr.utils.serviceprovider import get_service_provider
 
@@ -134,17 +132,9 @@ def certificate_info(request, pk):
     ``object``
         An instance of :model:`rr.ServiceProvider`.
 
-    ``serial_number``
-        Serial number of the certificate.
-
-    ``fingerprint_sha256``
-        SHA256 fingerprint of the certificate.
-
-    ``fingerprint_sha1``
-        SHA1 fingerprint of the certificate.
-
-    ``fingerprint_md5``
-        MD5 fingerprint of the certificate.
+    ``shared_certificates``
+        List of other current :model:`rr.Certificate` with the same public key,
+        only for super users.
 
     **Template:**
 
@@ -159,20 +149,16 @@ def certificate_info(request, pk):
         and not ServiceProvider.objects.filter(pk=certificate.sp.pk, admins=request.user, end_at=None).first()
     ):
         raise Http404(_("Certificate provided does not exist"))
-    cert = load_certificate(certificate.certificate)
-    serial_number = cert.serial_number
-    fingerprint_sha256 = binascii.hexlify(cert.fingerprint(hashes.SHA256()))
-    fingerprint_sha1 = binascii.hexlify(cert.fingerprint(hashes.SHA1()))
-    fingerprint_md5 = binascii.hexlify(cert.fingerprint(hashes.MD5()))
+    shared_certificates = None
+    if request.user.is_superuser and certificate.public_key_sha256:
+        shared_certificates = (
+            Certificate.objects.filter(public_key_sha256=certificate.public_key_sha256, end_at=None, sp__end_at=None)
+            .exclude(pk=certificate.pk)
+            .select_related("sp")
+            .order_by("sp__entity_id")
+        )
     return render(
         request,
         "rr/certificate_info.html",
-        {
-            "certificate": certificate,
-            "object": certificate.sp,
-            "serial_number": serial_number,
-            "fingerprint_sha256": fingerprint_sha256,
-            "fingerprint_sha1": fingerprint_sha1,
-            "fingerprint_md5": fingerprint_md5,
-        },
+        {"certificate": certificate, "object": certificate.sp, "shared_certificates": shared_certificates},
     )
@@ -1,18 +1,18 @@
 import logging
-from smtplib import SMTPException
 
-from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
-from django.core.mail import send_mail
+from django.core.mail.message import BadHeaderError
+from django.db.models import Count
 from django.db.models.functions import Lower
 from django.shortcuts import render
 from django.utils.translation import gettext as _
 
 from rr.forms.email import EmailSelectForm
 from rr.models.contact import Contact
-from rr.models.email import Template
+from rr.models.email import OutgoingEmail, Template
 from rr.models.serviceprovider import ServiceProvider
+from rr.utils.outbox import queue_email
 
 logger = logging.getLogger(__name__)
 
@@ -91,15 +91,14 @@ def _send_emails(request, form, emails, send):
         subject = template.title
         message = template.body
         if send:
-            for email in emails:
-                try:
-                    send_mail(subject, message, settings.SERVER_EMAIL, [email], fail_silently=False)
-                    logger.info("Sent email to {email} by {user}".format(email=email, user=request.user))
-                except SMTPException:
-                    logger.warning("Could not send invite to {email}".format(email=email))
-                    errors.append(email)
-            form = EmailSelectForm()
-            success = _("Email have been sent")
+            try:
+                queued = queue_email(subject, message, emails, created_by=request.user)
+                logger.info("Queued {count} emails by {user}".format(count=len(queued), user=request.user))
+                form = EmailSelectForm()
+                success = _("Emails have been queued for sending")
+            except BadHeaderError:
+                logger.warning("Email from {user} contained invalid headers.".format(user=request.user))
+                errors = sorted(emails)
     return form, subject, message, success, errors
 
 
@@ -133,3 +132,45 @@ def _get_addresses(form, emails):
                     Contact.objects.filter(sp=sp, type="support", end_at=None).values_list(Lower("email"), flat=True)
                 )
     return emails
+
+
+@login_required
+def email_outbox(request):
+    """
+    Displays delivery status of queued emails
+
+    **Context**
+
+    ``object_list``
+        List of latest :model:`rr.OutgoingEmail`, optionally filtered by ``status`` parameter.
+
+    ``counts``
+        List of (status, status name, number of messages) tuples.
+
+    ``status``
+        Selected status.
+
+    **Template:**
+
+    :template:`rr/email_outbox.html`
+    """
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    status = request.GET.get("status")
+    emails = OutgoingEmail.objects.select_related("created_by")
+    if status in dict(OutgoingEmail.STATUS_CHOICES):
+        emails = emails.filter(status=status)
+    else:
+        status = None
+    counts = dict(
+        OutgoingEmail.objects.order_by().values("status").annotate(count=Count("pk")).values_list("status", "count")
+    )
+    return render(
+        request,
+        "rr/email_outbox.html",
+        {
+            "object_list": emails[:200],
+            "counts": [(value, name, counts.get(value, 0)) for value, name in OutgoingEmail.STATUS_CHOICES],
+            "status": status,
+        },
+    )
@@ -8,6 +8,7 @@ import logging
 import os
 from datetime import datetime
 from glob import glob
+from io import BytesIO
 from os.path import join
 
 from django.conf import settings
@@ -26,9 +27,15 @@ from rr.utils.oidc_metadata_generator import (
     oidc_metadata_generator,
     oidc_metadata_generator_list,
 )
+from rr.utils.saml_metadata_export import (
+    remove_stale_saml_metadata_files,
+    saml_metadata_export_files,
+    saml_metadata_file_name,
+)
 from rr.utils.saml_metadata_generator import (
     saml_metadata_generator,
     saml_metadata_generator_list,
+    saml_metadata_generator_stream,
 )
 from rr.utils.saml_metadata_parser import saml_metadata_parser
 from rr.utils.serviceprovider import get_service_provider
@@ -63,11 +70,7 @@ def metadata(request, pk):
         if sp.service_type == "saml":
             tree = saml_metadata_generator(sp=sp, validated=validated)
             if tree is not None:
-                metadata = (
-                    etree.tostring(tree, pretty_print=True, encoding="UTF-8")
-                    .replace(b"xmlns:xmlns", b"xmlns")
-                    .decode()
-                )
+                metadata = etree.tostring(tree, pretty_print=True, encoding="UTF-8").decode()
         elif sp.service_type == "oidc":
             metadata = oidc_metadata_generator(sp=sp, validated=validated, client_secret_encryption="masked")
             metadata = json.dumps(metadata, indent=4, sort_keys=True)
@@ -142,7 +145,7 @@ def metadata_management(request, service_type="saml"):
     if error:
         return render(request, "error.html", {"error_message": error})
     _write_medadata(repo, service_type)
-    diff = _get_diff(repo)
+    diff = _get_metadata_diff(repo)
     log = _get_last_commits(repo, 5)
     origin, warning, error = _get_origin(repo, warning)
     if error:
@@ -154,7 +157,7 @@ def metadata_management(request, service_type="saml"):
             if error:
                 return render(request, "error.html", {"error_message": error})
             log = _get_last_commits(repo, 5)
-    diff = _get_diff(repo)
+            diff = _get_metadata_diff(repo)
     diff_hash = hashlib.md5(diff.encode("utf-8")).hexdigest()
     form = MetadataCommitForm(diff_hash=diff_hash)
     return render(request, "rr/metadata_management.html", {"form": form, "diff": diff, "log": log, "warning": warning})
@@ -197,11 +200,28 @@ def _get_repositorio(service_type):
     return repo, error
 
 
-def _get_diff(repo):
+def _get_diff(repo, *args):
     try:
-        return repo.git.diff("HEAD")
+        return repo.git.diff("HEAD", *args)
     except GitCommandError:
-        return repo.git.diff("4b825dc642cb6eb9a060e54bf8d69288fbee4904")
+        return repo.git.diff("4b825dc642cb6eb9a060e54bf8d69288fbee4904", *args)
+
+
+def _get_staged_diff(repo):
+    """
+    Returns diff of staged changes. Incremental export stages all changes, so
+    the diff is only computed for staged paths, and skipped if nothing is staged.
+    """
+    paths = _get_diff(repo, "--cached", "--name-only").splitlines()
+    if not paths:
+        return ""
+    return _get_diff(repo, "--cached", "--", *paths)
+
+
+def _get_metadata_diff(repo):
+    if hasattr(settings, "METADATA_EXPORT_INCREMENTAL") and settings.METADATA_EXPORT_INCREMENTAL:
+        return _get_staged_diff(repo)
+    return _get_diff(repo)
 
 
 def _get_last_commits(repo, n):
@@ -220,6 +240,8 @@ def _get_last_commits(repo, n):
 
 
 def _write_medadata(repo, service_type):
+    if hasattr(settings, "METADATA_EXPORT_INCREMENTAL") and settings.METADATA_EXPORT_INCREMENTAL:
+        return _write_metadata_incremental(repo, service_type)
     if service_type == "saml":
         _write_saml_metadata()
         repo.git.add(A=True)
@@ -231,58 +253,152 @@ def _write_medadata(repo, service_type):
         repo.git.add(A=True)
 
 
-def _write_saml_metadata():
-    # Generate metadata and write it to file
+def _write_metadata_incremental(repo, service_type):
+    """
+    Writes only metadata files whose content differs from the version in git index
+    and stages only changed and removed files.
+
+    Returns list of changed paths, relative to repository root.
+    """
+    if service_type == "saml":
+        directory = settings.METADATA_GIT_REPOSITORIO
+        files = _get_saml_metadata_files()
+    elif service_type == "oidc":
+        directory = settings.OIDC_GIT_REPOSITORIO
+        files = _get_oidc_metadata_files()
+    elif service_type == "ldap":
+        directory = settings.LDAP_GIT_REPOSITORIO
+        files = _get_ldap_metadata_files()
+    else:
+        return []
+    entries = repo.index.entries
+    changed = []
+    for file_name, content in files.items():
+        metadata_file = join(directory, file_name)
+        path = os.path.relpath(metadata_file, repo.working_tree_dir)
+        data = content.encode("utf-8")
+        entry = entries.get((path, 0))
+        if (
+            entry
+            and entry.binsha == _get_git_blob_hash(data)
+            and os.path.isfile(metadata_file)
+            and os.path.getsize(metadata_file) == len(data)
+        ):
+            continue
+        with open(metadata_file, "wb") as f:
+            f.write(data)
+        changed.append(path)
+    if service_type == "ldap":
+        for metadata_file in _remove_ldap_metadata_files(files):
+            changed.append(os.path.relpath(metadata_file, repo.working_tree_dir))
+    if service_type == "saml" and settings.SAML_METADATA_EXPORT_INDIVIDUAL_FILES:
+        for file_name in remove_stale_saml_metadata_files(directory, files):
+            changed.append(os.path.relpath(join(directory, file_name), repo.working_tree_dir))
+    if changed:
+        repo.git.add("--all", "--", *changed)
+    return changed
+
+
+def _get_git_blob_hash(data):
+    """
+    Returns git object hash for file content, used for comparing content to git index.
+    """
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).digest()
+
+
+def _write_metadata_files(directory, files):
+    for file_name, content in files.items():
+        with open(join(directory, file_name), "w") as f:
+            f.write(content)
+
+
+def _get_saml_metadata_files():
+    """
+    Returns dictionary of SAML metadata file names and contents.
+    """
+    files = {}
     if settings.SAML_METADATA_EXPORT_INDIVIDUAL_FILES:
         metadata_list = saml_metadata_generator_list(validated=True, privacypolicy=True, production=True, as_list=True)
         for metadata in metadata_list:
-            if metadata is not None and metadata.get("entityID"):
-                file_name = hashlib.sha1(metadata.get("entityID").encode()).hexdigest() + ".xml"
-                with open(os.path.join(settings.METADATA_GIT_REPOSITORIO, file_name), "w") as f:
-                    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-                    f.write(etree.tostring(metadata, pretty_print=True, encoding=str).replace("xmlns:xmlns", "xmlns"))
+            if metadata.get("entityID"):
+                files[saml_metadata_file_name(metadata.get("entityID"))] = (
+                    '<?xml version="1.0" encoding="UTF-8"?>\n'
+                    + etree.tostring(metadata, pretty_print=True, encoding=str)
+                )
     else:
-        metadata = saml_metadata_generator_list(validated=True, privacypolicy=True, production=True)
-        metadata_file = join(settings.METADATA_GIT_REPOSITORIO, settings.METADATA_FILENAME)
-        with open(metadata_file, "w") as f:
-            f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-            # Hack for correcting namespace definition by removing prefix.
-            f.write(etree.tostring(metadata, pretty_print=True, encoding=str).replace("xmlns:xmlns", "xmlns"))
+        output = BytesIO()
+        saml_metadata_generator_stream(output, validated=True, privacypolicy=True, production=True)
+        files[settings.METADATA_FILENAME] = output.getvalue().decode("utf-8")
+    return files
 
 
-def _write_ldap_metadata():
+def _write_saml_metadata():
     # Generate metadata and write it to file
+    if settings.SAML_METADATA_EXPORT_INDIVIDUAL_FILES:
+        saml_metadata_export_files(
+            settings.METADATA_GIT_REPOSITORIO,
+            validated=True,
+            privacypolicy=True,
+            production=True,
+            remove_stale=True,
+        )
+    else:
+        metadata_file = join(settings.METADATA_GIT_REPOSITORIO, settings.METADATA_FILENAME)
+        with open(metadata_file, "wb") as f:
+            saml_metadata_generator_stream(f, validated=True, privacypolicy=True, production=True)
+
+
+def _get_ldap_metadata_files():
+    """
+    Returns dictionary of LDAP metadata file names and contents, including
+    separate files for all entities.
+    """
     tree = ldap_metadata_generator_list(validated=True, production=True)
-    files = []
-    metadata_file = join(settings.LDAP_GIT_REPOSITORIO, settings.LDAP_METADATA_FILENAME)
-    files.append(settings.LDAP_METADATA_FILENAME)
-    with open(metadata_file, "w") as f:
-        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-        f.write(etree.tostring(tree, pretty_print=True, encoding=str))
-    # Generate separate files for all entities
+    files = {
+        settings.LDAP_METADATA_FILENAME: '<?xml version="1.0" encoding="UTF-8"?>\n'
+        + etree.tostring(tree, pretty_print=True, encoding=str)
+    }
     for entity in tree:
         entity_id = entity.get("ID")
         if entity_id:
-            metadata_file = join(settings.LDAP_GIT_REPOSITORIO, entity_id + ".xml")
-            files.append(entity_id + ".xml")
-            with open(metadata_file, "w") as f:
-                f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-                f.write(etree.tostring(entity, pretty_print=True, encoding=str))
-    # Remove all other xml-files from repository
+            files[entity_id + ".xml"] = '<?xml version="1.0" encoding="UTF-8"?>\n' + etree.tostring(
+                entity, pretty_print=True, encoding=str
+            )
+    return files
+
+
+def _remove_ldap_metadata_files(files):
+    """
+    Removes all other xml-files from repository, returns list of removed files.
+    """
+    removed = []
     for f in glob(settings.LDAP_GIT_REPOSITORIO + "*.xml"):
         if f.replace(settings.LDAP_GIT_REPOSITORIO, "") not in files:
             os.remove(f)
-    return
+            removed.append(f)
+    return removed
 
 
-def _write_oidc_metadata():
+def _write_ldap_metadata():
     # Generate metadata and write it to file
+    files = _get_ldap_metadata_files()
+    _write_metadata_files(settings.LDAP_GIT_REPOSITORIO, files)
+    _remove_ldap_metadata_files(files)
+
+
+def _get_oidc_metadata_files():
+    """
+    Returns dictionary of OIDC metadata file name and content.
+    """
     metadata = oidc_metadata_generator_list(
         validated=True, privacypolicy=True, production=True, client_secret_encryption="encrypted"
     )
-    metadata_file = join(settings.OIDC_GIT_REPOSITORIO, settings.OIDC_METADATA_FILENAME)
-    with open(metadata_file, "w") as f:
-        f.write(json.dumps(metadata, indent=4, sort_keys=True))
+    return {settings.OIDC_METADATA_FILENAME: json.dumps(metadata, indent=4, sort_keys=True)}
+
+
+def _write_oidc_metadata():
+    # Generate metadata and write it to file
+    _write_metadata_files(settings.OIDC_GIT_REPOSITORIO, _get_oidc_metadata_files())
 
 
 def _get_origin(repo, warning):
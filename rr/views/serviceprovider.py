@@ -41,6 +41,7 @@ from rr.utils.notifications import (
     validation_notification,
 )
 from rr.utils.serviceprovider import (
+    annotate_service_provider_list,
     create_sp_history_copy,
     get_service_provider_queryset,
 )
@@ -69,7 +70,9 @@ class ServiceProviderList(ListView):
     def get_queryset(self):
         if not settings.ACTIVATE_SAML:
             return ServiceProvider.objects.none()
-        providers = get_service_provider_queryset(request=self.request, service_type="saml")
+        providers = annotate_service_provider_list(
+            get_service_provider_queryset(request=self.request, service_type="saml")
+        )
         if self.request.user.is_superuser:
             return providers.order_by("-modified", "-production", "-test", "entity_id")
         else:
@@ -80,7 +83,9 @@ class ServiceProviderList(ListView):
         if not settings.ACTIVATE_LDAP:
             context["ldap_providers"] = ServiceProvider.objects.none()
         else:
-            providers = get_service_provider_queryset(request=self.request, service_type="ldap")
+            providers = annotate_service_provider_list(
+                get_service_provider_queryset(request=self.request, service_type="ldap")
+            )
             if self.request.user.is_superuser:
                 context["ldap_providers"] = providers.order_by("-modified", "-production", "entity_id")
             else:
@@ -89,7 +94,9 @@ class ServiceProviderList(ListView):
         if not settings.ACTIVATE_OIDC:
             context["oidc_providers"] = ServiceProvider.objects.none()
         else:
-            providers = get_service_provider_queryset(request=self.request, service_type="oidc")
+            providers = annotate_service_provider_list(
+                get_service_provider_queryset(request=self.request, service_type="oidc")
+            )
             if self.request.user.is_superuser:
                 context["oidc_providers"] = providers.order_by("-modified", "-production", "entity_id")
             else:
@@ -164,7 +171,8 @@ class BasicInformationView(DetailView):
     def get_context_data(self, **kwargs):
         context = super(BasicInformationView, self).get_context_data(**kwargs)
         sp = context["object"]
-        history = ServiceProvider.objects.filter(history=sp.pk).exclude(validated=None).last()
+        history = ServiceProvider.objects.get_validated_history([sp.pk]).get(sp.pk)
+        sp.validated_history = history
         if not context["object"].validated and history:
             context["attributes"] = SPAttribute.objects.filter(
                 Q(sp=sp, end_at__gte=history.created_at) | Q(sp=sp, end_at=None)
@@ -548,7 +556,7 @@ class ServiceProviderDelete(SuccessMessageMixin, DeleteView):
         if obj.production:
             allow_delete = False
         if not obj.validated:
-            history = ServiceProvider.objects.filter(history=obj.pk).exclude(validated=None).last()
+            history = ServiceProvider.objects.get_validated_history([obj.pk]).get(obj.pk)
             if history and history.production:
                 allow_delete = False
         if allow_delete:
@@ -583,6 +591,8 @@ class SAMLAdminList(ListView):
 
     def get_queryset(self):
         if self.request.user.is_superuser:
-            return ServiceProvider.objects.filter(service_type="saml", end_at=None).order_by("entity_id")
+            return annotate_service_provider_list(
+                ServiceProvider.objects.filter(service_type="saml", end_at=None).order_by("entity_id")
+            )
         else:
             raise PermissionDenied
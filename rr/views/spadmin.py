@@ -1,12 +1,10 @@
 import logging
-from smtplib import SMTPException
 
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import Group, User
-from django.core.mail import send_mail
 from django.core.mail.message import BadHeaderError
+from django.db.models import OuterRef, Subquery
 from django.http import HttpResponseRedirect
 from django.shortcuts import render
 from django.template.context import Context
@@ -16,8 +14,9 @@ from django.urls import reverse
 from django.utils.translation import gettext as _
 
 from rr.forms.spadmin import SPAdminForm, SPAdminGroupForm
-from rr.models.email import Template
+from rr.models.email import OutgoingEmail, Template
 from rr.models.spadmin import Keystore
+from rr.utils.outbox import queue_email
 from rr.utils.serviceprovider import get_service_provider
 
 logger = logging.getLogger(__name__)
@@ -101,7 +100,7 @@ def admin_list(request, pk):
     **Context**
 
     ``object_list``
-        List of :model:`rr.Keystore`.
+        List of :model:`rr.Keystore`, with delivery status of the invite email.
 
     ``form``
         Form for sending an invitation
@@ -136,7 +135,9 @@ def admin_list(request, pk):
             remove_self = _remove_admin_groups(request, sp)
             if remove_self:
                 return HttpResponseRedirect(reverse("serviceprovider-list"))
-    invites = Keystore.objects.filter(sp=sp)
+    invites = Keystore.objects.filter(sp=sp).annotate(
+        email_status=Subquery(OutgoingEmail.objects.filter(invite=OuterRef("pk")).order_by("-pk").values("status")[:1])
+    )
     return render(
         request,
         "rr/spadmin.html",
@@ -190,16 +191,14 @@ def _create_invite(request, sp, send):
         subject, message, error = create_invite_email(request, key, template)
         if send and not error:
             try:
-                send_mail(subject, message, settings.SERVER_EMAIL, [email], fail_silently=False)
-                logger.info("Invite for {sp} sent to {email} by {user}".format(sp=sp, email=email, user=request.user))
+                queue_email(subject, message, [email], created_by=request.user, invite=key)
+                logger.info(
+                    "Invite for {sp} queued to {email} by {user}".format(sp=sp, email=email, user=request.user)
+                )
                 form = SPAdminForm(superuser=request.user.is_superuser)
                 subject = None
                 message = None
-                messages.add_message(request, messages.INFO, _("Invite sent to ") + email)
-            except SMTPException:
-                logger.warning("Could not send invite to {email}".format(email=email))
-                error = _("Could not send email.")
-                key.delete()
+                messages.add_message(request, messages.INFO, _("Invite queued for sending to ") + email)
             except BadHeaderError:
                 logger.warning("Email from {user} contained invalid headers.".format(user=request.user))
                 error = _("Invalid header found, could not send email.")
@@ -1,17 +1,30 @@
 import logging
+from collections import defaultdict
 from datetime import date, timedelta
 
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
-from django.db.models import Sum
+from django.db.models import F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.shortcuts import render
 
 from rr.models.serviceprovider import ServiceProvider
-from rr.models.statistics import Statistics
+from rr.models.statistics import (
+    MonthlyStatistics,
+    Statistics,
+    StatisticsAlert,
+    WeeklyStatistics,
+)
+from rr.utils.hyperloglog import merge_sketches
 from rr.utils.serviceprovider import get_service_provider
+from rr.utils.statistics import next_month_start, week_start
+from rr.utils.statistics_alerts import detect_statistics_alerts
 
 logger = logging.getLogger(__name__)
 
+# Ranges of at least this many days are shown by week
+STATISTICS_WEEKLY_DAYS = 365
+
 
 @login_required
 def statistics_list(request, pk):
@@ -27,6 +40,10 @@ def statistics_list(request, pk):
     ``object``
         An instance of :model:`rr.ServiceProvider`.
 
+    ``period``
+        Period of statistics rows: day, week or month. Long ranges are
+        read from weekly or monthly rollups.
+
     **Template:**
 
     :template:`rr/statistics.html`
@@ -37,23 +54,117 @@ def statistics_list(request, pk):
     except ValueError:
         days = 31
     if days == 0:
-        statistics = Statistics.objects.filter(sp=sp)
+        period = "month"
+        statistics = MonthlyStatistics.objects.filter(sp=sp)
     else:
         date_start = date.today() - timedelta(days=days + 1)
-        statistics = Statistics.objects.filter(sp=sp, date__gte=date_start)
-    return render(request, "rr/statistics.html", {"object_list": statistics, "object": sp, "days": days})
+        if days >= STATISTICS_WEEKLY_DAYS:
+            period = "week"
+            statistics = WeeklyStatistics.objects.filter(sp=sp, date__gte=week_start(date_start))
+        else:
+            period = "day"
+            statistics = Statistics.objects.filter(sp=sp, date__gte=date_start)
+    return render(
+        request, "rr/statistics.html", {"object_list": statistics, "object": sp, "days": days, "period": period}
+    )
+
+
+# Summary columns and their time windows in days
+SUMMARY_WINDOWS = [("week", 8), ("month", 31), ("six_months", 183), ("year", 365)]
+# Days used for the number of users column
+SUMMARY_USERS_DAYS = 31
+# Longer windows are summed from monthly rollups, with daily statistics before the first full month
+SUMMARY_DAILY_DAYS = 31
+
+
+def _window_logins(days):
+    """
+    Returns expression for number of logins during the given number of past days
+    """
+    start = date.today() - timedelta(days=days)
+    if days <= SUMMARY_DAILY_DAYS:
+        return Sum("statistics__logins", filter=Q(statistics__date__gte=start))
+    rollup_start = start if start.day == 1 else next_month_start(start)
+    daily = Sum("statistics__logins", filter=Q(statistics__date__gte=start, statistics__date__lt=rollup_start))
+    monthly = Subquery(
+        MonthlyStatistics.objects.filter(sp=OuterRef("pk"), date__gte=rollup_start)
+        .order_by()
+        .values("sp")
+        .annotate(total=Sum("logins"))
+        .values("total")
+    )
+    return Coalesce(monthly + daily, monthly, daily)
+
+
+def get_statistics_summary(order="entity_id"):
+    """
+    Returns production SAML service providers annotated with number of logins in summary windows
+    and the highest daily number of unique users during the last month, using a single query.
+    Long windows are read mostly from monthly rollups. Approximate number of unique users
+    during the last month is merged from daily sketches.
+    Values are None if there are no statistics for the window.
+
+    order: field name to sort by, prefixed with "-" for descending order
+    """
+    annotations = {name: _window_logins(days) for name, days in SUMMARY_WINDOWS}
+    annotations["users"] = Max(
+        "statistics__users", filter=Q(statistics__date__gte=date.today() - timedelta(days=SUMMARY_USERS_DAYS))
+    )
+    field = order.lstrip("-")
+    if field not in list(annotations) + ["entity_id", "unique_users"]:
+        field = "entity_id"
+    sql_field = "users" if field == "unique_users" else field
+    ordering = F(sql_field).desc(nulls_last=True) if order.startswith("-") else F(sql_field).asc(nulls_last=True)
+    serviceproviders = list(
+        ServiceProvider.objects.filter(end_at=None, production=True, service_type="saml")
+        .annotate(**annotations)
+        .order_by(ordering, "entity_id")
+    )
+    unique_users = get_unique_users(
+        [sp.pk for sp in serviceproviders], date.today() - timedelta(days=SUMMARY_USERS_DAYS)
+    )
+    for sp in serviceproviders:
+        sp.unique_users = unique_users.get(sp.pk)
+    if field == "unique_users":
+        # Unique users are not in the database, sort with missing values last
+        direction = -1 if order.startswith("-") else 1
+        serviceproviders.sort(key=lambda sp: (sp.unique_users is None, direction * (sp.unique_users or 0)))
+    return serviceproviders
+
+
+def get_unique_users(pks, date_start):
+    """
+    Returns dictionary of approximate number of unique users since date_start by SP pk,
+    merged from daily unique users sketches.
+
+    pks: list of ServiceProvider pks
+    date_start: first day included
+    """
+    sketches = defaultdict(list)
+    for sp, sketch in (
+        Statistics.objects.filter(sp__in=pks, date__gte=date_start)
+        .exclude(users_sketch=None)
+        .order_by()
+        .values_list("sp", "users_sketch")
+    ):
+        sketches[sp].append(bytes(sketch))
+    return {sp: merge_sketches(sp_sketches).count() for sp, sp_sketches in sketches.items()}
 
 
 @login_required
 def statistics_summary_list(request):
     """
-    Displays a list of :model:`rr.Statistics` linked to
+    Displays a summary of :model:`rr.Statistics` for each production SAML
     :model:`rr.ServiceProvider`.
 
     **Context**
 
     ``object_list``
-        List of :model:`rr.Statistics`.
+        List of :model:`rr.ServiceProvider`, annotated with number of logins
+        and users.
+
+    ``order``
+        Current sort order.
 
     **Template:**
 
@@ -61,31 +172,38 @@ def statistics_summary_list(request):
     """
     if not request.user.is_superuser:
         raise PermissionDenied
-    serviceproviders = ServiceProvider.objects.filter(end_at=None, production=True, service_type="saml").order_by(
-        "entity_id"
-    )
-    stats = Statistics.objects.all()
-    statistics = []
-    for sp in serviceproviders:
-        weekly = (
-            stats.filter(sp=sp, date__gte=(date.today() - timedelta(days=8)))
-            .aggregate(Sum("logins"))
-            .get("logins__sum", 0)
-        )
-        monthly = (
-            stats.filter(sp=sp, date__gte=(date.today() - timedelta(days=31)))
-            .aggregate(Sum("logins"))
-            .get("logins__sum", 0)
-        )
-        six_months = (
-            stats.filter(sp=sp, date__gte=(date.today() - timedelta(days=183)))
-            .aggregate(Sum("logins"))
-            .get("logins__sum", 0)
-        )
-        yearly = (
-            stats.filter(sp=sp, date__gte=(date.today() - timedelta(days=365)))
-            .aggregate(Sum("logins"))
-            .get("logins__sum", 0)
-        )
-        statistics.append([sp.pk, sp.entity_id, weekly, monthly, six_months, yearly])
-    return render(request, "rr/statistics_summary.html", {"object_list": statistics})
+    order = request.GET.get("order", "entity_id")
+    statistics = get_statistics_summary(order)
+    return render(request, "rr/statistics_summary.html", {"object_list": statistics, "order": order})
+
+
+@login_required
+def statistics_alert_list(request):
+    """
+    Displays login anomalies and dormant services found in :model:`rr.Statistics`.
+    Alerts are read from saved :model:`rr.StatisticsAlert`, or computed from
+    current statistics if ``live`` parameter is given.
+
+    **Context**
+
+    ``object_list``
+        List of :model:`rr.StatisticsAlert`.
+
+    ``live``
+        Alerts are computed from current statistics.
+
+    **Template:**
+
+    :template:`rr/statistics_alerts.html`
+    """
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    live = "live" in request.GET
+    if live:
+        alerts = detect_statistics_alerts()
+        serviceproviders = ServiceProvider.objects.in_bulk([alert.sp_id for alert in alerts])
+        for alert in alerts:
+            alert.sp = serviceproviders[alert.sp_id]
+    else:
+        alerts = list(StatisticsAlert.objects.select_related("sp"))
+    return render(request, "rr/statistics_alerts.html", {"object_list": alerts, "live": live})
@@ -29,7 +29,7 @@ class CertificateViewSet(CustomModelViewSet):
     serializer_class = CertificateSerializer
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     search_fields = ["cn", "key_size"]
-    filterset_fields = ["sp", "cn", "encryption", "signing", "key_size"]
+    filterset_fields = ["sp", "cn", "encryption", "signing", "key_size", "fingerprint_sha256", "public_key_sha256"]
 
     def perform_destroy(self, instance):
         instance.end_at = timezone.now()
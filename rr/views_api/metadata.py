@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import json
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Q
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from lxml import etree
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import BasePermission
+from rest_framework.views import APIView
+
+from rr.models.serviceprovider import ServiceProvider
+from rr.utils.ldap_metadata_generator import ldap_metadata_generator_list
+from rr.utils.metadata_cache import get_shared_metadata_changed, metadata_cache_key
+from rr.utils.oidc_metadata_generator import oidc_metadata_generator_list
+from rr.utils.saml_metadata_generator import saml_metadata_generator_stream
+
+logger = logging.getLogger(__name__)
+
+
+def _render_saml_metadata():
+    output = BytesIO()
+    saml_metadata_generator_stream(output, validated=True, privacypolicy=True, production=True)
+    return output.getvalue()
+
+
+def _render_oidc_metadata():
+    metadata = oidc_metadata_generator_list(
+        validated=True, privacypolicy=True, production=True, client_secret_encryption="encrypted"
+    )
+    return json.dumps(metadata, indent=4, sort_keys=True).encode("utf-8")
+
+
+def _render_ldap_metadata():
+    tree = ldap_metadata_generator_list(validated=True, production=True)
+    return b'<?xml version="1.0" encoding="UTF-8"?>\n' + etree.tostring(tree, pretty_print=True, encoding="UTF-8")
+
+
+METADATA_EXPORTS = {
+    "saml": (_render_saml_metadata, "application/samlmetadata+xml"),
+    "oidc": (_render_oidc_metadata, "application/json"),
+    "ldap": (_render_ldap_metadata, "application/xml"),
+}
+
+
+def get_metadata_last_modified(service_type):
+    """
+    Returns the latest change time of validated production metadata, which is
+    the latest validation, change or removal of a service provider, or change in
+    objects shared between service providers or metadata settings, or None.
+    History copies keep the validation time, so it is not lost when a
+    service provider is modified. Changes to current service providers include
+    changes to production and test status, which are not validated.
+    """
+    timestamps = ServiceProvider.objects.filter(service_type=service_type).aggregate(
+        validated=Max("validated"),
+        updated=Max("updated_at", filter=Q(history=None, end_at=None)),
+        removed=Max("end_at", filter=Q(history=None)),
+    )
+    timestamps = [timestamp for timestamp in timestamps.values() if timestamp]
+    shared_changed = get_shared_metadata_changed()
+    if shared_changed:
+        timestamps.append(shared_changed)
+    return max(timestamps) if timestamps else None
+
+
+class MetadataExportPermission(BasePermission):
+    """
+    Allows access to superusers and members of READ_ALL_GROUP.
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        read_all_group = settings.READ_ALL_GROUP if hasattr(settings, "READ_ALL_GROUP") else None
+        return user.is_superuser or bool(read_all_group and user.groups.filter(name=read_all_group).exists())
+
+
+class MetadataExportView(APIView):
+    """API endpoint for validated production metadata.
+
+    get:
+    Returns SAML metadata aggregate, OIDC client metadata or LDAP metadata.
+    Response is gzip compressed if client accepts it. Supports conditional
+    requests with If-None-Match and If-Modified-Since.
+    """
+
+    permission_classes = [MetadataExportPermission]
+
+    def get(self, request, service_type):
+        if service_type not in METADATA_EXPORTS:
+            raise NotFound()
+        render, content_type = METADATA_EXPORTS[service_type]
+        last_modified = get_metadata_last_modified(service_type)
+        version = hashlib.sha1(
+            ("%s:%s" % (metadata_cache_key(service_type), last_modified.isoformat() if last_modified else "")).encode()
+        ).hexdigest()
+        use_gzip = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+        etag = '"%s%s"' % (version, "-gzip" if use_gzip else "")
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            # Compressed metadata is kept in cache until metadata version changes or it expires
+            cache_key = "metadata_export_%s" % service_type
+            cached = cache.get(cache_key)
+            if cached and cached[0] == version:
+                body = cached[1]
+            else:
+                body = gzip.compress(render(), mtime=0)
+                cache.set(cache_key, (version, body))
+                logger.debug("Generated %s metadata export version %s", service_type, version)
+            if use_gzip:
+                response = HttpResponse(body, content_type=content_type)
+                response["Content-Encoding"] = "gzip"
+            else:
+                response = HttpResponse(gzip.decompress(body), content_type=content_type)
+        response["ETag"] = etag
+        if timestamp:
+            response["Last-Modified"] = http_date(timestamp)
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
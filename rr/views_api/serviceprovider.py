@@ -20,6 +20,8 @@ from rr.serializers.serviceprovider import (
     SamlServiceProviderSerializer,
     SPAttributeSerializer,
 )
+from rr.utils.hosts import find_service_hosts
+from rr.utils.missing_data import annotate_missing_sp_data
 from rr.utils.serviceprovider import get_service_provider_queryset
 from rr.views_api.common import CustomModelViewSet
 
@@ -70,10 +72,14 @@ class ServiceProviderFilter(df_filters.FilterSet):
     notes = df_filters.CharFilter(lookup_expr="icontains")
     production = df_filters.BooleanFilter(field_name="production", widget=BooleanWidget())
     test = df_filters.BooleanFilter(field_name="test", widget=BooleanWidget())
+    host = df_filters.CharFilter(method="filter_host", label="Host name in endpoints, redirect URIs or server names")
 
     class Meta:
         model = ServiceProvider
-        fields = ["entity_id", "production", "test", "admins__username", "admin_groups__name", "notes"]
+        fields = ["entity_id", "production", "test", "admins__username", "admin_groups__name", "notes", "host"]
+
+    def filter_host(self, queryset, name, value):
+        return queryset.filter(pk__in=find_service_hosts(value).values("sp"))
 
 
 class SamlServiceProviderViewSet(viewsets.ModelViewSet):
@@ -104,7 +110,9 @@ class SamlServiceProviderViewSet(viewsets.ModelViewSet):
         """
         Restricts the returned information to services
         """
-        return get_service_provider_queryset(request=self.request, service_type="saml").prefetch_related(
+        return annotate_missing_sp_data(
+            get_service_provider_queryset(request=self.request, service_type="saml")
+        ).prefetch_related(
             Prefetch(
                 "spattributes",
                 queryset=SPAttribute.objects.filter(end_at=None).select_related("attribute"),
@@ -152,7 +160,9 @@ class OidcServiceProviderViewSet(viewsets.ModelViewSet):
         """
         Restricts the returned information to services
         """
-        return get_service_provider_queryset(request=self.request, service_type="oidc").prefetch_related(
+        return annotate_missing_sp_data(
+            get_service_provider_queryset(request=self.request, service_type="oidc")
+        ).prefetch_related(
             Prefetch(
                 "spattributes",
                 queryset=SPAttribute.objects.filter(end_at=None).select_related("attribute"),
@@ -201,7 +211,9 @@ class LdapServiceProviderViewSet(viewsets.ModelViewSet):
         """
         Restricts the returned information to services
         """
-        return get_service_provider_queryset(request=self.request, service_type="ldap").prefetch_related(
+        return annotate_missing_sp_data(
+            get_service_provider_queryset(request=self.request, service_type="ldap")
+        ).prefetch_related(
             Prefetch(
                 "spattributes",
                 queryset=SPAttribute.objects.filter(end_at=None).select_related("attribute"),
@@ -0,0 +1,106 @@
+import hashlib
+import json
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework import serializers, viewsets
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from rr.utils.serviceprovider import get_service_provider_queryset
+from rr.utils.statistics import get_statistics_series, get_statistics_updated_at
+
+
+class StatisticsQuerySerializer(serializers.Serializer):
+    """
+    Validates statistics query parameters.
+    """
+
+    bucket = serializers.ChoiceField(choices=["day", "week", "month"], default="day")
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    sp = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, data):
+        data.setdefault("end", date.today())
+        data.setdefault("start", data["end"] - timedelta(days=30))
+        if data["start"] > data["end"]:
+            raise serializers.ValidationError("start must not be after end.")
+        return data
+
+
+class StatisticsViewSet(viewsets.ViewSet):
+    """API endpoint for login statistics.
+
+    list:
+    Returns number of logins and users as a time series for each service provider.
+
+    Query parameters:
+    bucket: day, week or month, default day
+    start: first date, default 30 days before end
+    end: last date, default today
+    sp: service provider id, may be given multiple times or as a comma separated list. Default all.
+
+    Users is the approximate number of unique users in the bucket when available, otherwise
+    the highest daily number of unique users.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(parameters=[StatisticsQuerySerializer], responses=OpenApiTypes.OBJECT)
+    def list(self, request):
+        params = request.query_params.copy()
+        params.setlist("sp", [pk for value in request.query_params.getlist("sp") for pk in value.split(",") if pk])
+        query = StatisticsQuerySerializer(data=params)
+        query.is_valid(raise_exception=True)
+        query = query.validated_data
+        serviceproviders = (
+            get_service_provider_queryset(request=request)
+            .filter(service_type__in=["saml", "oidc"])
+            .prefetch_related(None)
+        )
+        if "sp" in query:
+            serviceproviders = serviceproviders.filter(pk__in=query["sp"])
+        serviceproviders = list(serviceproviders.values_list("pk", "entity_id"))
+        # ETag is derived from the request and the last statistics update before querying statistics
+        etag_data = {
+            "serviceproviders": serviceproviders,
+            "bucket": query["bucket"],
+            "start": query["start"].isoformat(),
+            "end": query["end"].isoformat(),
+            "updated_at": str(get_statistics_updated_at()),
+        }
+        etag = '"%s"' % hashlib.sha1(json.dumps(etag_data, sort_keys=True).encode()).hexdigest()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(self._get_data(query, serviceproviders))
+        response["ETag"] = etag
+        max_age = settings.STATISTICS_API_CACHE_MAX_AGE if hasattr(settings, "STATISTICS_API_CACHE_MAX_AGE") else 300
+        patch_cache_control(response, private=True, max_age=max_age)
+        return response
+
+    @staticmethod
+    def _get_data(query, serviceproviders):
+        """Returns statistics series for service providers"""
+        series = get_statistics_series(
+            [pk for pk, entity_id in serviceproviders], query["bucket"], query["start"], query["end"]
+        )
+        return {
+            "bucket": query["bucket"],
+            "start": query["start"].isoformat(),
+            "end": query["end"].isoformat(),
+            "results": [
+                {
+                    "sp": pk,
+                    "entity_id": entity_id,
+                    "series": [
+                        {"date": day.isoformat(), "logins": logins, "users": users}
+                        for day, logins, users in series.get(pk, [])
+                    ],
+                }
+                for pk, entity_id in serviceproviders
+            ],
+        }
@@ -130,6 +130,12 @@ MFA_AUTHENTICATION_CONTEXT = "https://refeds.org/profile/mfa"
 
 SAML_METADATA_EXPORT_INDIVIDUAL_FILES = False
 
+METADATA_CACHE = False
+
+METADATA_EXPORT_INCREMENTAL = False
+
+STATISTICS_API_CACHE_MAX_AGE = 300
+
 BOOTSTRAP5 = {
     "set_placeholder": False,
 }
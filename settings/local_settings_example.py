@@ -31,8 +31,15 @@ ACTIVATE_OIDC = True
 
 # Email backend, see https://docs.djangoproject.com/en/dev/topics/email/
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+# For a local debugging SMTP server, use the SMTP backend with EMAIL_HOST = "localhost" and EMAIL_PORT = 1025
 # Email address used as send address
 SERVER_EMAIL = "noreply@example.org"
+# Queued emails are sent with "./manage.py sendemails". Number of sending attempts before
+# a message is marked as failed, and delay before the first retry (seconds), doubled after each attempt.
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 60
+# Time (seconds) a message is reserved for a sending worker, before it is sent again if the worker has stopped
+EMAIL_OUTBOX_LEASE_TIME = 600
 # Will receive notifications of changes in metadata and also if error 500 occurs
 # Format should be a list of tuples of (Full name, email address).
 # Example: [('John', 'john@example.com'), ('Mary', 'mary@example.com')]
@@ -104,5 +111,16 @@ OIDC_CLIENT_SECRET_KEY = "generated fernet key"
 # Turn true if UI metadata export should write individual files
 SAML_METADATA_EXPORT_INDIVIDUAL_FILES = False
 
+# Turn true if UI metadata export should only write and stage changed files
+METADATA_EXPORT_INCREMENTAL = False
+
+# Cache-Control max-age in seconds for statistics API responses
+STATISTICS_API_CACHE_MAX_AGE = 300
+
+# Cache rendered metadata of individual entities in database.
+# Cache is invalidated when the entity or its linked objects are changed.
+# Cache is not maintained while disabled, empty the rr_metadatacache table before enabling it again.
+METADATA_CACHE = False
+
 # WebDriver path for Selenium tests
 # FIREFOX_DRIVER_PATH = "/path/to/geckodriver"
@@ -19,7 +19,7 @@ from rr.views.certificate import (
     certificate_list,
 )
 from rr.views.contact import contact_list
-from rr.views.email import email_list
+from rr.views.email import email_list, email_outbox
 from rr.views.endpoint import endpoint_list
 from rr.views.login import LocalLogoutView, ShibbolethLoginView
 from rr.views.metadata import metadata, metadata_import, metadata_management
@@ -39,9 +39,14 @@ from rr.views.serviceprovider import (
 )
 from rr.views.sp_errors import sp_error
 from rr.views.spadmin import activate_key, admin_list
-from rr.views.statistics import statistics_list, statistics_summary_list
+from rr.views.statistics import (
+    statistics_alert_list,
+    statistics_list,
+    statistics_summary_list,
+)
 from rr.views.testuser import testuser_attribute_data, testuser_list
 from rr.views.usergroup import usergroup_list
+from rr.views_api.metadata import MetadataExportView
 
 # Overwrite default status handlers
 handler400 = "rr.views.handlers.bad_request"
@@ -51,6 +56,7 @@ handler500 = "rr.views.handlers.server_error"
 
 urlpatterns = [
     path("api/v1/", include(router.urls)),
+    path("api/v1/metadata/<str:service_type>/", MetadataExportView.as_view(), name="metadata-export"),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/schema/swagger/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     path("api/schema/redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
@@ -73,6 +79,7 @@ urlpatterns = [
     path("contact/<int:pk>/", contact_list, name="contact-list"),
     path("endpoint/<int:pk>/", endpoint_list, name="endpoint-list"),
     path("email/", email_list, name="email-list"),
+    path("email/outbox/", email_outbox, name="email-outbox"),
     path("metadata/import/", metadata_import, name="metadata-import"),
     path("metadata/manage/saml/", metadata_management, {"service_type": "saml"}, name="metadata-manage-saml"),
     path("metadata/manage/ldap/", metadata_management, {"service_type": "ldap"}, name="metadata-manage-ldap"),
@@ -121,6 +128,7 @@ urlpatterns = [
     ),
     path("saml_admin_list/", login_required(SAMLAdminList.as_view()), name="saml-admin-list"),
     path("statistics/summary/", statistics_summary_list, name="statistics-summary-list"),
+    path("statistics/alerts/", statistics_alert_list, name="statistics-alert-list"),
     path("statistics/<int:pk>/", statistics_list, name="statistics-list"),
     path("summary/<int:pk>/", login_required(BasicInformationView.as_view()), name="summary-view"),
     path("testuser/<int:pk>/", testuser_list, name="testuser-list"),